@@ -0,0 +1,234 @@
+import base64
+import fcntl
+import hashlib
+import os
+import pickle
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.db import connections, router, transaction
+from django.utils.timezone import now as tz_now
+
+
+########################################################################################################
+####                                                                                                ####
+####            Métricas de aciertos y fallos                                                       ####
+####                                                                                                ####
+########################################################################################################
+METRICS_KEYS = {"hits": "cache_metrics:hits", "misses": "cache_metrics:misses"}
+# Cada proceso acumula localmente y suma al contador compartido cada tantas lecturas
+METRICS_FLUSH_EVERY = 100
+
+_MISSING = object()
+
+
+class MeteredCacheMixin:
+    """
+    Cuenta aciertos y fallos de get()/get_many(). Los contadores se acumulan en el proceso
+    y se suman con incr() atómico a claves del propio cache, así se ven los de todos los workers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {"hits": 0, "misses": 0}
+        self._metering = threading.local()
+
+    @contextmanager
+    def unmetered(self):
+        """Las lecturas dentro del bloque no cuentan (métricas, get() interno de incr())"""
+        active = getattr(self._metering, "active", False)
+        self._metering.active = True
+        try:
+            yield
+        finally:
+            self._metering.active = active
+
+    def _record(self, hits, misses):
+        if getattr(self._metering, "active", False):
+            return
+        with self._metrics_lock:
+            self._metrics["hits"] += hits
+            self._metrics["misses"] += misses
+            if self._metrics["hits"] + self._metrics["misses"] < METRICS_FLUSH_EVERY:
+                return
+            pending, self._metrics = self._metrics, {"hits": 0, "misses": 0}
+        self.flush_metrics(pending)
+
+    def flush_metrics(self, pending=None):
+        if pending is None:
+            with self._metrics_lock:
+                pending, self._metrics = self._metrics, {"hits": 0, "misses": 0}
+
+        with self.unmetered():
+            for name, value in pending.items():
+                if value and not self.add(METRICS_KEYS[name], value, timeout=None):
+                    self.incr(METRICS_KEYS[name], value)
+
+    def get(self, key, default=None, version=None):
+        # Algunos backends implementan get() con get_many(): se cuenta una sola vez
+        with self.unmetered():
+            value = super().get(key, _MISSING, version=version)
+        self._record(value is not _MISSING, value is _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with self.unmetered():
+            values = super().get_many(keys, version=version)
+        self._record(len(values), len(keys) - len(values))
+        return values
+
+    def incr(self, key, delta=1, version=None):
+        with self.unmetered():
+            return super().incr(key, delta, version=version)
+
+
+def cache_metrics(alias="default"):
+    """Aciertos, fallos y tasa de acierto acumulados por todos los procesos"""
+    backend = caches[alias]
+    if not isinstance(backend, MeteredCacheMixin):
+        return {"hits": None, "misses": None, "hit_ratio": None}
+
+    backend.flush_metrics()
+    with backend.unmetered():
+        hits = backend.get(METRICS_KEYS["hits"], 0)
+        misses = backend.get(METRICS_KEYS["misses"], 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else None}
+
+
+def reset_cache_metrics(alias="default"):
+    caches[alias].delete_many(list(METRICS_KEYS.values()))
+
+
+def increment(key, timeout, delta=1, alias="default"):
+    """Contador atómico: crea la clave con `delta` o la incrementa. Devuelve el valor nuevo."""
+    backend = caches[alias]
+    if backend.add(key, delta, timeout):
+        return delta
+    try:
+        return backend.incr(key, delta)
+    except ValueError:
+        # La clave caducó entre add() e incr()
+        backend.add(key, delta, timeout)
+        return delta
+
+
+########################################################################################################
+####                                                                                                ####
+####            Backends con incr() atómico                                                         ####
+####                                                                                                ####
+########################################################################################################
+class MeteredLocMemCache(MeteredCacheMixin, LocMemCache):
+    """Solo para desarrollo: cada proceso tiene su propio cache"""
+
+
+class AtomicFileBasedCache(MeteredCacheMixin, FileBasedCache):
+    """
+    Cache en disco compartido por los workers de una misma máquina. add() e incr() se
+    serializan con flock sobre un archivo de bloqueo por franja de claves.
+    """
+    LOCK_STRIPES = 64
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        # Cada cuántos segundos, como mucho, cuenta los archivos para ver si hay que liberar espacio
+        self._cull_interval = int(params.get("OPTIONS", {}).get("CULL_INTERVAL", 60))
+        self._next_cull = 0
+
+    def _cull(self):
+        """
+        Como FileBasedCache._cull pero sin recorrer el directorio en cada set(): se comprueba
+        cada CULL_INTERVAL segundos y primero se borran las entradas caducadas; solo si sigue
+        por encima de MAX_ENTRIES se descarta una muestra al azar de las vigentes.
+        """
+        now = time.monotonic()
+        if now < self._next_cull:
+            return
+        self._next_cull = now + self._cull_interval
+
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            return
+
+        alive = []
+        for fname in filelist:
+            try:
+                with open(fname, "rb") as f:
+                    if not self._is_expired(f):
+                        alive.append(fname)
+            except FileNotFoundError:
+                pass
+        if len(alive) < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+        for fname in random.sample(alive, int(len(alive) / self._cull_frequency)):
+            self._delete(fname)
+
+    def _lock_path(self, key):
+        stripe = int(hashlib.md5(key.encode()).hexdigest(), 16) % self.LOCK_STRIPES
+        return os.path.join(self._dir, "locks", f"{stripe}.lock")
+
+    def _locked(self, key, version, operation):
+        key = self.make_and_validate_key(key, version=version)
+        path = self._lock_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                return operation()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._locked(key, version, lambda: super(AtomicFileBasedCache, self).add(key, value, timeout, version))
+
+    def incr(self, key, delta=1, version=None):
+        return self._locked(key, version, lambda: super(AtomicFileBasedCache, self).incr(key, delta, version))
+
+
+class AtomicDatabaseCache(MeteredCacheMixin, DatabaseCache):
+    """
+    Cache en una tabla de la base (en Postgres se crea UNLOGGED con setup_cache_table).
+    incr() bloquea la fila con SELECT ... FOR UPDATE en lugar de leer y escribir por separado.
+    """
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self._table)
+        now = tz_now().replace(microsecond=0, tzinfo=None)
+        lock = " FOR UPDATE" if connection.features.has_select_for_update else ""
+
+        with transaction.atomic(using=db), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {quote_name('value')} FROM {table} "
+                f"WHERE {quote_name('cache_key')} = %s AND {quote_name('expires')} > %s{lock}",
+                [key, connection.ops.adapt_datetimefield_value(now)],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+
+            value = pickle.loads(base64.b64decode(connection.ops.process_clob(row[0]).encode())) + delta
+            cursor.execute(
+                f"UPDATE {table} SET {quote_name('value')} = %s WHERE {quote_name('cache_key')} = %s",
+                [base64.b64encode(pickle.dumps(value, self.pickle_protocol)).decode("latin1"), key],
+            )
+        return value
+
+
+class MeteredRedisCache(MeteredCacheMixin, RedisCache):
+    """Redis (o compatible) compartido entre máquinas; incr() ya es atómico (INCRBY)"""
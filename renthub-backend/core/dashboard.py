@@ -0,0 +1,376 @@
+import threading
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Subquery
+from django.db.models.fields.files import FieldFile
+
+from core.images import variant_urls
+from core.models import (Contract, DashboardBucket, LaundryBooking, RentPaymentHistory,
+                         current_billing_period)
+from core.response_cache import get_versions
+
+
+########################################################################################################
+####                                                                                                ####
+####            Buckets del dashboard de administración                                             ####
+####                                                                                                ####
+########################################################################################################
+RENT_BUCKETS = {
+    "pays_reject": "rejected",
+    "pays_overdue": "overdue",
+    "pays_pending_review": "pending_review",
+}
+
+# Reservas donde se espera respuesta del actor contrario al último que actuó
+LAUNDRY_BUCKETS = {
+    "pending_user": "admin",
+    "pending_admin": "user",
+}
+
+LAUNDRY_OPEN_STATUSES = ["pending", "proposed", "counter_proposal"]
+
+# Orden de los elementos recientes y de la paginación del detalle de cada bucket
+RENT_ORDERING = ("-billing_period", "-id")
+LAUNDRY_ORDERING = ("-updated_at", "-id")
+
+
+def serialize_rent_payment(payment):
+    """Representación de un pago de arriendo en el dashboard"""
+    return {
+        "id": str(payment.id),
+        "user": {
+            "id": str(payment.contract.user.id),
+            "name": f"{payment.contract.user.first_name} {payment.contract.user.last_name}"
+        },
+        "contract": {
+            "id": str(payment.contract.id),
+            "room_number": payment.contract.room.room_number,
+            "building": payment.contract.room.building.name
+        },
+        "month_paid": payment.month_paid,
+        "payment_date": payment.payment_date.strftime("%Y-%m-%d") if payment.payment_date else None,
+        "status": payment.status,
+        "voucher_name": payment.receipt_image.name or None,
+        "admin_comment": payment.admin_comment,
+        "user_comment": payment.user_comment,
+    }
+
+
+def serialize_laundry_booking(booking):
+    """Representación de una reserva de lavandería en el dashboard"""
+    return {
+        "id": str(booking.id),
+        "user": {
+            "id": str(booking.user.id),
+            "name": f"{booking.user.first_name} {booking.user.last_name}"
+        },
+        "date": booking.date.strftime("%Y-%m-%d"),
+        "time_slot": booking.time_slot,
+        "status": booking.status,
+        "voucher_name": booking.voucher_image.name or None,
+        "admin_comment": booking.admin_comment,
+        "user_comment": booking.user_comment,
+        "proposed_date": booking.proposed_date.strftime("%Y-%m-%d") if booking.proposed_date else None,
+        "proposed_time_slot": booking.proposed_time_slot,
+        "counter_proposal_date": booking.counter_proposal_date.strftime("%Y-%m-%d") if booking.counter_proposal_date else None,
+        "counter_proposal_time_slot": booking.counter_proposal_time_slot,
+        "last_action_by": booking.last_action_by,
+        "user_response": booking.user_response,
+        "created_at": booking.created_at.strftime("%Y-%m-%d %H:%M"),
+        "updated_at": booking.updated_at.strftime("%Y-%m-%d %H:%M")
+    }
+
+
+def present_item(name, item):
+    """
+    Completa un elemento serializado con las URLs de su comprobante. Las URLs firmadas caducan
+    (MEDIA_URL_SIGNATURE_TTL), así que la proyección guarda solo el nombre del archivo y las URLs
+    se firman al leer.
+    """
+    item = dict(item)
+    file_name = item.pop("voucher_name", None)
+    if not file_name:
+        item["voucher_path"] = item["voucher_variants"] = None
+        return item
+
+    model, field = (RentPaymentHistory, "receipt_image") if name in RENT_BUCKETS else (LaundryBooking, "voucher_image")
+    voucher = FieldFile(None, model._meta.get_field(field), file_name)
+    item["voucher_path"] = voucher.url
+    item["voucher_variants"] = variant_urls(voucher)
+    return item
+
+
+def present_bucket(bucket):
+    return [present_item(bucket.name, item) for item in bucket.items]
+
+
+def bucket_queryset(name):
+    """Devuelve (queryset, función de serialización) para un bucket del dashboard"""
+    if name in RENT_BUCKETS:
+        queryset = (
+            RentPaymentHistory.objects
+            .filter(status=RENT_BUCKETS[name])
+            .select_related("contract__user", "contract__room__building")
+            .order_by(*RENT_ORDERING)
+        )
+        return queryset, serialize_rent_payment
+
+    if name in LAUNDRY_BUCKETS:
+        queryset = (
+            LaundryBooking.objects
+            .filter(last_action_by=LAUNDRY_BUCKETS[name], status__in=LAUNDRY_OPEN_STATUSES)
+            .select_related("user")
+            .order_by(*LAUNDRY_ORDERING)
+        )
+        return queryset, serialize_laundry_booking
+
+    raise KeyError(name)
+
+
+########################################################################################################
+####                                                                                                ####
+####            Mantenimiento incremental de la proyección                                          ####
+####                                                                                                ####
+########################################################################################################
+def refresh_buckets(names=None):
+    """
+    Recalcula el contador y los elementos recientes de los buckets indicados
+    (todos si no se indica ninguno). Cada bucket cuesta un COUNT y un SELECT acotado.
+    """
+    names = list(names) if names else list(RENT_BUCKETS) + list(LAUNDRY_BUCKETS)
+    limit = settings.ADMIN_DASHBOARD_RECENT_ITEMS
+    buckets = {}
+
+    for name in names:
+        queryset, serialize = bucket_queryset(name)
+        buckets[name] = DashboardBucket.objects.update_or_create(
+            name=name,
+            defaults={
+                "count": queryset.count(),
+                "items": [serialize(obj) for obj in queryset[:limit]],
+            },
+        )[0]
+
+    return buckets
+
+
+# Sin los campos que deciden el bucket (.only()/.defer()) no se sabe de dónde salió la fila
+UNKNOWN_BUCKET = object()
+
+
+def bucket_of(instance):
+    """Bucket en el que aparece un pago o una reserva (None si en ninguno)"""
+    fields = instance.__dict__
+    if isinstance(instance, RentPaymentHistory):
+        if "status" not in fields:
+            return UNKNOWN_BUCKET
+        return next((name for name, status in RENT_BUCKETS.items() if status == fields["status"]), None)
+
+    if "status" not in fields or "last_action_by" not in fields:
+        return UNKNOWN_BUCKET
+    if fields["status"] not in LAUNDRY_OPEN_STATUSES:
+        return None
+    return next((name for name, actor in LAUNDRY_BUCKETS.items() if actor == fields["last_action_by"]), None)
+
+
+_dirty = threading.local()
+
+
+def _dirty_buckets():
+    if not hasattr(_dirty, "names"):
+        _dirty.names = set()
+    return _dirty.names
+
+
+def flush_dirty_buckets():
+    """Refresca una sola vez los buckets marcados durante la transacción"""
+    dirty = _dirty_buckets()
+    if not dirty:
+        return
+    names = set(dirty)
+    dirty.clear()
+    refresh_buckets(names)
+
+
+def mark_buckets_dirty(names):
+    """
+    Marca buckets para recontar cuando la transacción actual confirme. Varias
+    transiciones en la misma transacción (p. ej. borrados en cascada) producen
+    un único refresco.
+    """
+    _dirty_buckets().update(names)
+    # Un solo refresco por transacción (o savepoint): si ya está programado no se repite
+    connection = transaction.get_connection()
+    if connection.in_atomic_block and any(
+        func is flush_dirty_buckets and sids == set(connection.savepoint_ids)
+        for sids, func, _ in connection.run_on_commit
+    ):
+        return
+    transaction.on_commit(flush_dirty_buckets)
+
+
+def track_bucket_change(previous, current, names):
+    """
+    Una fila pasó del bucket `previous` a `current` (None: ninguno). Solo se recuentan los
+    buckets tocados (COUNT por el índice de estado): guardar una fila que no está en ningún
+    bucket no cuesta nada. Como se recuenta en lugar de sumar, una foto desactualizada de la
+    fila no acumula errores. Sin datos para decidir se recuentan todos los `names`.
+    """
+    if previous is UNKNOWN_BUCKET or current is UNKNOWN_BUCKET:
+        mark_buckets_dirty(names)
+        return
+
+    touched = {previous, current} - {None}
+    if touched:
+        mark_buckets_dirty(touched)
+
+
+def get_snapshot():
+    """Lee la proyección completa en una consulta, construyendo los buckets que falten"""
+    buckets = {bucket.name: bucket for bucket in DashboardBucket.objects.all()}
+
+    # Los buckets guardados con URLs ya firmadas (formato anterior) se reconstruyen
+    missing = [
+        name for name in list(RENT_BUCKETS) + list(LAUNDRY_BUCKETS)
+        if name not in buckets or any("voucher_path" in item for item in buckets[name].items)
+    ]
+    if missing:
+        buckets.update(refresh_buckets(missing))
+
+    return buckets
+
+
+########################################################################################################
+####                                                                                                ####
+####            Dashboard del inquilino                                                             ####
+####                                                                                                ####
+########################################################################################################
+# Pagos que el inquilino aún debe pagar; el próximo a vencer es el de mes más antiguo
+DUE_STATUSES = ["overdue", "rejected", "upcoming"]
+
+
+def user_dashboard_key(user_id, today=None):
+    """
+    Clave por inquilino y día. Incluye la versión de RentPaymentHistory para que las
+    operaciones masivas (que no emiten señales) invaliden todos los dashboards con bump_version.
+    """
+    today = today or date.today()
+    version = get_versions([RentPaymentHistory])[0]
+    return f"user_dashboard:{user_id}:{today.isoformat()}:{version}"
+
+
+def build_user_dashboard(user, today=None):
+    """
+    Pagos y reservas del inquilino en dos consultas acotadas: los pagos de los últimos
+    USER_DASHBOARD_HISTORY_MONTHS meses, los abiertos de cualquier mes y el próximo por vencer;
+    y las reservas abiertas o de los últimos USER_DASHBOARD_LAUNDRY_DAYS días.
+    """
+    today = today or date.today()
+    period = current_billing_period()
+    history_start = period - relativedelta(months=settings.USER_DASHBOARD_HISTORY_MONTHS - 1)
+
+    payments = RentPaymentHistory.objects.filter(contract__user=user)
+    next_upcoming = payments.filter(status="upcoming").order_by("billing_period", "id").values("id")[:1]
+    in_history = Q(billing_period__gte=history_start, billing_period__lte=period)
+    rows = list(
+        payments
+        .filter(
+            in_history
+            | Q(status__in=RentPaymentHistory.OUTSTANDING_STATUSES)
+            | Q(id=Subquery(next_upcoming))
+        )
+        .order_by("-billing_period", "-id")
+        .values("id", "month_paid", "billing_period", "payment_date", "status")
+    )
+
+    due = [
+        row for row in rows
+        if row["status"] in DUE_STATUSES and row["billing_period"] is not None
+    ]
+    next_due = min(due, key=lambda row: row["billing_period"]) if due else None
+
+    bookings = (
+        LaundryBooking.objects
+        .filter(user=user)
+        .filter(
+            Q(status__in=LAUNDRY_OPEN_STATUSES)
+            | Q(date__gte=today - timedelta(days=settings.USER_DASHBOARD_LAUNDRY_DAYS))
+        )
+        .order_by("-date", "-time_slot")
+        .values(
+            "id", "date", "time_slot", "status",
+            "proposed_date", "proposed_time_slot",
+            "counter_proposal_date", "counter_proposal_time_slot",
+            "admin_comment"
+        )
+    )
+
+    return {
+        "payments": {
+            "pending": [
+                {
+                    "id": str(row["id"]),
+                    "month_paid": row["month_paid"],
+                    "payment_date": row["payment_date"].isoformat() if row["payment_date"] else None,
+                }
+                for row in rows if row["status"] == "pending_review"
+            ],
+            "next_due": {
+                "id": str(next_due["id"]),
+                "month_paid": next_due["month_paid"],
+                "status": next_due["status"],
+            } if next_due else None,
+            "history": [
+                row["month_paid"] for row in rows
+                if row["billing_period"] and history_start <= row["billing_period"] <= period
+            ],
+        },
+        "laundry": {
+            "bookings": [
+                {
+                    **booking,
+                    "id": str(booking["id"]),
+                    **{
+                        field: booking[field].isoformat() if booking[field] else None
+                        for field in ("date", "proposed_date", "counter_proposal_date")
+                    },
+                }
+                for booking in bookings
+            ]
+        },
+    }
+
+
+def get_user_dashboard(user):
+    """Dashboard del inquilino desde cache; se invalida al cambiar sus pagos o reservas"""
+    key = user_dashboard_key(user.pk)
+    data = cache.get(key)
+    if data is None:
+        data = build_user_dashboard(user)
+        cache.set(key, data, settings.USER_DASHBOARD_CACHE_TTL)
+    return data
+
+
+def invalidate_user_dashboard(user_id):
+    """Borra el dashboard ya y otra vez al confirmar (por si alguien lo recalculó en medio)"""
+    invalidate_user_dashboards([user_id])
+
+
+def invalidate_user_dashboards(user_ids):
+    """Como invalidate_user_dashboard, para varios inquilinos en una sola operación de cache"""
+    keys = [user_dashboard_key(user_id) for user_id in user_ids if user_id is not None]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def payment_user_id(payment):
+    """Inquilino de un pago, sin consultar si el contrato ya está cargado"""
+    if "contract" in payment._state.fields_cache:
+        return payment.contract.user_id
+    return Contract.objects.filter(id=payment.contract_id).values_list("user_id", flat=True).first()
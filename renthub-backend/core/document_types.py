@@ -0,0 +1,57 @@
+import threading
+import time
+
+from django.conf import settings
+
+from core.models import DocumentType
+from core.response_cache import get_versions
+
+
+########################################################################################################
+####                                                                                                ####
+####            Registro en memoria de los tipos de documento                                       ####
+####                                                                                                ####
+########################################################################################################
+class DocumentTypeRegistry:
+    """
+    Copia por proceso de la tabla DocumentType (unas pocas filas que casi no cambian).
+    Se recarga entera cuando sube la versión del modelo (ver core/response_cache.py), que se
+    comprueba como mucho cada DOCUMENT_TYPE_REGISTRY_CHECK_SECONDS; así los serializadores
+    resuelven el tipo de cada fila sin consultar la base.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_id = {}
+        self.version = None
+        self.checked_at = None
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < settings.DOCUMENT_TYPE_REGISTRY_CHECK_SECONDS:
+            return
+
+        with self.lock:
+            version = get_versions([DocumentType])[0]
+            if version != self.version:
+                self.by_id = {
+                    str(document_type_id): {"id": str(document_type_id), "name": name}
+                    for document_type_id, name in DocumentType.objects.values_list("id", "name")
+                }
+                self.version = version
+            self.checked_at = now
+
+    def invalidate(self):
+        """Fuerza la comprobación de versión en la próxima búsqueda de este proceso"""
+        self.checked_at = None
+
+    def get(self, document_type_id):
+        """{"id", "name"} del tipo de documento, o None si no existe"""
+        if document_type_id is None:
+            return None
+        self.refresh()
+        entry = self.by_id.get(str(document_type_id))
+        return dict(entry) if entry else None
+
+
+document_types = DocumentTypeRegistry()
@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+
+########################################################################################################
+####                                                                                                ####
+####            Variantes reducidas de las imágenes subidas                                         ####
+####                                                                                                ####
+########################################################################################################
+# Nombre de la variante -> tamaño máximo (ancho, alto). Se conserva la proporción.
+IMAGE_VARIANTS = {
+    "thumb": (200, 200),
+    "preview": (1024, 1024),
+}
+VARIANTS_FOLDER = "variants"
+VARIANT_QUALITY = 80
+
+# Marca compartida de "variantes generadas" por archivo: las lecturas no consultan el disco.
+# Una marca negativa caduca pronto para que se note la generación en segundo plano.
+VARIANTS_READY_KEY = "image_variants:{}"
+VARIANTS_PENDING_TIMEOUT = 60
+# Archivos con variantes ya vistos por este proceso (las variantes no cambian de nombre)
+VARIANTS_MEMO_MAX = 50000
+_ready_names = set()
+
+# Pocos hilos: la generación es CPU y disco, y no debe competir con las peticiones
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-variants")
+
+
+def variant_name(name, variant):
+    """'payments/rent/abc.png' -> 'variants/thumb/payments/rent/abc.jpg'"""
+    base, _ = posixpath.splitext(name)
+    return posixpath.join(VARIANTS_FOLDER, variant, f"{base}.jpg")
+
+
+def generate_variants(name, storage=default_storage):
+    """Genera (o regenera) todas las variantes de un archivo. Devuelve las que se crearon."""
+    try:
+        with storage.open(name, "rb") as original:
+            image = Image.open(original)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (FileNotFoundError, UnidentifiedImageError, OSError) as e:
+        logger.warning(f"No se pudieron generar variantes de {name}: {e}")
+        return []
+
+    # JPEG no admite transparencia: se aplana sobre fondo blanco
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    created = []
+    for variant, size in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.Resampling.LANCZOS)
+
+        buffer = BytesIO()
+        resized.save(buffer, format="JPEG", quality=VARIANT_QUALITY, optimize=True, progressive=True)
+
+        target = variant_name(name, variant)
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, ContentFile(buffer.getvalue()))
+        created.append(target)
+
+    cache.set(variants_ready_key(name), True, None)
+    return created
+
+
+def has_variants(name, storage=default_storage):
+    return all(storage.exists(variant_name(name, variant)) for variant in IMAGE_VARIANTS)
+
+
+def delete_variants(name, storage=default_storage):
+    cache.delete(variants_ready_key(name))
+    _ready_names.discard(name)
+    for variant in IMAGE_VARIANTS:
+        target = variant_name(name, variant)
+        if storage.exists(target):
+            storage.delete(target)
+
+
+def variants_ready_key(name):
+    return VARIANTS_READY_KEY.format(hashlib.md5(name.encode()).hexdigest())
+
+
+def variants_ready(name, storage=default_storage):
+    """
+    ¿Existen ya las variantes del archivo? Se responde con la marca del cache; solo sin
+    marca (cache vacío, archivos anteriores a la marca) se mira el disco y se guarda el resultado.
+    """
+    if name in _ready_names:
+        return True
+
+    key = variants_ready_key(name)
+    ready = cache.get(key)
+    if ready is None:
+        ready = has_variants(name, storage)
+        cache.set(key, ready, None if ready else VARIANTS_PENDING_TIMEOUT)
+
+    if ready:
+        if len(_ready_names) >= VARIANTS_MEMO_MAX:
+            _ready_names.clear()
+        _ready_names.add(name)
+    return ready
+
+
+def schedule_variants(file_field):
+    """
+    Programa la generación de variantes fuera de la petición, cuando la transacción
+    confirme. Con IMAGE_VARIANTS_ASYNC = False se generan en línea (tests, comandos).
+    Solo se llama cuando la fila empieza a usar otro archivo (ver core/signals.py).
+    """
+    if not file_field or not file_field.name:
+        return
+    name = file_field.name
+    # Un contenido repetido (almacenamiento por hash) ya puede tener sus variantes
+    if cache.get(variants_ready_key(name)):
+        return
+
+    def run():
+        if settings.IMAGE_VARIANTS_ASYNC:
+            _executor.submit(generate_variants, name)
+        else:
+            generate_variants(name)
+
+    transaction.on_commit(run)
+
+
+def variant_urls(file_field, storage=default_storage):
+    """
+    URLs de las variantes de un archivo. Mientras las variantes no existan se
+    devuelve la URL del original, para que el cliente siempre tenga algo que mostrar.
+    """
+    if not file_field or not file_field.name:
+        return None
+
+    urls = {}
+    ready = variants_ready(file_field.name, storage)
+    for variant in IMAGE_VARIANTS:
+        urls[variant] = storage.url(variant_name(file_field.name, variant)) if ready else file_field.url
+    return urls
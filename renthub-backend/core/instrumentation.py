@@ -0,0 +1,112 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+########################################################################################################
+####                                                                                                ####
+####            Registro de consultas SQL por petición                                              ####
+####                                                                                                ####
+########################################################################################################
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?|\d+)\s*,?)+\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Forma de la consulta: sin literales y con las listas IN (...) colapsadas"""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+class RepeatedQueryError(Exception):
+    """La misma forma de consulta se repitió más de QUERY_REPEAT_THRESHOLD veces (N+1)"""
+
+
+def allow_repeated_queries(view_method):
+    """
+    Excluye una vista o acción del fallo por consultas repetidas (se sigue registrando en el log).
+    Para operaciones por lotes que por naturaleza trabajan fila a fila.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        # El middleware ve el HttpRequest de Django, no el Request de DRF
+        getattr(request, "_request", request).allow_repeated_queries = True
+        return view_method(self, request, *args, **kwargs)
+    return wrapper
+
+
+class QueryRecorder:
+    """execute_wrapper que cuenta consultas, tiempo en la base y repeticiones por forma"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[normalize_sql(sql)] += 1
+
+    def repeated(self, threshold):
+        return [(shape, times) for shape, times in self.shapes.most_common() if times > threshold]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Mide cada petición: número de consultas, tiempo total en la base y consultas repetidas.
+    Lo publica en el log y en la cabecera Server-Timing (visible en las DevTools del navegador).
+    Con QUERY_REPEAT_RAISE (desarrollo y tests) una forma repetida más de
+    QUERY_REPEAT_THRESHOLD veces hace fallar la petición para que el N+1 no llegue a producción,
+    salvo en las vistas marcadas con @allow_repeated_queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_INSTRUMENTATION:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        response["Server-Timing"] = (
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+            f"total;dur={total * 1000:.1f}"
+        )
+        logger.info(
+            "%s %s %s: %d consultas, %.1f ms en la base, %.1f ms en total",
+            request.method, request.path, response.status_code,
+            recorder.count, recorder.duration * 1000, total * 1000,
+        )
+
+        repeated = recorder.repeated(settings.QUERY_REPEAT_THRESHOLD)
+        if repeated:
+            details = "\n".join(f"  {times}x {shape}" for shape, times in repeated)
+            logger.warning("%s %s repite consultas (posible N+1):\n%s", request.method, request.path, details)
+            if settings.QUERY_REPEAT_RAISE and not getattr(request, "allow_repeated_queries", False):
+                raise RepeatedQueryError(f"{request.method} {request.path} repite consultas:\n{details}")
+
+        return response
@@ -0,0 +1,368 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from core.dashboard import (LAUNDRY_BUCKETS, UNKNOWN_BUCKET, bucket_of, invalidate_user_dashboards,
+                            track_bucket_change)
+from core.models import LaundryBooking, LaundrySlotClaim
+
+
+########################################################################################################
+####                                                                                                ####
+####            Catálogo de horarios de la lavandería                                               ####
+####                                                                                                ####
+########################################################################################################
+def build_time_slots(open_hour, close_hour, slot_minutes):
+    """Franjas 'HH:MM-HH:MM' entre la apertura y el cierre, con el formato que usa el frontend"""
+    slots = []
+    start = open_hour * 60
+    while start + slot_minutes <= close_hour * 60:
+        end = start + slot_minutes
+        slots.append(f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}")
+        start = end
+    return slots
+
+
+LAUNDRY_TIME_SLOTS = build_time_slots(
+    settings.LAUNDRY_OPEN_HOUR, settings.LAUNDRY_CLOSE_HOUR, settings.LAUNDRY_SLOT_MINUTES
+)
+
+# Reservas confirmadas; el resto de estados abiertos retienen su franja mientras se negocia
+LAUNDRY_BOOKED_STATUSES = ["approved"]
+
+
+def slot_start(day, time_slot):
+    hour, minute = time_slot.split("-")[0].split(":")
+    return datetime.combine(day, datetime.min.time()).replace(hour=int(hour), minute=int(minute))
+
+
+########################################################################################################
+####                                                                                                ####
+####            Grilla de disponibilidad (día × franja)                                             ####
+####                                                                                                ####
+########################################################################################################
+def grid_cache_key(day):
+    return f"laundry_grid:{day.isoformat()}"
+
+
+def compute_availability_grid(first_day, days):
+    """Ocupación de cada franja de los próximos `days` días en una sola consulta agregada"""
+    last_day = first_day + timedelta(days=days - 1)
+    counts = {}
+    for row in (
+        LaundrySlotClaim.objects
+        .filter(date__range=(first_day, last_day))
+        .values("date", "time_slot", "booking__status")
+        .annotate(total=Count("id"))
+    ):
+        key = (row["date"], row["time_slot"])
+        booked, held = counts.get(key, (0, 0))
+        if row["booking__status"] in LAUNDRY_BOOKED_STATUSES:
+            booked += row["total"]
+        else:
+            held += row["total"]
+        counts[key] = (booked, held)
+
+    capacity = settings.LAUNDRY_SLOT_CAPACITY
+    grid = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        slots = []
+        for time_slot in LAUNDRY_TIME_SLOTS:
+            booked, pending = counts.get((day, time_slot), (0, 0))
+            slots.append({
+                "time_slot": time_slot,
+                "booked": booked,
+                "pending": pending,
+                "available": booked + pending < capacity,
+            })
+        grid.append({"date": day.isoformat(), "slots": slots})
+    return grid
+
+
+def get_availability_grid(now=None):
+    """
+    Grilla de los próximos días. Se guarda en cache por día y se invalida con cada cambio
+    de una reserva; las franjas de hoy que ya empezaron se marcan no disponibles al leerla.
+    """
+    now = now or datetime.now()
+    today = now.date()
+    key = grid_cache_key(today)
+
+    grid = cache.get(key)
+    if grid is None:
+        grid = compute_availability_grid(today, settings.LAUNDRY_GRID_DAYS)
+        cache.set(key, grid, 60 * 60 * 24)
+
+    for slot in grid[0]["slots"]:
+        if slot["available"] and slot_start(today, slot["time_slot"]) <= now:
+            slot["available"] = False
+    for day in grid:
+        day["available"] = any(slot["available"] for slot in day["slots"])
+    return grid
+
+
+def invalidate_availability_grid(today=None):
+    """Borra la grilla ya y otra vez al confirmar (por si alguien la recalculó en medio)"""
+    key = grid_cache_key(today or date.today())
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+########################################################################################################
+####                                                                                                ####
+####            Reclamo atómico de franjas                                                          ####
+####                                                                                                ####
+########################################################################################################
+class SlotUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "La franja ya está completa. Elige otro horario."
+    default_code = "slot_unavailable"
+
+
+def parse_slot(day, time_slot):
+    """Valida fecha (date o 'YYYY-MM-DD') y franja del catálogo; devuelve la fecha como date"""
+    if isinstance(day, str):
+        try:
+            day = date.fromisoformat(day)
+        except ValueError:
+            raise ValidationError({"error": "Formato de fecha inválido. Usa YYYY-MM-DD."})
+    if time_slot not in LAUNDRY_TIME_SLOTS:
+        raise ValidationError({"error": f"Horario inválido: {time_slot}."})
+    return day
+
+
+def claim_slot(booking, day, time_slot):
+    """
+    Asigna a la reserva una lavadora libre en la franja (o la mueve a esa franja). Cada intento
+    es un único INSERT o UPDATE protegido por la restricción única: si otra reserva ganó la
+    lavadora, la base lo rechaza y se prueba la siguiente. Sin bloqueos ni leer-y-escribir.
+    """
+    day = parse_slot(day, time_slot)
+
+    # Solo evita intentos que seguro fallan; la garantía la da la restricción
+    taken = set(
+        LaundrySlotClaim.objects
+        .filter(date=day, time_slot=time_slot)
+        .exclude(booking=booking)
+        .values_list("machine", flat=True)
+    )
+    for machine in range(1, settings.LAUNDRY_SLOT_CAPACITY + 1):
+        if machine in taken:
+            continue
+        try:
+            with transaction.atomic():
+                moved = LaundrySlotClaim.objects.filter(booking=booking).update(
+                    date=day, time_slot=time_slot, machine=machine
+                )
+                if not moved:
+                    LaundrySlotClaim.objects.create(
+                        booking=booking, date=day, time_slot=time_slot, machine=machine
+                    )
+            return machine
+        except IntegrityError:
+            continue
+
+    raise SlotUnavailable()
+
+
+def target_slot(booking):
+    """Franja que la reserva tiene retenida según su estado: (fecha, franja)"""
+    if booking.status == "proposed":
+        return booking.proposed_date, booking.proposed_time_slot
+    if booking.status == "counter_proposal":
+        return booking.counter_proposal_date, booking.counter_proposal_time_slot
+    return booking.date, booking.time_slot
+
+
+def release_slot(booking):
+    LaundrySlotClaim.objects.filter(booking=booking).delete()
+
+
+########################################################################################################
+####                                                                                                ####
+####            Sugerencia de franjas libres                                                        ####
+####                                                                                                ####
+########################################################################################################
+class SlotOccupancy:
+    """
+    Ocupación de las franjas del catálogo entre `first_day` y `last_day` (qué lavadoras tiene
+    tomadas cada una), cargada con una sola consulta. Las franjas forman una línea de tiempo
+    ordenada y la búsqueda avanza con dos punteros desde la franja pedida hacia atrás y hacia
+    delante, por cercanía.
+    """
+
+    def __init__(self, first_day, last_day, exclude_bookings=()):
+        self.capacity = settings.LAUNDRY_SLOT_CAPACITY
+        self.starts = []
+        self.keys = []
+        day = first_day
+        while day <= last_day:
+            for time_slot in LAUNDRY_TIME_SLOTS:
+                self.starts.append(slot_start(day, time_slot))
+                self.keys.append((day, time_slot))
+            day += timedelta(days=1)
+
+        self.machines = defaultdict(set)
+        claims = LaundrySlotClaim.objects.filter(date__range=(first_day, last_day))
+        if exclude_bookings:
+            claims = claims.exclude(booking__in=exclude_bookings)
+        for day, time_slot, machine in claims.values_list("date", "time_slot", "machine"):
+            self.machines[(day, time_slot)].add(machine)
+
+    def is_free(self, key):
+        return len(self.machines.get(key, ())) < self.capacity
+
+    def take(self, day, time_slot):
+        """Toma en memoria la lavadora libre más baja de la franja y la devuelve"""
+        taken = self.machines[(day, time_slot)]
+        machine = next(machine for machine in range(1, self.capacity + 1) if machine not in taken)
+        taken.add(machine)
+        return machine
+
+    def hold(self, claim):
+        self.machines[(claim.date, claim.time_slot)].add(claim.machine)
+
+    def release(self, claim):
+        self.machines[(claim.date, claim.time_slot)].discard(claim.machine)
+
+    def nearest_free(self, target, limit, now):
+        """Hasta `limit` franjas libres y futuras, ordenadas por distancia a `target`"""
+        target = max(target, now)
+        right = bisect_left(self.starts, target)
+        left = right - 1
+        found = []
+        while len(found) < limit and (left >= 0 or right < len(self.starts)):
+            # Se avanza por el lado cuya franja está más cerca del objetivo
+            if right < len(self.starts) and (left < 0 or self.starts[right] - target <= target - self.starts[left]):
+                index, right = right, right + 1
+            else:
+                index, left = left, left - 1
+            if self.starts[index] <= now:
+                continue
+            key = self.keys[index]
+            if self.is_free(key):
+                found.append(key)
+        return found
+
+
+def requested_slot(booking):
+    """Franja que el inquilino pidió por última vez"""
+    if booking.status == "counter_proposal" and booking.counter_proposal_date:
+        return booking.counter_proposal_date, booking.counter_proposal_time_slot
+    return booking.date, booking.time_slot
+
+
+def suggestion_window(days, now):
+    return now.date(), max(days) + timedelta(days=settings.LAUNDRY_SUGGESTION_DAYS)
+
+
+def suggest_slots(booking, limit=3, now=None):
+    """Franjas libres más cercanas a la pedida por la reserva (sin contar la que ya retiene)"""
+    now = now or datetime.now()
+    day, time_slot = requested_slot(booking)
+    first_day, last_day = suggestion_window([day, now.date()], now)
+    occupancy = SlotOccupancy(first_day, last_day, exclude_bookings=[booking])
+
+    target = slot_start(day, time_slot) if time_slot in LAUNDRY_TIME_SLOTS else datetime.combine(day, now.time())
+    return [
+        {"date": day.isoformat(), "time_slot": time_slot}
+        for day, time_slot in occupancy.nearest_free(target, limit, now)
+    ]
+
+
+# Veces que se reintenta un lote si otras peticiones ganan alguna de sus lavadoras
+BATCH_PROPOSE_ATTEMPTS = 5
+
+
+def propose_nearest_slots(bookings, admin, now=None):
+    """
+    Propone a cada reserva la franja libre más cercana a la que pidió. La ocupación y los
+    reclamos del lote se cargan una vez y el reparto se hace en memoria; después se escribe
+    todo junto (un DELETE y un INSERT de reclamos, un UPDATE de reservas), así que el número
+    de consultas no crece con el lote. La restricción única sigue garantizando que no haya dos
+    reservas en la misma lavadora: si otra petición ganó alguna entre la lectura y la
+    escritura, el INSERT falla y se repite el lote con la ocupación recargada.
+    Devuelve (propuestas, sin franja libre).
+    """
+    now = now or datetime.now()
+    bookings = list(bookings)
+    if not bookings:
+        return [], []
+
+    requested = {booking.pk: requested_slot(booking) for booking in bookings}
+    days = [day for day, _ in requested.values()] + [now.date()]
+    first_day, last_day = suggestion_window(days, now)
+
+    for _ in range(BATCH_PROPOSE_ATTEMPTS):
+        occupancy = SlotOccupancy(first_day, last_day)
+        current = {claim.booking_id: claim for claim in LaundrySlotClaim.objects.filter(booking__in=bookings)}
+
+        plan, unavailable = [], []
+        for booking in bookings:
+            # La lavadora que la reserva ya retiene cuenta como libre para ella misma
+            claim = current.get(booking.pk)
+            if claim:
+                occupancy.release(claim)
+            day, time_slot = requested[booking.pk]
+            target = slot_start(day, time_slot) if time_slot in LAUNDRY_TIME_SLOTS else datetime.combine(day, now.time())
+            candidates = occupancy.nearest_free(target, 1, now)
+            if candidates:
+                candidate_day, candidate_slot = candidates[0]
+                plan.append((booking, candidate_day, candidate_slot, occupancy.take(candidate_day, candidate_slot)))
+            else:
+                if claim:
+                    occupancy.hold(claim)
+                unavailable.append(booking)
+
+        try:
+            with transaction.atomic():
+                save_proposals(plan, admin)
+        except IntegrityError:
+            # Otro proceso tomó alguna lavadora después de cargar la ocupación
+            continue
+        return [booking for booking, *_ in plan], unavailable
+
+    raise SlotUnavailable("Las franjas cambiaron mientras se proponían. Vuelve a intentarlo.")
+
+
+def save_proposals(plan, admin):
+    """
+    Escribe las propuestas del lote. bulk_update no emite señales: se hace aquí lo que haría
+    post_save de cada reserva (buckets del dashboard, grilla y dashboards de los inquilinos).
+    """
+    if not plan:
+        return
+    bookings = [booking for booking, *_ in plan]
+    LaundrySlotClaim.objects.filter(booking__in=bookings).delete()
+    LaundrySlotClaim.objects.bulk_create([
+        LaundrySlotClaim(booking=booking, date=day, time_slot=time_slot, machine=machine)
+        for booking, day, time_slot, machine in plan
+    ])
+
+    updated_at = timezone.now()
+    for booking, day, time_slot, _ in plan:
+        booking.status = "proposed"
+        booking.proposed_date = day
+        booking.proposed_time_slot = time_slot
+        booking.admin = admin
+        booking.last_action_by = "admin"
+        booking.updated_at = updated_at
+    LaundryBooking.objects.bulk_update(
+        bookings, ["status", "proposed_date", "proposed_time_slot", "admin", "last_action_by", "updated_at"]
+    )
+
+    for booking in bookings:
+        current = bucket_of(booking)
+        track_bucket_change(getattr(booking, "_dashboard_bucket", UNKNOWN_BUCKET), current, LAUNDRY_BUCKETS)
+        booking._dashboard_bucket = current
+    invalidate_user_dashboards({booking.user_id for booking in bookings})
+    invalidate_availability_grid()
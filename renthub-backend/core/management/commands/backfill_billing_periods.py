@@ -0,0 +1,65 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import RentPaymentHistory, billing_period_from_month
+
+
+class Command(BaseCommand):
+    help = (
+        "Completa billing_period (fecha) a partir de month_paid (texto) en los pagos existentes, "
+        "por lotes cortos para no bloquear la tabla. Es idempotente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000, help="Filas por lote")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        pending = RentPaymentHistory.objects.filter(billing_period__isnull=True).order_by("id")
+
+        total = pending.count()
+        if not total:
+            self.stdout.write(self.style.SUCCESS("✅ Todos los pagos tienen billing_period"))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"🔄 Convirtiendo {total} pagos en lotes de {batch_size}..."))
+
+        updated = 0
+        invalid = 0
+        last_id = None
+        started = time.monotonic()
+
+        while True:
+            batch = pending if last_id is None else pending.filter(id__gt=last_id)
+            rows = list(batch.values_list("id", "month_paid")[:batch_size])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            # Un UPDATE por mes distinto dentro del lote, en una transacción corta
+            by_period = defaultdict(list)
+            for payment_id, month_paid in rows:
+                period = billing_period_from_month(month_paid)
+                if period is None:
+                    invalid += 1
+                    continue
+                by_period[period].append(payment_id)
+
+            with transaction.atomic():
+                for period, ids in by_period.items():
+                    updated += RentPaymentHistory.objects.filter(
+                        id__in=ids, billing_period__isnull=True
+                    ).update(billing_period=period)
+
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f"  {updated}/{total} pagos · {updated / elapsed:.0f} filas/s")
+
+        if invalid:
+            self.stdout.write(self.style.WARNING(f"⚠️  {invalid} pagos con month_paid inválido quedaron sin convertir"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 {updated} pagos convertidos en {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.cache import cache_metrics, reset_cache_metrics
+
+
+class Command(BaseCommand):
+    help = "Muestra los aciertos y fallos acumulados del cache compartido"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Pone los contadores a cero")
+
+    def handle(self, *args, **options):
+        if options["reset"]:
+            reset_cache_metrics()
+            self.stdout.write(self.style.SUCCESS("✅ Contadores del cache reiniciados"))
+            return
+
+        metrics = cache_metrics()
+        backend = settings.CACHES["default"]["BACKEND"]
+        if metrics["hits"] is None:
+            self.stdout.write(self.style.WARNING(f"⚠️ {backend} no registra métricas"))
+            return
+
+        ratio = f"{metrics['hit_ratio'] * 100:.1f}%" if metrics["hit_ratio"] is not None else "-"
+        self.stdout.write(
+            f"📊 {backend}: {metrics['hits']} aciertos, {metrics['misses']} fallos, tasa de acierto {ratio}"
+        )
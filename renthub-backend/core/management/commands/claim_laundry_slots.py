@@ -0,0 +1,47 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from core.laundry import SlotUnavailable, claim_slot, invalidate_availability_grid, target_slot
+from core.models import LaundryBooking
+
+
+class Command(BaseCommand):
+    help = (
+        "Asigna lavadora a las reservas abiertas que aún no tienen franja reclamada "
+        "(las anteriores al control de capacidad), por orden de llegada. Es idempotente."
+    )
+
+    def handle(self, *args, **options):
+        bookings = (
+            LaundryBooking.objects
+            .filter(status__in=["pending", "approved", "proposed", "counter_proposal"], slot_claim__isnull=True)
+            .order_by("created_at")
+        )
+
+        claimed = conflicts = invalid = 0
+        for booking in bookings.iterator(chunk_size=500):
+            day, time_slot = target_slot(booking)
+            if day is None or day < date.today():
+                continue
+            try:
+                with transaction.atomic():
+                    claim_slot(booking, day, time_slot)
+                claimed += 1
+            except SlotUnavailable:
+                conflicts += 1
+                self.stdout.write(self.style.WARNING(
+                    f"  ⚠️ {booking.id}: {day} {time_slot} ya está completa, revisar a mano"
+                ))
+            except ValidationError:
+                invalid += 1
+
+        if claimed:
+            # La grilla cacheada de disponibilidad no incluye las franjas recién reclamadas
+            invalidate_availability_grid()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 {claimed} reservas con lavadora asignada · {conflicts} en conflicto · {invalid} con horario inválido"
+        ))
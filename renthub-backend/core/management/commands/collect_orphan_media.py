@@ -0,0 +1,211 @@
+import os
+import posixpath
+import shutil
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.utils import timezone
+
+from core.images import IMAGE_VARIANTS, VARIANTS_FOLDER, variants_ready_key
+from core.models import ALLOWED_IMAGE_EXTENSIONS, MediaBlob
+from core.storage import is_content_addressed
+
+
+def file_fields():
+    """(modelo, campo) de todos los FileField/ImageField del proyecto"""
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.get_fields()
+        if isinstance(field, models.FileField)
+    ]
+
+
+def iter_media_files(root, skip_dirs=()):
+    """Recorre MEDIA_ROOT sin cargar el árbol completo en memoria: (nombre, tamaño, mtime)"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path not in skip_dirs:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    name = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    yield name, stat.st_size, stat.st_mtime
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Busca en MEDIA_ROOT archivos que ninguna fila referencia (ni sus variantes) "
+        "y los borra o los mueve a cuarentena. Recorre el disco por lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Archivos comparados por consulta")
+        parser.add_argument("--min-age", type=int, default=60,
+                            help="Minutos de antigüedad mínima: protege subidas cuya fila aún no se guardó")
+        parser.add_argument("--quarantine", help="Mueve los huérfanos a este directorio en lugar de borrarlos")
+        parser.add_argument("--dry-run", action="store_true", help="Solo informa, no borra ni mueve nada")
+
+    def handle(self, *args, **options):
+        root = os.path.abspath(settings.MEDIA_ROOT)
+        if not os.path.isdir(root):
+            self.stdout.write(self.style.WARNING(f"⚠️ {root} no existe"))
+            return
+
+        dry_run = options["dry_run"]
+        cutoff = (timezone.now() - timedelta(minutes=options["min_age"])).timestamp()
+
+        self.fields = file_fields()
+        # Los valores por defecto (p. ej. la foto de perfil) se comparten y nunca se borran
+        self.protected = {
+            model._meta.get_field(field).default for model, field in self.fields
+            if isinstance(model._meta.get_field(field).default, str)
+        }
+
+        quarantine = None
+        skip_dirs = ()
+        if options["quarantine"]:
+            stamp = timezone.now().strftime("%Y%m%d-%H%M%S")
+            quarantine = os.path.join(os.path.abspath(options["quarantine"]), stamp)
+            skip_dirs = (os.path.abspath(options["quarantine"]),)
+
+        scanned = scanned_bytes = orphans = reclaimed = 0
+        started = time.monotonic()
+
+        for batch in batched(iter_media_files(root, skip_dirs), options["batch_size"]):
+            scanned += len(batch)
+            scanned_bytes += sum(size for _, size, _ in batch)
+
+            candidates = [(name, size) for name, size, mtime in batch if mtime < cutoff]
+            batch_orphans = self.find_orphans([name for name, _ in candidates])
+            sizes = dict(candidates)
+
+            if dry_run:
+                for name in batch_orphans:
+                    self.stdout.write(f"  · {name} ({sizes[name]} bytes)")
+            else:
+                batch_orphans = self.remove_orphans(batch_orphans, root, quarantine)
+
+            orphans += len(batch_orphans)
+            reclaimed += sum(sizes[name] for name in batch_orphans)
+
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f"  {scanned} archivos revisados · {orphans} huérfanos · "
+                f"{scanned / elapsed:.0f} archivos/s · {scanned_bytes / elapsed / 1024 / 1024:.1f} MB/s"
+            )
+
+        elapsed = time.monotonic() - started
+        action = "por liberar (dry-run)" if dry_run else ("en cuarentena" if quarantine else "liberados")
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 {orphans} huérfanos de {scanned} archivos · "
+            f"{reclaimed / 1024 / 1024:.2f} MB {action} en {elapsed:.2f}s"
+        ))
+
+    def find_orphans(self, names):
+        """Huérfanos del lote: archivos (y variantes) cuyo original no referencia ninguna fila"""
+        if not names:
+            return []
+
+        # Cada variante se compara contra los posibles originales (mismo nombre, extensión permitida)
+        originals = {}
+        for name in names:
+            if self.is_temporary(name):
+                originals[name] = set()
+            else:
+                originals[name] = self.variant_sources(name) or {name}
+
+        lookup = set().union(*originals.values())
+        referenced = set(self.protected)
+        for model, field in self.fields:
+            referenced.update(
+                model._default_manager
+                .filter(**{f"{field}__in": lookup})
+                .values_list(field, flat=True)
+            )
+
+        return [name for name in names if not originals[name] & referenced]
+
+    def remove_orphans(self, names, root, quarantine=None):
+        """
+        Borra (o mueve a cuarentena) los huérfanos del lote. Como en delete_stored_file, las
+        filas de MediaBlob quedan bloqueadas (se crean con ref_count=0 si no existían) y las
+        referencias se vuelven a comprobar: una subida del mismo contenido que llegó después
+        del escaneo (retain_blob) conserva su archivo. Devuelve los que se quitaron.
+        """
+        if not names:
+            return []
+
+        sources = {name: self.variant_sources(name) or {name} for name in names}
+        originals = [name for name in names if name in sources[name] and is_content_addressed(name)]
+
+        with transaction.atomic():
+            MediaBlob.objects.bulk_create([MediaBlob(name=name) for name in originals], ignore_conflicts=True)
+            retained = {
+                name for name, ref_count in
+                MediaBlob.objects.select_for_update()
+                .filter(name__in=set().union(*sources.values()))
+                .values_list("name", "ref_count")
+                if ref_count > 0
+            }
+            removed = self.find_orphans([name for name in names if not sources[name] & retained])
+
+            for name in removed:
+                path = os.path.join(root, name)
+                if quarantine:
+                    target = os.path.join(quarantine, name)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.move(path, target)
+                else:
+                    os.remove(path)
+
+            MediaBlob.objects.filter(name__in=originals, ref_count=0).delete()
+
+        # Una variante quitada deja de estar lista: se regenera si su original vuelve a usarse
+        cache.delete_many([
+            variants_ready_key(source) for name in removed if name not in sources[name] for source in sources[name]
+        ])
+        return removed
+
+    @staticmethod
+    def is_temporary(name):
+        # Restos de una escritura interrumpida de ContentAddressedStorage
+        return posixpath.basename(name).startswith(".") and name.endswith(".tmp")
+
+    @staticmethod
+    def variant_sources(name):
+        """'variants/thumb/payments/rent/abc.jpg' -> {'payments/rent/abc.png', 'payments/rent/abc.jpg', ...}
+
+        Se generan los candidatos sin tocar el disco: basta con que la base de datos
+        referencie alguno para conservar la variante.
+        """
+        parts = name.split("/", 2)
+        if len(parts) != 3 or parts[0] != VARIANTS_FOLDER or parts[1] not in IMAGE_VARIANTS:
+            return None
+
+        base = posixpath.splitext(parts[2])[0]
+        return {
+            f"{base}.{ext}"
+            for extension in ALLOWED_IMAGE_EXTENSIONS
+            for ext in (extension, extension.upper())
+        }
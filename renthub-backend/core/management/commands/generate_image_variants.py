@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.images import generate_variants, has_variants
+from core.models import Contract, CustomUser, LaundryBooking, RentPaymentHistory
+
+# Modelo y campo de imagen de cada archivo subido
+IMAGE_FIELDS = [
+    (CustomUser, "profile_photo"),
+    (Contract, "contract_photo"),
+    (RentPaymentHistory, "receipt_image"),
+    (LaundryBooking, "voucher_image"),
+]
+
+
+class Command(BaseCommand):
+    help = "Genera las variantes (miniatura y vista previa) que falten de las imágenes subidas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Regenera también las variantes existentes")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        checked = generated = 0
+
+        for model, field in IMAGE_FIELDS:
+            model_checked = model_generated = 0
+            names = (
+                model.objects
+                .exclude(**{f"{field}__isnull": True})
+                .exclude(**{field: ""})
+                .values_list(field, flat=True)
+                .distinct()
+                .iterator(chunk_size=2000)
+            )
+            for name in names:
+                model_checked += 1
+                if options["force"] or not has_variants(name):
+                    if generate_variants(name):
+                        model_generated += 1
+
+            checked += model_checked
+            generated += model_generated
+            self.stdout.write(f"  {model.__name__}.{field}: {model_checked} revisadas, {model_generated} generadas")
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 {generated} imágenes con variantes nuevas de {checked} revisadas en {elapsed:.2f}s"
+        ))
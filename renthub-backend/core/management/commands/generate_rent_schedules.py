@@ -0,0 +1,85 @@
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.dashboard import RENT_BUCKETS, mark_buckets_dirty
+from core.models import Contract, RentPaymentHistory
+from core.response_cache import bump_version
+from core.standing import sync_payment_standing
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera o extiende el calendario de pagos de los contratos por lotes. "
+        "Es idempotente: solo inserta los meses que todavía no existen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Contratos por lote")
+        parser.add_argument("--contract", action="append", dest="contracts", help="Limitar a uno o más IDs de contrato")
+        parser.add_argument("--dry-run", action="store_true", help="Calcula los meses faltantes sin insertarlos")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        dry_run = options["dry_run"]
+        today = datetime.today().date()
+
+        contracts = Contract.objects.order_by("id")
+        if options["contracts"]:
+            contracts = contracts.filter(id__in=options["contracts"])
+
+        total = contracts.count()
+        self.stdout.write(self.style.SUCCESS(f"🔄 Procesando {total} contratos en lotes de {batch_size}..."))
+
+        processed = 0
+        created = 0
+        last_id = None
+        started = time.monotonic()
+
+        while True:
+            # Recorrido por clave (id > último) para mantener la memoria acotada
+            batch = contracts if last_id is None else contracts.filter(id__gt=last_id)
+            batch = list(batch.only("id", "user_id", "start_date", "end_date")[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            # Meses existentes de todo el lote en una sola consulta
+            existing = defaultdict(set)
+            for contract_id, month_paid in RentPaymentHistory.objects.filter(
+                contract__in=batch
+            ).values_list("contract_id", "month_paid"):
+                existing[contract_id].add(month_paid)
+
+            payments = []
+            for contract in batch:
+                payments.extend(contract.build_rent_schedule(existing[contract.id], today=today))
+
+            if payments and not dry_run:
+                with transaction.atomic():
+                    RentPaymentHistory.objects.bulk_create(payments, batch_size=1000)
+                    # bulk_create no emite señales: situación de pagos de los titulares del lote
+                    sync_payment_standing(user_ids={contract.user_id for contract in batch})
+
+            processed += len(batch)
+            created += len(payments)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f"  {processed}/{total} contratos · {created} pagos "
+                f"{'por crear' if dry_run else 'creados'} · "
+                f"{processed / elapsed:.0f} contratos/s · {created / elapsed:.0f} pagos/s"
+            )
+
+        if created and not dry_run:
+            mark_buckets_dirty(RENT_BUCKETS)
+            # Invalida los dashboards de los inquilinos cacheados
+            bump_version(RentPaymentHistory)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 {processed} contratos revisados, {created} pagos "
+            f"{'por crear (dry-run)' if dry_run else 'creados'} en {elapsed:.2f}s"
+        ))
@@ -0,0 +1,423 @@
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from core.authentication import auth_user_cache_key
+from core.dashboard import LAUNDRY_OPEN_STATUSES, refresh_buckets
+from core.laundry import (LAUNDRY_BOOKED_STATUSES, LAUNDRY_TIME_SLOTS, invalidate_availability_grid,
+                          target_slot)
+from core.models import (Building, Contract, CustomUser, DocumentType, LaundryBooking,
+                         LaundrySlotClaim, RentPaymentHistory, Room, UserChangeRequest)
+from core.occupancy import sync_room_occupancy
+from core.occupancy_index import ROOMS_CHANGED, record_occupancy_change
+from core.response_cache import bump_version
+from core.standing import sync_payment_standing
+
+DEFAULT_PAYMENT_MIX = "approved=90,overdue=5,pending_review=3,rejected=2"
+DEFAULT_LAUNDRY_MIX = "approved=80,rejected=8,pending=6,proposed=4,counter_proposal=2"
+
+# Los estados abiertos (en revisión, en negociación) solo tienen sentido en filas recientes:
+# las más antiguas se sortean entre los estados cerrados de la misma distribución
+OPEN_PAYMENT_MONTHS = 2
+OPEN_PAYMENT_STATUSES = ["pending_review"]
+OPEN_LAUNDRY_DAYS = 7
+
+# Estados que retienen una lavadora (LaundrySlotClaim), como en claim_laundry_slots
+SLOT_HOLDING_STATUSES = LAUNDRY_OPEN_STATUSES + LAUNDRY_BOOKED_STATUSES
+
+
+def parse_mix(value, choices):
+    """'estado=peso,estado=peso' → ([estados], [pesos]) validados contra `choices`"""
+    valid = {choice for choice, _ in choices}
+    statuses, weights = [], []
+    for part in value.split(","):
+        status, _, weight = part.partition("=")
+        status = status.strip()
+        if status not in valid:
+            raise CommandError(f"Estado '{status}' no válido (opciones: {', '.join(sorted(valid))})")
+        try:
+            weight = float(weight)
+        except ValueError:
+            raise CommandError(f"Peso no válido para '{status}': '{weight}'")
+        if weight < 0:
+            raise CommandError(f"El peso de '{status}' no puede ser negativo")
+        statuses.append(status)
+        weights.append(weight)
+    if not sum(weights):
+        raise CommandError(f"La distribución '{value}' no tiene ningún peso positivo")
+    return statuses, weights
+
+
+def closed_mix(mix, open_statuses, fallback):
+    """La distribución sin los estados abiertos (o solo `fallback` si no queda ninguno)"""
+    closed = [(status, weight) for status, weight in zip(*mix) if status not in open_statuses and weight > 0]
+    if not closed:
+        return [fallback], [1]
+    return [status for status, _ in closed], [weight for _, weight in closed]
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un conjunto de datos sintético a escala de producción (edificios, habitaciones, "
+        "inquilinos, contratos, años de pagos y reservas de lavandería) con bulk_create por lotes "
+        "y memoria acotada. Con la misma semilla y --today produce los mismos datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1,
+                            help="Semilla (mismos datos con la misma semilla y la misma --today)")
+        parser.add_argument("--today", type=date.fromisoformat, default=None,
+                            help="Fecha de referencia YYYY-MM-DD (por defecto hoy): fija qué meses están "
+                                 "vencidos y qué reservas abiertas, para repetir exactamente una generación")
+        parser.add_argument("--buildings", type=int, default=300, help="Edificios a crear")
+        parser.add_argument("--rooms-per-building", type=int, default=100, help="Habitaciones por edificio")
+        parser.add_argument("--occupancy", type=float, default=0.9,
+                            help="Fracción de habitaciones con inquilino y contrato (0-1)")
+        parser.add_argument("--years", type=int, default=3, help="Años de historia hacia atrás")
+        parser.add_argument("--min-contract-months", type=int, default=6, help="Duración mínima de un contrato")
+        parser.add_argument("--max-contract-months", type=int, default=36, help="Duración máxima de un contrato")
+        parser.add_argument("--payment-mix", default=DEFAULT_PAYMENT_MIX,
+                            help="Pesos por estado de los meses ya vencidos (los futuros quedan 'upcoming')")
+        parser.add_argument("--laundry-per-month", type=float, default=2.0,
+                            help="Reservas de lavandería por inquilino y mes (media)")
+        parser.add_argument("--laundry-mix", default=DEFAULT_LAUNDRY_MIX, help="Pesos por estado de las reservas")
+        parser.add_argument("--password", default="renthub", help="Contraseña de los usuarios generados")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Filas por INSERT")
+        parser.add_argument("--purge", action="store_true",
+                            help="Borra antes los datos generados con la misma semilla")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.today = options["today"] or date.today()
+        self.payment_mix = parse_mix(options["payment_mix"], RentPaymentHistory.STATUS_CHOICES)
+        self.closed_payment_mix = closed_mix(self.payment_mix, OPEN_PAYMENT_STATUSES, "approved")
+        self.laundry_mix = parse_mix(options["laundry_mix"], LaundryBooking.STATUS_CHOICES)
+        self.closed_laundry_mix = closed_mix(self.laundry_mix, LAUNDRY_OPEN_STATUSES, "approved")
+        self.open_payments_from = (self.today - relativedelta(months=OPEN_PAYMENT_MONTHS)).replace(day=1)
+        self.open_bookings_from = self.today - timedelta(days=OPEN_LAUNDRY_DAYS)
+        if not 0 <= options["occupancy"] <= 1:
+            raise CommandError("--occupancy debe estar entre 0 y 1")
+        if not 1 <= options["min_contract_months"] <= options["max_contract_months"]:
+            raise CommandError("Se necesita 1 <= --min-contract-months <= --max-contract-months")
+
+        seed = options["seed"]
+        self.email_domain = f"seed{seed}.synthetic.renthub"
+        self.building_prefix = f"Sintético {seed}-"
+
+        existing = (
+            Building.objects.filter(name__startswith=self.building_prefix).exists()
+            or CustomUser.objects.filter(email__endswith=f"@{self.email_domain}").exists()
+        )
+        if existing:
+            if not options["purge"]:
+                raise CommandError(f"Ya hay datos sintéticos con la semilla {seed}: usa --purge o otra --seed")
+            self.purge()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"🔄 Generando {options['buildings']} edificios × {options['rooms_per_building']} habitaciones "
+            f"(semilla {seed}, lotes de {self.batch_size})..."
+        ))
+
+        self.started = time.monotonic()
+        self.created = Counter()
+        self.pending = {
+            model: []
+            for model in (Building, Room, CustomUser, Contract, RentPaymentHistory, LaundryBooking, LaundrySlotClaim)
+        }
+        # Ocupación de la lavandería por (día, franja): ninguna franja supera LAUNDRY_SLOT_CAPACITY.
+        # Parte de la lavadora más alta ya reclamada (p. ej. por otra semilla) para no repetirla
+        self.slot_capacity = settings.LAUNDRY_SLOT_CAPACITY
+        self.slot_usage = Counter({
+            (day, time_slot): machine
+            for day, time_slot, machine in LaundrySlotClaim.objects.values_list("date", "time_slot")
+            .annotate(machine=Max("machine")).order_by()
+        })
+        self.full_days = set()
+        self.unplaced = 0
+
+        self.generate_catalog()
+        tenant_number = 0
+        for number in range(options["buildings"]):
+            building = self.add(Building(
+                id=self.uuid(), name=f"{self.building_prefix}{number:05d}",
+                address=f"Calle {self.rng.randint(1, 200)} # {self.rng.randint(1, 99)}-{self.rng.randint(1, 99)}",
+            ))
+            for room_number in range(1, options["rooms_per_building"] + 1):
+                room = self.add(Room(id=self.uuid(), building=building, room_number=room_number))
+                if self.rng.random() < options["occupancy"]:
+                    self.generate_tenant(room, tenant_number)
+                    tenant_number += 1
+
+        self.flush_all()
+        self.finish()
+
+    ####################################################################################################
+    #### Generación
+    ####################################################################################################
+    def uuid(self):
+        """UUID4 tomado del generador con semilla: ids iguales entre ejecuciones"""
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def generate_catalog(self):
+        self.document_types = list(DocumentType.objects.order_by("name"))
+        if not self.document_types:
+            raise CommandError("No hay tipos de documento: ejecuta antes `python manage.py init_data`")
+
+        # Un hash para todos los usuarios: calcularlo por fila dominaría el tiempo total
+        self.password_hash = make_password(self.options["password"], salt=f"synthetic{self.options['seed']}")
+        self.admin, _ = CustomUser.objects.get_or_create(
+            email=f"admin@{self.email_domain}",
+            defaults={
+                "password": self.password_hash, "first_name": "Admin", "last_name": "Sintético",
+                "phone_number": f"+{self.options['seed']:06d}000000000", "document_number": f"SYN-{self.options['seed']}-ADMIN",
+                "role": "admin", "is_active": True, "is_verified": True,
+            },
+        )
+
+    def generate_tenant(self, room, number):
+        seed = self.options["seed"]
+        tenant = self.add(CustomUser(
+            id=self.uuid(), email=f"inquilino{number}@{self.email_domain}", password=self.password_hash,
+            first_name=f"Inquilino{number}", last_name=f"Sintético{seed}",
+            phone_number=f"+{seed:06d}{number + 1:09d}", document_type=self.rng.choice(self.document_types),
+            document_number=f"SYN-{seed}-{number}", role="tenant", is_active=True, is_verified=True,
+        ))
+
+        # Contratos repartidos por toda la historia: unos ya terminados, otros vigentes o futuros
+        history_start = self.today - relativedelta(years=self.options["years"])
+        start_date = history_start + timedelta(days=self.rng.randrange((self.today - history_start).days + 90))
+        months = self.rng.randint(self.options["min_contract_months"], self.options["max_contract_months"])
+        rent = Decimal(self.rng.randrange(400, 1500, 10))
+        contract = self.add(Contract(
+            id=self.uuid(), user=tenant, room=room, start_date=start_date,
+            end_date=start_date + relativedelta(months=months) - timedelta(days=1),
+            rent_amount=rent, deposit_amount=rent,
+        ))
+
+        for payment in contract.build_rent_schedule(today=self.today):
+            payment.id = self.uuid()
+            if payment.status == "overdue":
+                self.apply_payment_status(payment)
+            self.add(payment)
+
+        self.generate_bookings(tenant, contract)
+
+    def apply_payment_status(self, payment):
+        """Estado de un mes ya vencido según --payment-mix, con los campos que tendría en la app"""
+        recent = payment.billing_period >= self.open_payments_from
+        statuses, weights = self.payment_mix if recent else self.closed_payment_mix
+        payment.status = self.rng.choices(statuses, weights)[0]
+        if payment.status == "overdue":
+            return
+        payment.payment_date = payment.billing_period + timedelta(days=self.rng.randrange(15))
+        payment.receipt_image = f"payments/rent/synthetic/{payment.id}.png"
+        if payment.status == "rejected":
+            payment.admin_comment = "Comprobante ilegible"
+
+    def generate_bookings(self, tenant, contract):
+        first_day = contract.start_date
+        last_day = min(contract.end_date, self.today + timedelta(days=30))
+        days = (last_day - first_day).days + 1
+        if days <= 0:
+            return
+
+        # Media de --laundry-per-month reservas al mes, en días al azar del contrato
+        expected = self.options["laundry_per_month"] * days / 30
+        count = int(expected) + (self.rng.random() < expected % 1)
+        for _ in range(count):
+            day = first_day + timedelta(days=self.rng.randrange(days))
+            statuses, weights = self.laundry_mix if day >= self.open_bookings_from else self.closed_laundry_mix
+            booking = LaundryBooking(
+                id=self.uuid(), user=tenant, date=day, time_slot=self.rng.choice(LAUNDRY_TIME_SLOTS),
+                status=self.rng.choices(statuses, weights)[0],
+            )
+            booking.voucher_image = f"laundry/vouchers/synthetic/{booking.id}.png"
+            if booking.status in ("proposed", "counter_proposal"):
+                booking.proposed_date = day + timedelta(days=self.rng.randint(1, 3))
+                booking.proposed_time_slot = self.rng.choice(LAUNDRY_TIME_SLOTS)
+            if booking.status == "counter_proposal":
+                booking.user_response = "rejected"
+                booking.counter_proposal_date = day + timedelta(days=self.rng.randint(1, 3))
+                booking.counter_proposal_time_slot = self.rng.choice(LAUNDRY_TIME_SLOTS)
+
+            # Como en la app, la franja retenida respeta la capacidad; sin lugar ese día se rechaza
+            claim = self.hold_slot(booking) if booking.status in SLOT_HOLDING_STATUSES else None
+            if claim is None and booking.status in SLOT_HOLDING_STATUSES:
+                booking.status = "rejected"
+                booking.user_response = "pending"
+                booking.proposed_date = booking.proposed_time_slot = None
+                booking.counter_proposal_date = booking.counter_proposal_time_slot = None
+                self.unplaced += 1
+
+            if booking.status == "pending":
+                booking.last_action_by = "user"
+            else:
+                booking.admin = self.admin
+                booking.last_action_by = "user" if booking.status == "counter_proposal" else "admin"
+            if booking.status == "rejected":
+                booking.admin_comment = "Sin disponibilidad"
+            self.add(booking)
+            if claim is not None:
+                self.add(claim)
+
+    def hold_slot(self, booking):
+        """
+        Lavadora para la franja que retiene la reserva (ver target_slot): la pedida o, si está
+        completa, la siguiente libre del mismo día. Lleva la ocupación por (día, franja) en
+        memoria; devuelve el LaundrySlotClaim o None si el día no tiene lugar.
+        """
+        day, preferred = target_slot(booking)
+        if day in self.full_days:
+            return None
+
+        start = LAUNDRY_TIME_SLOTS.index(preferred)
+        for offset in range(len(LAUNDRY_TIME_SLOTS)):
+            time_slot = LAUNDRY_TIME_SLOTS[(start + offset) % len(LAUNDRY_TIME_SLOTS)]
+            used = self.slot_usage[(day, time_slot)]
+            if used < self.slot_capacity:
+                break
+        else:
+            self.full_days.add(day)
+            return None
+
+        self.slot_usage[(day, time_slot)] = used + 1
+        if booking.status == "proposed":
+            booking.proposed_time_slot = time_slot
+        elif booking.status == "counter_proposal":
+            booking.counter_proposal_time_slot = time_slot
+        else:
+            booking.time_slot = time_slot
+        return LaundrySlotClaim(booking=booking, date=day, time_slot=time_slot, machine=used + 1)
+
+    ####################################################################################################
+    #### Inserción por lotes
+    ####################################################################################################
+    def add(self, instance):
+        """Acumula la fila y vacía su tabla (y las que referencia) al llegar a --batch-size"""
+        rows = self.pending[type(instance)]
+        rows.append(instance)
+        if len(rows) >= self.batch_size:
+            self.flush_all()
+        return instance
+
+    def flush_all(self):
+        # Orden de las claves foráneas: los padres se insertan antes que los hijos
+        with transaction.atomic():
+            for model, rows in self.pending.items():
+                if rows:
+                    model.objects.bulk_create(rows, batch_size=1000)
+                    self.created[model.__name__] += len(rows)
+                    rows.clear()
+        self.report()
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        total = sum(self.created.values())
+        self.stdout.write(
+            f"  {self.created['Building']} edificios · {self.created['Room']} habitaciones · "
+            f"{self.created['Contract']} contratos · {self.created['RentPaymentHistory']} pagos · "
+            f"{self.created['LaundryBooking']} reservas · {self.created['LaundrySlotClaim']} lavadoras · "
+            f"{total / elapsed:.0f} filas/s"
+        )
+
+    def finish(self):
+        # bulk_create no emite señales: lo que harían los on_commit y los comandos nocturnos
+        self.stdout.write("🔄 Sincronizando ocupación, situación de pagos y dashboards...")
+        synced = time.monotonic()
+        sync_room_occupancy()
+        sync_payment_standing()
+        record_occupancy_change(ROOMS_CHANGED)
+        refresh_buckets()
+        invalidate_availability_grid()
+        for model in (Building, Room, Contract, RentPaymentHistory, LaundryBooking):
+            bump_version(model)
+        synced = time.monotonic() - synced
+
+        elapsed = time.monotonic() - self.started
+        total = sum(self.created.values())
+        for name, rows in self.created.items():
+            self.stdout.write(f"  {name}: {rows} filas")
+        if self.unplaced:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  {self.unplaced} reservas quedaron rechazadas por no caber en la lavandería "
+                f"(LAUNDRY_SLOT_CAPACITY={self.slot_capacity}); baja --laundry-per-month para menos rechazos"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"🎉 {total} filas en {elapsed:.2f}s ({total / max(elapsed - synced, 1e-6):.0f} filas/s de inserción, "
+            f"{synced:.2f}s de sincronización)"
+        ))
+
+    ####################################################################################################
+    #### Borrado de una generación anterior
+    ####################################################################################################
+    def purge(self):
+        """
+        Borra lo generado con esta semilla por lotes de --batch-size ids, de las tablas hijas a
+        las padres, con DELETE directos (_raw_delete): sin el colector del ORM, que cargaría
+        todas las filas en memoria y ejecutaría las señales de borrado fila a fila. Las
+        proyecciones que dependen de esas filas se recalculan después en finish().
+        """
+        self.stdout.write(self.style.WARNING(f"⚠️  Borrando los datos sintéticos de {self.email_domain}..."))
+        started = time.monotonic()
+        deleted = Counter()
+
+        users = CustomUser.objects.filter(email__endswith=f"@{self.email_domain}")
+        for ids in self.id_batches(users):
+            with transaction.atomic():
+                # Referencias opcionales desde filas que no son de esta generación
+                LaundryBooking.objects.filter(admin_id__in=ids).update(admin=None)
+                UserChangeRequest.objects.filter(reviewed_by_id__in=ids).update(reviewed_by=None)
+                self.raw_delete(deleted, LaundrySlotClaim.objects.filter(booking__user_id__in=ids))
+                self.raw_delete(deleted, LaundryBooking.objects.filter(user_id__in=ids))
+                self.raw_delete(deleted, RentPaymentHistory.objects.filter(contract__user_id__in=ids))
+                self.raw_delete(deleted, Contract.objects.filter(user_id__in=ids))
+                self.raw_delete(deleted, UserChangeRequest.objects.filter(user_id__in=ids))
+                self.raw_delete(deleted, CustomUser.objects.filter(id__in=ids))
+            cache.delete_many([auth_user_cache_key(user_id) for user_id in ids])
+            self.report_purge(deleted, started)
+
+        buildings = Building.objects.filter(name__startswith=self.building_prefix)
+        for ids in self.id_batches(buildings):
+            with transaction.atomic():
+                # Contratos de otros inquilinos que alguien haya creado en habitaciones sintéticas
+                self.raw_delete(deleted, RentPaymentHistory.objects.filter(contract__room__building_id__in=ids))
+                self.raw_delete(deleted, Contract.objects.filter(room__building_id__in=ids))
+                self.raw_delete(deleted, Room.objects.filter(building_id__in=ids))
+                self.raw_delete(deleted, Building.objects.filter(id__in=ids))
+            self.report_purge(deleted, started)
+
+    def id_batches(self, queryset):
+        """Ids de `queryset` en lotes de --batch-size, recorridos por clave"""
+        last_id = None
+        while True:
+            batch = queryset if last_id is None else queryset.filter(id__gt=last_id)
+            ids = list(batch.order_by("id").values_list("id", flat=True)[:self.batch_size])
+            if not ids:
+                return
+            last_id = ids[-1]
+            yield ids
+
+    def raw_delete(self, deleted, queryset):
+        deleted[queryset.model.__name__] += queryset._raw_delete(queryset.db)
+
+    def report_purge(self, deleted, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        total = sum(deleted.values())
+        self.stdout.write(
+            f"  {deleted['CustomUser']} usuarios · {deleted['Building']} edificios · "
+            f"{deleted['RentPaymentHistory']} pagos · {deleted['LaundryBooking']} reservas · "
+            f"{total} filas borradas · {total / elapsed:.0f} filas/s"
+        )
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.dashboard import LAUNDRY_BUCKETS, RENT_BUCKETS, mark_buckets_dirty
+from core.models import (JobWatermark, RentPaymentHistory,
+                         billing_period_from_month, current_billing_period)
+from core.response_cache import bump_version
+from core.standing import sync_payment_standing
+
+WATERMARK_NAME = "roll_payment_statuses"
+
+
+class Command(BaseCommand):
+    help = (
+        "Avanza los estados de los pagos (upcoming -> overdue) cuando llega su mes, "
+        "con UPDATEs sobre toda la tabla, y recalcula la situación de pagos de los inquilinos. "
+        "Pensado para ejecutarse cada noche desde cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Ignora la marca de agua y revisa todos los meses")
+        parser.add_argument("--dry-run", action="store_true", help="Cuenta las filas que cambiarían sin modificarlas")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        period = current_billing_period()
+        current_year_month = period.strftime("%Y-%m")
+
+        watermark = None
+        if not options["full"]:
+            watermark = JobWatermark.objects.filter(name=WATERMARK_NAME).values_list("value", flat=True).first()
+
+        # Solo el mes de la última ejecución (pudo recibir contratos nuevos después)
+        # y los posteriores pueden tener pagos por vencer
+        due = RentPaymentHistory.objects.filter(status="upcoming", billing_period__lte=period)
+        if watermark:
+            due = due.filter(billing_period__gte=billing_period_from_month(watermark))
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"⚠️  {due.count()} pagos pasarían a 'overdue' (dry-run)"))
+            return
+
+        with transaction.atomic():
+            moved = due.update(status="overdue")
+            JobWatermark.objects.update_or_create(
+                name=WATERMARK_NAME, defaults={"value": current_year_month}
+            )
+            # update() no emite señales: se recuentan todos los buckets al confirmar
+            mark_buckets_dirty(list(RENT_BUCKETS) + list(LAUNDRY_BUCKETS))
+            # Al cambiar de mes entran en cuenta pagos que antes eran futuros: se revisan todos
+            standings = sync_payment_standing(period=period)
+
+        if moved:
+            # Ya confirmado: invalida los dashboards de los inquilinos cacheados
+            bump_version(RentPaymentHistory)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {moved} pagos pasaron de 'upcoming' a 'overdue' "
+            f"(desde {watermark or 'el inicio'} hasta {current_year_month}) y "
+            f"{standings} inquilinos cambiaron de situación en {elapsed:.2f}s"
+        ))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.outbox import deliver_pending, queue_depth
+
+
+class Command(BaseCommand):
+    help = (
+        "Envía los correos de la bandeja de salida reutilizando una conexión SMTP por lote, "
+        "con reintentos y espera exponencial. Con --loop queda corriendo como worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100, help="Correos por lote (una conexión SMTP)")
+        parser.add_argument("--loop", action="store_true", help="Sigue procesando la cola indefinidamente")
+        parser.add_argument("--sleep", type=float, default=5, help="Segundos de espera cuando la cola está vacía")
+        parser.add_argument("--stats", action="store_true", help="Solo muestra el tamaño de la cola")
+
+    def write_depth(self):
+        depth = queue_depth()
+        self.stdout.write(
+            f"📬 Cola: {depth['pending']} pendientes ({depth['due']} listos), "
+            f"{depth['failed']} fallidos, más antiguo hace {depth['oldest_pending_seconds']}s"
+        )
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.write_depth()
+            return
+
+        while True:
+            sent, failed = deliver_pending(batch_size=options["batch_size"])
+            if sent or failed:
+                self.stdout.write(self.style.SUCCESS(f"✅ {sent} enviados, {failed} con error"))
+                self.write_depth()
+
+            if not options["loop"]:
+                if not sent and not failed:
+                    self.write_depth()
+                return
+
+            # Si el lote vino lleno probablemente quedan más: no esperar
+            if sent + failed < options["batch_size"]:
+                time.sleep(options["sleep"])
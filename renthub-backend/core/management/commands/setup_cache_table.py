@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections, router
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea la tabla de los caches en base de datos (createcachetable) y en Postgres la "
+        "convierte en UNLOGGED: no escribe WAL y se vacía tras una caída, lo que da igual en un cache."
+    )
+
+    def handle(self, *args, **options):
+        call_command("createcachetable", verbosity=0)
+
+        for alias in settings.CACHES:
+            backend = caches[alias]
+            if not isinstance(backend, DatabaseCache):
+                continue
+
+            db = router.db_for_write(backend.cache_model_class)
+            connection = connections[db]
+            if connection.vendor != "postgresql":
+                self.stdout.write(f"  {alias}: tabla {backend._table} lista ({connection.vendor})")
+                continue
+
+            with connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {connection.ops.quote_name(backend._table)} SET UNLOGGED")
+            self.stdout.write(self.style.SUCCESS(f"✅ {alias}: tabla {backend._table} UNLOGGED"))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.standing import standing_drift, sync_payment_standing
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula CustomUser.payment_standing de todos los inquilinos a partir de sus pagos "
+        "y corrige lo que dejaron las operaciones masivas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Solo muestra los inquilinos con desvío")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        if options["dry_run"]:
+            drift = list(
+                standing_drift()
+                .order_by("email")
+                .values_list("email", "payment_standing", "computed_standing")
+            )
+            for email, current, computed in drift:
+                self.stdout.write(f"  {email}: {current} → {computed}")
+            self.stdout.write(self.style.SUCCESS(f"🔍 {len(drift)} inquilinos con desvío (dry-run)"))
+            return
+
+        with transaction.atomic():
+            corrected = sync_payment_standing()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"🎉 {corrected} inquilinos corregidos en {elapsed:.2f}s"))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.occupancy import occupancy_drift, sync_room_occupancy
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula Room.is_occupied a partir de los contratos en un único UPDATE: libera las "
+        "habitaciones cuyos contratos ya terminaron y corrige lo que dejaron las operaciones masivas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Solo muestra las habitaciones con desvío")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        drift = list(
+            occupancy_drift()
+            .select_related("building")
+            .order_by("building__name", "room_number")
+        )
+        for room in drift:
+            self.stdout.write(
+                f"  {room.building.name} - {room.room_number}: "
+                f"{'ocupada' if room.is_occupied else 'libre'} → {'libre' if room.is_occupied else 'ocupada'}"
+            )
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS(f"🔍 {len(drift)} habitaciones con desvío (dry-run)"))
+            return
+
+        corrected = sync_room_occupancy()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"🎉 {corrected} habitaciones corregidas en {elapsed:.2f}s"))
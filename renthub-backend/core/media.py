@@ -0,0 +1,83 @@
+import mimetypes
+import posixpath
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+
+from core.images import IMAGE_VARIANTS, VARIANTS_FOLDER
+from core.models import Contract, CustomUser, LaundryBooking, RentPaymentHistory
+
+# Las subidas nunca cambian de nombre (hash o uuid): se pueden cachear para siempre
+MEDIA_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+########################################################################################################
+####                                                                                                ####
+####            Acceso a los archivos media                                                         ####
+####                                                                                                ####
+########################################################################################################
+def clean_media_name(name):
+    """Normaliza la ruta pedida; None si intenta salir de MEDIA_ROOT"""
+    if not name or name.startswith("/") or "\\" in name:
+        return None
+    normalized = posixpath.normpath(name)
+    if normalized.startswith("..") or normalized != name:
+        return None
+    return normalized
+
+
+def original_name_lookup(name):
+    """
+    Filtro para buscar la fila dueña de un archivo. Las variantes
+    ('variants/thumb/payments/rent/abc.jpg') apuntan a su original con cualquier extensión.
+    """
+    parts = name.split("/", 2)
+    if len(parts) == 3 and parts[0] == VARIANTS_FOLDER and parts[1] in IMAGE_VARIANTS:
+        base, _ = posixpath.splitext(parts[2])
+        return "startswith", f"{base}."
+    return "exact", name
+
+
+def user_can_access_media(user, name):
+    """Administradores ven todo; los inquilinos solo los archivos de sus propias filas"""
+    if user.is_admin() or user.is_superadmin():
+        return True
+
+    # La foto por defecto es común a todos los usuarios
+    lookup, value = original_name_lookup(name)
+    default_photo = CustomUser._meta.get_field("profile_photo").default
+    if value == default_photo or (lookup == "startswith" and default_photo.startswith(value)):
+        return True
+
+    owned = [
+        CustomUser.objects.filter(pk=user.pk, **{f"profile_photo__{lookup}": value}),
+        Contract.objects.filter(user=user, **{f"contract_photo__{lookup}": value}),
+        RentPaymentHistory.objects.filter(contract__user=user, **{f"receipt_image__{lookup}": value}),
+        LaundryBooking.objects.filter(user=user, **{f"voucher_image__{lookup}": value}),
+    ]
+    return any(qs.exists() for qs in owned)
+
+
+def media_response(name):
+    """
+    Respuesta sin cuerpo: nginx hace la transferencia desde la ubicación interna
+    indicada en X-Accel-Redirect. Solo en DEBUG sin nginx se envía el archivo desde Django.
+    """
+    content_type, encoding = mimetypes.guess_type(name)
+
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type or "application/octet-stream")
+        response["X-Accel-Redirect"] = f"{settings.MEDIA_ACCEL_PREFIX}{name}"
+    elif settings.DEBUG:
+        path = posixpath.join(settings.MEDIA_ROOT, name)
+        try:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+        except FileNotFoundError:
+            raise Http404
+    else:
+        raise Http404
+
+    if encoding:
+        response["Content-Encoding"] = encoding
+    response["Cache-Control"] = MEDIA_CACHE_CONTROL
+    return response
@@ -0,0 +1,167 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:22
+
+import core.models
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Building',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('address', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DocumentType',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustomUser',
+            fields=[
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('phone_number', models.CharField(max_length=20, unique=True)),
+                ('document_number', models.CharField(max_length=50)),
+                ('is_verified', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=False)),
+                ('is_staff', models.BooleanField(default=False)),
+                ('email_verification_token', models.CharField(blank=True, editable=False, max_length=100, null=True)),
+                ('profile_photo', models.ImageField(blank=True, default='users/photos/adminDefault.jpg', null=True, upload_to=core.models.user_photo_upload_path, validators=[core.models.validate_image_file])),
+                ('role', models.CharField(choices=[('superadmin', 'Superadmin'), ('admin', 'Admin'), ('tenant', 'Tenant')], default='tenant', max_length=10)),
+                ('date_joined', models.DateTimeField(auto_now_add=True)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+                ('document_type', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.documenttype')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Contract',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('rent_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('deposit_amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('includes_wifi', models.BooleanField(default=False)),
+                ('wifi_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('contract_photo', models.ImageField(blank=True, null=True, upload_to=core.models.contract_photo_upload_path, validators=[core.models.validate_image_file])),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contracts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LaundryBooking',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('time_slot', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('approved', 'Aprobado'), ('rejected', 'Rechazado'), ('proposed', 'Propuesta'), ('counter_proposal', 'Contrapropuesta')], default='pending', max_length=20)),
+                ('admin_comment', models.TextField(blank=True, null=True)),
+                ('user_comment', models.TextField(blank=True, null=True)),
+                ('voucher_image', models.ImageField(upload_to=core.models.laundry_voucher_upload_path, validators=[core.models.validate_image_file])),
+                ('proposed_date', models.DateField(blank=True, null=True)),
+                ('proposed_time_slot', models.CharField(blank=True, max_length=20, null=True)),
+                ('user_response', models.CharField(choices=[('pending', 'Pendiente'), ('accepted', 'Aceptada'), ('rejected', 'Rechazada')], default='pending', max_length=10)),
+                ('counter_proposal_date', models.DateField(blank=True, null=True)),
+                ('counter_proposal_time_slot', models.CharField(blank=True, max_length=20, null=True)),
+                ('last_action_by', models.CharField(choices=[('user', 'Usuario'), ('admin', 'Administrador')], default='user', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('admin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_laundry_bookings', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='laundry_bookings', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReferencePerson',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('first_name', models.CharField(max_length=100)),
+                ('last_name', models.CharField(max_length=100)),
+                ('document_number', models.CharField(max_length=50)),
+                ('phone_number', models.CharField(blank=True, max_length=20, null=True)),
+                ('document_type', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.documenttype')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='reference_1',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='first_reference', to='core.referenceperson'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='reference_2',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='second_reference', to='core.referenceperson'),
+        ),
+        migrations.CreateModel(
+            name='RentPaymentHistory',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('month_paid', models.CharField(max_length=20)),
+                ('payment_date', models.DateField(blank=True, null=True)),
+                ('admin_comment', models.TextField(blank=True, null=True)),
+                ('user_comment', models.TextField(blank=True, null=True)),
+                ('receipt_image', models.ImageField(blank=True, null=True, upload_to=core.models.rent_receipt_upload_path, validators=[core.models.validate_image_file])),
+                ('status', models.CharField(choices=[('overdue', 'Vencido'), ('pending_review', 'En análisis'), ('upcoming', 'Pendiente'), ('approved', 'Aprobado'), ('rejected', 'Rechazado')], default='overdue', max_length=20)),
+                ('contract', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rent_payments', to='core.contract')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Room',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('room_number', models.IntegerField()),
+                ('is_occupied', models.BooleanField(default=False)),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rooms', to='core.building')),
+            ],
+            options={
+                'ordering': ['building', 'room_number'],
+            },
+        ),
+        migrations.AddField(
+            model_name='contract',
+            name='room',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contracts', to='core.room'),
+        ),
+        migrations.CreateModel(
+            name='UserChangeRequest',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('changes', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('approved', 'Aprobado'), ('rejected', 'Rechazado')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('review_comment', models.TextField(blank=True, null=True)),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_requests', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='change_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='customuser',
+            constraint=models.UniqueConstraint(fields=('document_type', 'document_number'), name='unique_document', violation_error_message='custom user with this document already exists.'),
+        ),
+        migrations.AddConstraint(
+            model_name='room',
+            constraint=models.UniqueConstraint(fields=('building', 'room_number'), name='unique_room_building', violation_error_message='Ya existe una habitación con el número {room_number} en el edificio {building}'),
+        ),
+    ]
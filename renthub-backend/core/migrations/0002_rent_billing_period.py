@@ -0,0 +1,47 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.migrations.operations import AddIndex
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """CREATE INDEX CONCURRENTLY en Postgres (no bloquea escrituras); índice normal en SQLite (tests)"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+    # Los índices se crean fuera de transacción para poder usar CONCURRENTLY
+    atomic = False
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        # Nullable y sin valor por defecto: en Postgres es un cambio de catálogo, sin reescribir la tabla
+        migrations.AddField(
+            model_name='rentpaymenthistory',
+            name='billing_period',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='rentpaymenthistory',
+            index=models.Index(fields=['contract', 'status', 'billing_period'], name='rent_ctr_status_period_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='rentpaymenthistory',
+            index=models.Index(fields=['status', 'billing_period'], name='rent_status_period_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='rentpaymenthistory',
+            index=models.Index(fields=['billing_period', 'id'], name='rent_period_keyset_idx'),
+        ),
+    ]
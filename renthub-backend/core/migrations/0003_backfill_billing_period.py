@@ -0,0 +1,51 @@
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 5000
+
+
+def billing_period_from_month(month_paid):
+    # Copia de core.models.billing_period_from_month: la migración no depende del código actual
+    try:
+        return datetime.strptime(str(month_paid)[:7], "%Y-%m").date()
+    except (TypeError, ValueError):
+        return None
+
+
+def backfill_billing_periods(apps, schema_editor):
+    """Completa billing_period desde month_paid por lotes, cada uno en su propia transacción corta"""
+    RentPaymentHistory = apps.get_model("core", "RentPaymentHistory")
+    pending = RentPaymentHistory.objects.filter(billing_period__isnull=True).order_by("id")
+
+    last_id = None
+    while True:
+        batch = pending if last_id is None else pending.filter(id__gt=last_id)
+        rows = list(batch.values_list("id", "month_paid")[:BATCH_SIZE])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        by_period = defaultdict(list)
+        for payment_id, month_paid in rows:
+            period = billing_period_from_month(month_paid)
+            if period is not None:
+                by_period[period].append(payment_id)
+
+        with transaction.atomic():
+            for period, ids in by_period.items():
+                RentPaymentHistory.objects.filter(id__in=ids, billing_period__isnull=True).update(billing_period=period)
+
+
+class Migration(migrations.Migration):
+    # Sin transacción global: cada lote confirma por separado y no retiene bloqueos
+    atomic = False
+
+    dependencies = [
+        ('core', '0002_rent_billing_period'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_billing_periods, migrations.RunPython.noop, elidable=True),
+    ]
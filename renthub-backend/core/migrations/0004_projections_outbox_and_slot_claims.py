@@ -0,0 +1,131 @@
+# Generated by Django 5.1.7 on 2026-10-17 12:23
+
+import core.models
+import core.storage
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0003_backfill_billing_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardBucket',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('items', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('to_email', models.EmailField(max_length=254)),
+                ('subject', models.CharField(max_length=255)),
+                ('text_body', models.TextField()),
+                ('html_body', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('sent', 'Enviado'), ('failed', 'Fallido')], default='pending', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='JobWatermark',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('value', models.CharField(max_length=50)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LaundrySlotClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time_slot', models.CharField(max_length=20)),
+                ('machine', models.PositiveSmallIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='payment_standing',
+            field=models.CharField(choices=[('ok', 'Al día'), ('pending_review', 'En análisis'), ('rejected', 'Rechazado'), ('overdue', 'Vencido')], default='ok', editable=False, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='contract',
+            name='contract_photo',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.get_upload_storage, upload_to=core.models.contract_photo_upload_path, validators=[core.models.validate_image_file]),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_photo',
+            field=models.ImageField(blank=True, default='users/photos/adminDefault.jpg', null=True, storage=core.storage.get_upload_storage, upload_to=core.models.user_photo_upload_path, validators=[core.models.validate_image_file]),
+        ),
+        migrations.AlterField(
+            model_name='laundrybooking',
+            name='voucher_image',
+            field=models.ImageField(storage=core.storage.get_upload_storage, upload_to=core.models.laundry_voucher_upload_path, validators=[core.models.validate_image_file]),
+        ),
+        migrations.AlterField(
+            model_name='rentpaymenthistory',
+            name='receipt_image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.get_upload_storage, upload_to=core.models.rent_receipt_upload_path, validators=[core.models.validate_image_file]),
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['created_at', 'id'], name='contract_created_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['date_joined', 'id'], name='user_joined_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'payment_standing'], name='user_role_standing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='laundrybooking',
+            index=models.Index(fields=['created_at', 'id'], name='laundry_created_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userchangerequest',
+            index=models.Index(fields=['created_at', 'id'], name='change_req_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ),
+        migrations.AddField(
+            model_name='laundryslotclaim',
+            name='booking',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='slot_claim', to='core.laundrybooking'),
+        ),
+        migrations.AddConstraint(
+            model_name='laundryslotclaim',
+            constraint=models.UniqueConstraint(fields=('date', 'time_slot', 'machine'), name='laundry_slot_machine_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='laundryslotclaim',
+            constraint=models.CheckConstraint(condition=models.Q(('machine__gte', 1)), name='laundry_slot_machine_gte_1'),
+        ),
+    ]
@@ -1,9 +1,12 @@
 import os
 import uuid
 from django.db import models
+from django.utils import timezone
 from datetime import datetime
+from dateutil.relativedelta import relativedelta
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from core.storage import get_upload_storage
 
 
 ########################################################################################################
@@ -122,6 +125,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     email_verification_token = models.CharField(max_length=100, editable=False, null=True, blank=True)
     profile_photo = models.ImageField(
         upload_to=user_photo_upload_path,
+        storage=get_upload_storage,
         validators=[validate_image_file],
         default='users/photos/adminDefault.jpg',
         blank=True,
@@ -130,6 +134,18 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default="tenant")
 
+    PAYMENT_STANDING_CHOICES = [
+        ("ok", "Al día"),
+        ("pending_review", "En análisis"),
+        ("rejected", "Rechazado"),
+        ("overdue", "Vencido"),
+    ]
+    # Situación de pagos del inquilino, derivada de sus pagos hasta el mes actual.
+    # La mantiene core/standing.py; no se edita a mano.
+    payment_standing = models.CharField(
+        max_length=20, choices=PAYMENT_STANDING_CHOICES, default="ok", editable=False
+    )
+
     # Referencias opcionales para todos los usuarios
     reference_1 = models.ForeignKey(
         "core.ReferencePerson",
@@ -173,6 +189,12 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
                 violation_error_message='custom user with this document already exists.'
             )
         ]
+        indexes = [
+            # Orden estable para la paginación por cursor
+            models.Index(fields=["date_joined", "id"], name="user_joined_keyset_idx"),
+            # Listado de inquilinos por situación de pagos (p. ej. morosos)
+            models.Index(fields=["role", "payment_standing"], name="user_role_standing_idx"),
+        ]
 
 ########################################################################################################
 ####                                                                                                ####
@@ -193,6 +215,7 @@ class Contract(models.Model):
 
     contract_photo = models.ImageField(
         upload_to=contract_photo_upload_path,
+        storage=get_upload_storage,
         validators=[validate_image_file],
         blank=True,
         null=True
@@ -205,21 +228,40 @@ class Contract(models.Model):
             if Contract.objects.filter(room=self.room, end_date__gte=self.start_date).exists():
                 raise ValidationError(f"La habitación {self.room.room_number} ya tiene un contrato activo.")
 
-        super().save(*args, **kwargs)  # Guarda primero el contrato
-
-        # Ahora que el contrato está guardado, marcar la habitación como ocupada
-        self.room.is_occupied = True
-        self.room.save(update_fields=["is_occupied"])
-
+        # Room.is_occupied lo sincroniza core/occupancy.py al confirmar la transacción
+        super().save(*args, **kwargs)
 
-    def delete(self, *args, **kwargs):
-        """Libera la habitación solo si no hay otros contratos activos EN EL FUTURO."""
-        super().delete(*args, **kwargs)  # Primero elimina el contrato
+    def build_rent_schedule(self, existing_months=(), today=None):
+        """
+        Genera (sin guardar) un pago mensual por cada mes entre start_date y end_date
+        que no esté en `existing_months`, listo para un único bulk_create.
+        """
+        today = today or datetime.today().date()
+        payments = []
+        offset = 0
+        current_date = self.start_date
+
+        while current_date <= self.end_date:
+            month_payment = current_date.strftime("%Y-%m")
+            if month_payment not in existing_months:
+                payments.append(RentPaymentHistory(
+                    contract=self,
+                    month_paid=month_payment,
+                    billing_period=current_date.replace(day=1),
+                    status="overdue" if current_date < today else "upcoming"
+                ))
+
+            # Avanzar al mes siguiente desde la fecha de inicio (manteniendo el día original)
+            offset += 1
+            current_date = self.start_date + relativedelta(months=offset)
+
+        return payments
 
-        # Si después de eliminar no quedan contratos activos en la habitación, se libera
-        if not Contract.objects.filter(room=self.room, end_date__gte=datetime.today().date()).exists():
-            self.room.is_occupied = False
-            self.room.save(update_fields=["is_occupied"])
+    class Meta:
+        indexes = [
+            # Orden estable para la paginación por cursor
+            models.Index(fields=["created_at", "id"], name="contract_created_keyset_idx"),
+        ]
 
 ########################################################################################################
 ####                                                                                                ####
@@ -244,21 +286,43 @@ class UserChangeRequest(models.Model):
     def __str__(self):
         return f"Solicitud de {self.user.email} - {self.changes} ({self.status})"
 
+    class Meta:
+        indexes = [
+            # Orden estable para la paginación por cursor
+            models.Index(fields=["created_at", "id"], name="change_req_keyset_idx"),
+        ]
+
 ########################################################################################################
 ####                                                                                                ####
 ####            Modelo para gestionar el historial de pagos de alquileres                           ####
 ####                                                                                                ####
 ########################################################################################################
+def billing_period_from_month(month_paid):
+    """Convierte un mes 'YYYY-MM' en el primer día de ese mes (None si no es válido)"""
+    try:
+        return datetime.strptime(str(month_paid)[:7], "%Y-%m").date()
+    except (TypeError, ValueError):
+        return None
+
+def current_billing_period():
+    """Primer día del mes actual"""
+    return datetime.today().date().replace(day=1)
+
 class RentPaymentHistory(models.Model):
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     contract = models.ForeignKey("core.Contract", on_delete=models.CASCADE, related_name="rent_payments")
+    # Mes en texto 'YYYY-MM' (lo que consume la API) y su versión tipada para filtrar y ordenar.
+    # billing_period se deriva de month_paid al guardar; las filas antiguas se completan
+    # en la migración 0003 (o con `manage.py backfill_billing_periods`).
     month_paid = models.CharField(max_length=20)
+    billing_period = models.DateField(null=True, blank=True, editable=False)
     payment_date = models.DateField(blank=True, null=True)
     admin_comment = models.TextField(blank=True, null=True)
     user_comment = models.TextField(blank=True, null=True)
     receipt_image = models.ImageField(
         upload_to=rent_receipt_upload_path,
+        storage=get_upload_storage,
         validators=[validate_image_file],
         blank=True,
         null=True
@@ -270,11 +334,30 @@ class RentPaymentHistory(models.Model):
         ("approved", "Aprobado"),
         ("rejected", "Rechazado"),
     ]
+    # Estados que cuentan como deuda abierta del inquilino
+    OUTSTANDING_STATUSES = ["overdue", "pending_review", "rejected"]
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="overdue")
 
+    def save(self, *args, **kwargs):
+        self.billing_period = billing_period_from_month(self.month_paid)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "month_paid" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "billing_period"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Rent {self.contract.user.email} - {self.month_paid}"
 
+    class Meta:
+        indexes = [
+            # Pagos de un contrato por estado y mes (vencidos, próximo pago, validación de meses)
+            models.Index(fields=["contract", "status", "billing_period"], name="rent_ctr_status_period_idx"),
+            # Buckets del dashboard y avance nocturno de estados
+            models.Index(fields=["status", "billing_period"], name="rent_status_period_idx"),
+            # Orden estable para la paginación por cursor
+            models.Index(fields=["billing_period", "id"], name="rent_period_keyset_idx"),
+        ]
+
 ########################################################################################################
 ####                                                                                                ####
 ####                   Modelo para gestionar las habitaciones de los edificios                      ####
@@ -378,6 +461,7 @@ class LaundryBooking(models.Model):
 
     voucher_image = models.ImageField(
         upload_to=laundry_voucher_upload_path,
+        storage=get_upload_storage,
         validators=[validate_image_file],
         blank=False,
         null=False
@@ -402,3 +486,126 @@ class LaundryBooking(models.Model):
 
     def __str__(self):
         return f"{self.user.first_name} - {self.date} {self.time_slot} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # Orden estable para la paginación por cursor
+            models.Index(fields=["created_at", "id"], name="laundry_created_keyset_idx"),
+        ]
+
+
+########################################################################################################
+####                                                                                                ####
+####            Proyección precalculada del dashboard de administración                             ####
+####                                                                                                ####
+########################################################################################################
+class DashboardBucket(models.Model):
+    """
+    Una fila por bucket del dashboard (pagos rechazados, vencidos, en revisión y
+    lavandería pendiente). Guarda el contador y los N elementos más recientes ya
+    serializados; se recalcula en las transiciones de pagos y reservas.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    count = models.PositiveIntegerField(default=0)
+    items = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.count})"
+
+
+########################################################################################################
+####                                                                                                ####
+####            Marcas de agua de los procesos programados (cron)                                   ####
+####                                                                                                ####
+########################################################################################################
+class JobWatermark(models.Model):
+    """Último punto procesado por un comando programado, para que las re-ejecuciones sean baratas"""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+########################################################################################################
+####                                                                                                ####
+####            Bandeja de salida de correos (outbox transaccional)                                 ####
+####                                                                                                ####
+########################################################################################################
+class EmailOutbox(models.Model):
+    """
+    Correo pendiente de envío. Se escribe en la misma transacción que el cambio que lo
+    origina y lo envía en segundo plano `manage.py send_outbox_emails`.
+    """
+    STATUS_CHOICES = [
+        ("pending", "Pendiente"),
+        ("sent", "Enviado"),
+        ("failed", "Fallido"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    text_body = models.TextField()
+    html_body = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} ({self.status})"
+
+    class Meta:
+        indexes = [
+            # Cola de envío: pendientes cuyo próximo intento ya venció
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_next_idx"),
+        ]
+
+
+########################################################################################################
+####                                                                                                ####
+####            Conteo de referencias de los archivos direccionados por contenido                   ####
+####                                                                                                ####
+########################################################################################################
+class MediaBlob(models.Model):
+    """
+    Archivo guardado por su hash (ver core/storage.py) y cuántas filas lo referencian.
+    El archivo solo se borra del disco cuando desaparece su última referencia.
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+########################################################################################################
+####                                                                                                ####
+####            Franjas de lavandería reservadas (una fila por lavadora ocupada)                    ####
+####                                                                                                ####
+########################################################################################################
+class LaundrySlotClaim(models.Model):
+    """
+    Lavadora `machine` (1..LAUNDRY_SLOT_CAPACITY) tomada por una reserva en una franja.
+    La restricción única hace que reclamar una franja sea un único INSERT/UPDATE que la base
+    acepta o rechaza: dos reservas simultáneas nunca se quedan con la misma lavadora.
+    """
+    booking = models.OneToOneField(LaundryBooking, on_delete=models.CASCADE, related_name="slot_claim")
+    date = models.DateField()
+    time_slot = models.CharField(max_length=20)
+    machine = models.PositiveSmallIntegerField()
+
+    def __str__(self):
+        return f"{self.date} {self.time_slot} · lavadora {self.machine}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "time_slot", "machine"], name="laundry_slot_machine_unique"),
+            models.CheckConstraint(condition=models.Q(machine__gte=1), name="laundry_slot_machine_gte_1"),
+        ]
@@ -0,0 +1,69 @@
+import threading
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+
+from core.models import Contract, Room
+from core.response_cache import bump_version
+
+
+########################################################################################################
+####                                                                                                ####
+####            Consistencia de Room.is_occupied                                                    ####
+####                                                                                                ####
+########################################################################################################
+def active_contracts(today=None):
+    """Una habitación está ocupada si tiene un contrato vigente o futuro (end_date >= hoy)"""
+    today = today or date.today()
+    return Contract.objects.filter(room=OuterRef("pk"), end_date__gte=today)
+
+
+def occupancy_drift(room_ids=None, today=None):
+    """Habitaciones cuyo is_occupied no coincide con sus contratos"""
+    rooms = Room.objects.all()
+    if room_ids is not None:
+        rooms = rooms.filter(id__in=room_ids)
+    return rooms.alias(should_be_occupied=Exists(active_contracts(today))).exclude(
+        is_occupied=F("should_be_occupied")
+    )
+
+
+def sync_room_occupancy(room_ids=None, today=None):
+    """
+    Corrige en un único UPDATE todas las habitaciones (o las indicadas) cuyo is_occupied
+    no coincide con sus contratos. Devuelve cuántas se corrigieron.
+    """
+    corrected = occupancy_drift(room_ids, today).update(is_occupied=Exists(active_contracts(today)))
+    if corrected:
+        # update() no emite señales: invalidar a mano las respuestas cacheadas de habitaciones
+        bump_version(Room)
+    return corrected
+
+
+_dirty = threading.local()
+
+
+def _dirty_rooms():
+    if not hasattr(_dirty, "room_ids"):
+        _dirty.room_ids = set()
+    return _dirty.room_ids
+
+
+def flush_dirty_rooms():
+    """Sincroniza una sola vez las habitaciones marcadas durante la transacción"""
+    dirty = _dirty_rooms()
+    if not dirty:
+        return
+    room_ids = set(dirty)
+    dirty.clear()
+    sync_room_occupancy(room_ids)
+
+
+def mark_rooms_dirty(room_ids):
+    """
+    Marca habitaciones para sincronizar cuando la transacción actual confirme. Varios
+    contratos de la misma transacción (p. ej. borrados en cascada) producen un único UPDATE.
+    """
+    _dirty_rooms().update(room_id for room_id in room_ids if room_id)
+    transaction.on_commit(flush_dirty_rooms)
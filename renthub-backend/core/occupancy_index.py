@@ -0,0 +1,180 @@
+import threading
+from bisect import bisect_right
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.cache import increment
+from core.models import Contract, Room
+
+
+########################################################################################################
+####                                                                                                ####
+####            Índice de ocupación en memoria (habitación × día)                                   ####
+####                                                                                                ####
+########################################################################################################
+# Registro compartido de cambios: cada proceso aplica solo los que aún no vio
+CHANGES_SEQ_KEY = "occupancy_index:seq"
+CHANGES_KEY = "occupancy_index:change:{}"
+CHANGES_TIMEOUT = 60 * 60 * 24
+# Con más cambios pendientes que esto sale más barato reconstruir todo
+MAX_INCREMENTAL_CHANGES = 500
+ROOMS_CHANGED = "rooms"
+
+
+def day_mask(days, first, last):
+    """Bits de los días first..last (inclusive) empaquetados como una fila del índice"""
+    mask = np.zeros(days, dtype=bool)
+    mask[first:last + 1] = True
+    return np.packbits(mask, bitorder="little")
+
+
+class OccupancyIndex:
+    """
+    Mapa de bits habitación × día (1 = ocupada) entre `origin` y `origin + days`, empaquetado
+    con np.packbits: 8 días por byte (~140 bytes por habitación con el horizonte por defecto).
+    Una búsqueda de disponibilidad es un AND con la máscara del rango sobre los bytes que lo
+    cubren, sin consultar la base. Los cambios de contratos se aplican fila por fila.
+    Las habitaciones se ordenan por (edificio, número), la clave del cursor de `available`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built_on = None
+        self.seq = None
+
+    # ------------------------------------------------------------------ construcción
+    def build(self, today=None):
+        today = today or date.today()
+        self.origin = today - timedelta(days=settings.OCCUPANCY_INDEX_PAST_DAYS)
+        self.days = settings.OCCUPANCY_INDEX_PAST_DAYS + settings.OCCUPANCY_INDEX_FUTURE_DAYS + 1
+        self.horizon = self.origin + timedelta(days=self.days - 1)
+        # Se lee antes que los datos: un cambio concurrente se vuelve a aplicar, nunca se pierde
+        seq = cache.get(CHANGES_SEQ_KEY, 0)
+
+        rooms = sorted(
+            Room.objects.values_list("id", "building_id", "room_number"),
+            key=lambda room: (str(room[1]), room[2]),
+        )
+        self.room_ids = [room_id for room_id, _, _ in rooms]
+        self.room_keys = [(str(building_id), number) for _, building_id, number in rooms]
+        self.room_pos = {room_id: pos for pos, room_id in enumerate(self.room_ids)}
+        building_ids = sorted({building_id for _, building_id, _ in rooms}, key=str)
+        self.building_codes = {building_id: code for code, building_id in enumerate(building_ids)}
+        self.room_building = np.array([self.building_codes[b] for _, b, _ in rooms], dtype=np.int32)
+
+        self.matrix = np.zeros((len(self.room_ids), (self.days + 7) // 8), dtype=np.uint8)
+        self.contract_room = {}
+        self._fill(self.contracts_in_horizon())
+
+        self.built_on = today
+        self.seq = seq
+
+    def contracts_in_horizon(self):
+        return Contract.objects.filter(start_date__lte=self.horizon, end_date__gte=self.origin)
+
+    def _fill(self, contracts):
+        for contract_id, room_id, start, end in contracts.values_list("id", "room_id", "start_date", "end_date"):
+            pos = self.room_pos.get(room_id)
+            if pos is None:
+                continue
+            first = max((start - self.origin).days, 0)
+            last = min((end - self.origin).days, self.days - 1)
+            if first > last:
+                continue
+            # start y end inclusive
+            self.matrix[pos] |= day_mask(self.days, first, last)
+            self.contract_room[contract_id] = room_id
+
+    def rebuild_rooms(self, room_ids):
+        """Recalcula solo las filas de las habitaciones indicadas"""
+        self.contract_room = {c: r for c, r in self.contract_room.items() if r not in room_ids}
+        for room_id in room_ids:
+            self.matrix[self.room_pos[room_id]] = 0
+        self._fill(self.contracts_in_horizon().filter(room_id__in=room_ids))
+
+    # ------------------------------------------------------------------ cambios
+    def refresh(self, today=None):
+        """Pone el índice al día: completo si cambió el día o las habitaciones, si no por filas"""
+        today = today or date.today()
+        if self.built_on != today:
+            self.build(today)
+            return
+
+        current = cache.get(CHANGES_SEQ_KEY, 0)
+        if current == self.seq:
+            return
+        if current < self.seq or current - self.seq > MAX_INCREMENTAL_CHANGES:
+            self.build(today)
+            return
+
+        keys = [CHANGES_KEY.format(seq) for seq in range(self.seq + 1, current + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys) or ROOMS_CHANGED in changes.values():
+            self.build(today)
+            return
+
+        contract_ids = set(changes.values())
+        rooms = {self.contract_room[c] for c in contract_ids if c in self.contract_room}
+        rooms.update(Contract.objects.filter(id__in=contract_ids).values_list("room_id", flat=True))
+        if not rooms <= self.room_pos.keys():
+            self.build(today)
+            return
+
+        self.rebuild_rooms(rooms)
+        self.seq = current
+
+    # ------------------------------------------------------------------ consultas
+    def available(self, start, end, building_id=None, after=None, limit=None):
+        """
+        IDs de las habitaciones libres todos los días entre start y end (inclusive), en orden
+        (edificio, número), y la clave de la última entregada si quedan más. `after` es la
+        clave (str(building_id), room_number) desde la que continuar; `limit` el tamaño de página.
+        """
+        if start < self.origin or end > self.horizon:
+            raise ValueError(
+                f"El rango debe estar entre {self.origin.isoformat()} y {self.horizon.isoformat()}."
+            )
+
+        first, last = (start - self.origin).days, (end - self.origin).days
+        columns = slice(first // 8, last // 8 + 1)
+        mask = day_mask(self.days, first, last)[columns]
+        free = ~(self.matrix[:, columns] & mask).any(axis=1)
+        if building_id is not None:
+            code = self.building_codes.get(building_id)
+            if code is None:
+                return [], None
+            free &= self.room_building == code
+
+        positions = np.flatnonzero(free)
+        if after is not None:
+            positions = positions[positions >= bisect_right(self.room_keys, after)]
+        if limit is None or len(positions) <= limit:
+            return [self.room_ids[pos] for pos in positions], None
+        positions = positions[:limit]
+        return [self.room_ids[pos] for pos in positions], self.room_keys[positions[-1]]
+
+
+_index = OccupancyIndex()
+
+
+def available_rooms(start, end, building_id=None, after=None, limit=None):
+    """Búsqueda de disponibilidad contra el índice del proceso, actualizado antes de responder"""
+    with _index.lock:
+        _index.refresh()
+        return _index.available(start, end, building_id, after, limit)
+
+
+def record_occupancy_change(change):
+    """
+    Anota un cambio (ID de contrato, o ROOMS_CHANGED) en el registro compartido al confirmar
+    la transacción, para que todos los procesos actualicen su índice en la próxima búsqueda.
+    """
+    def publish():
+        seq = increment(CHANGES_SEQ_KEY, None)
+        cache.set(CHANGES_KEY.format(seq), change, CHANGES_TIMEOUT)
+
+    transaction.on_commit(publish)
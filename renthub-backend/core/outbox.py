@@ -0,0 +1,181 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from core.models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+########################################################################################################
+####                                                                                                ####
+####            Encolado de correos                                                                 ####
+####                                                                                                ####
+########################################################################################################
+def enqueue_email(to_email, subject, text_body, html_body=None):
+    """Guarda el correo en la bandeja de salida; se envía al confirmar la transacción actual"""
+    return EmailOutbox.objects.create(
+        to_email=to_email,
+        subject=subject,
+        text_body=text_body,
+        html_body=html_body,
+    )
+
+
+def queue_activation_email(user):
+    """Encola el correo de activación de cuenta de un inquilino"""
+    url = f"{settings.DOMINIO}/verify-account/{user.email_verification_token}"
+    subject = "Bienvenido a Renthub!"
+
+    # Contenido en texto plano
+    text_content = (
+        f"Hola {user.first_name},\n\n"
+        f"Gracias por registrarte en Renthub.\n"
+        f"Activa tu cuenta haciendo clic en el siguiente enlace:\n\n{url}\n\n"
+        "Si no te registraste, ignora este mensaje."
+    )
+
+    # Contenido HTML
+    html_content = f"""
+    <html>
+      <body style="font-family: Arial, sans-serif; background-color: #f9f9f9; padding: 20px;">
+        <div style="max-width: 600px; margin: auto; background-color: #ffffff; border-radius: 10px; padding: 30px; box-shadow: 0 0 10px rgba(0,0,0,0.1);">
+          <h2 style="color: #333333;">¡Bienvenido a <span style="color: #4CAF50;">Renthub</span>!</h2>
+          <p>Hola {user.first_name},</p>
+          <p>Gracias por registrarte. Estamos encantados de tenerte con nosotros.</p>
+          <p>Para comenzar, por favor activa tu cuenta haciendo clic en el siguiente botón:</p>
+          <p style="text-align: center; margin: 30px 0;">
+            <a href="{url}" style="background-color: #4CAF50; color: white; padding: 12px 20px; text-decoration: none; border-radius: 5px;">Activar mi cuenta</a>
+          </p>
+          <p>Si no solicitaste esta cuenta, puedes ignorar este mensaje.</p>
+          <p>— El equipo de Renthub</p>
+        </div>
+      </body>
+    </html>
+    """
+
+    return enqueue_email(user.email, subject, text_content, html_content)
+
+
+########################################################################################################
+####                                                                                                ####
+####            Envío en segundo plano                                                              ####
+####                                                                                                ####
+########################################################################################################
+def retry_delay(attempts):
+    """Espera exponencial entre reintentos: base * 2^(intentos-1), con tope"""
+    base = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS))
+
+
+def queue_depth():
+    """Estado de la cola: pendientes, listos para enviar, fallidos y antigüedad del más viejo"""
+    now = timezone.now()
+    pending = EmailOutbox.objects.filter(status="pending")
+    oldest = pending.aggregate(oldest=Min("created_at"))["oldest"]
+    return {
+        "pending": pending.count(),
+        "due": pending.filter(next_attempt_at__lte=now).count(),
+        "failed": EmailOutbox.objects.filter(status="failed").count(),
+        "oldest_pending_seconds": int((now - oldest).total_seconds()) if oldest else 0,
+    }
+
+
+def _record_failure(message, error, max_attempts):
+    """Registra un intento fallido y programa el siguiente (o marca el correo como fallido)"""
+    logger.warning(f"Error enviando correo {message.id} a {message.to_email}: {error}")
+    message.last_error = str(error)
+    if message.attempts >= max_attempts:
+        message.status = "failed"
+    else:
+        message.next_attempt_at = timezone.now() + retry_delay(message.attempts)
+
+
+def claim_pending(batch_size, lease):
+    """
+    Reserva un lote en una transacción corta: SKIP LOCKED evita que dos workers tomen la
+    misma fila y next_attempt_at pasa a ser el fin de la reserva, así ninguna otra
+    consulta la vuelve a elegir mientras se envía. Si el worker muere, la fila vuelve
+    a la cola cuando vence la reserva.
+    """
+    with transaction.atomic():
+        messages = list(
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=timezone.now())
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        lease_until = timezone.now() + lease
+        for message in messages:
+            message.attempts += 1
+            message.next_attempt_at = lease_until
+        EmailOutbox.objects.bulk_update(messages, ["attempts", "next_attempt_at"])
+    return messages, lease_until
+
+
+def deliver_pending(batch_size=100, connection=None):
+    """
+    Envía un lote de correos pendientes reutilizando una sola conexión SMTP.
+    Las filas se reservan antes de enviar (ver claim_pending) y el envío ocurre fuera
+    de toda transacción: un servidor SMTP lento no retiene bloqueos.
+    Devuelve (enviados, fallidos).
+    """
+    max_attempts = settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+    connection = connection or get_connection()
+
+    messages, lease_until = claim_pending(batch_size, timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS))
+    if not messages:
+        return 0, 0
+
+    delivered, errors, unsent = [], [], []
+    try:
+        connection.open()
+    except Exception as e:
+        # Servidor caído: todo el lote se reintenta más tarde
+        errors = [(message, e) for message in messages]
+    else:
+        try:
+            for message in messages:
+                # Con la reserva vencida otro worker puede haber tomado el resto del lote
+                if timezone.now() >= lease_until:
+                    unsent.append(message)
+                    continue
+
+                email = EmailMultiAlternatives(
+                    message.subject, message.text_body, settings.DEFAULT_FROM_EMAIL,
+                    [message.to_email], connection=connection
+                )
+                if message.html_body:
+                    email.attach_alternative(message.html_body, "text/html")
+
+                try:
+                    email.send()
+                except Exception as e:
+                    errors.append((message, e))
+                else:
+                    delivered.append(message.id)
+        finally:
+            connection.close()
+
+    # Solo se tocan las filas cuya reserva sigue siendo nuestra
+    leased = EmailOutbox.objects.filter(status="pending", next_attempt_at=lease_until)
+    if delivered:
+        leased.filter(id__in=delivered).update(status="sent", sent_at=timezone.now(), last_error=None)
+    if unsent:
+        leased.filter(id__in=[message.id for message in unsent]).update(
+            attempts=F("attempts") - 1, next_attempt_at=timezone.now()
+        )
+    if errors:
+        for message, error in errors:
+            _record_failure(message, error, max_attempts)
+        owned = set(leased.filter(id__in=[message.id for message, _ in errors]).values_list("id", flat=True))
+        EmailOutbox.objects.bulk_update(
+            [message for message, _ in errors if message.id in owned], ["status", "next_attempt_at", "last_error"]
+        )
+
+    return len(delivered), len(errors)
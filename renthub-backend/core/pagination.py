@@ -0,0 +1,155 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import date
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+########################################################################################################
+####                                                                                                ####
+####            Paginación por cursor (keyset) para los listados de la API                          ####
+####                                                                                                ####
+########################################################################################################
+def estimate_count(queryset):
+    """
+    Devuelve el número de filas estimado por el planificador de PostgreSQL
+    (EXPLAIN) sin recorrer la tabla. En otros motores hace un COUNT normal.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.order_by().count()
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginación por cursor sobre un orden estable e indexado.
+
+    Cada vista define `pagination_ordering`, por ejemplo ("-created_at", "-id");
+    el último campo debe ser único para desempatar. El cursor guarda los valores
+    de la última fila entregada y la página siguiente se obtiene con un WHERE
+    sobre esos valores, así la página N cuesta lo mismo que la página 1.
+
+    Es opcional: solo se pagina si la petición trae `page_size` o `cursor`, para
+    no romper a los clientes que esperan la lista completa, salvo que la vista
+    declare `pagination_required = True`.
+    El total se devuelve en la cabecera `X-Total-Count` si se pide con
+    `?count=exact` o `?count=estimate` (estimado por el planificador).
+    """
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    count_query_param = "count"
+    page_size = 50
+    max_page_size = 500
+
+    def get_ordering(self, view):
+        return getattr(view, "pagination_ordering", None)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(encoded.encode("ascii")).decode("utf-8"))
+        except (TypeError, ValueError, UnicodeError, BinasciiError):
+            raise NotFound("Cursor inválido.")
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound("Cursor inválido.")
+        return values
+
+    def encode_cursor(self, instance):
+        values = [
+            # isoformat completo: conserva los microsegundos para que la igualdad sea exacta
+            value.isoformat() if isinstance(value, date) else str(value)
+            for value in (getattr(instance, field.lstrip("-")) for field in self.ordering)
+        ]
+        data = json.dumps(values)
+        return urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+    def build_keyset_filter(self, values):
+        """
+        Construye (a > x) OR (a = x AND b > y) ... respetando la dirección de cada campo.
+        """
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            step = Q(**{f"{name}__{lookup}": values[index]})
+            for previous, value in zip(self.ordering[:index], values[:index]):
+                step &= Q(**{previous.lstrip("-"): value})
+            condition |= step
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = self.get_ordering(view)
+        if not self.ordering:
+            return None
+
+        params = request.query_params
+        requested = self.cursor_query_param in params or self.page_size_query_param in params
+        if not requested and not getattr(view, "pagination_required", False):
+            return None
+
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+
+        queryset = queryset.order_by(*self.ordering)
+
+        self.total_count = None
+        count_mode = params.get(self.count_query_param)
+        if count_mode == "estimate":
+            self.total_count = estimate_count(queryset)
+        elif count_mode == "exact":
+            self.total_count = queryset.order_by().count()
+        self.count_mode = count_mode
+
+        values = self.decode_cursor(request)
+        if values is not None:
+            queryset = queryset.filter(self.build_keyset_filter(values))
+
+        # Se pide una fila extra para saber si existe una página siguiente
+        page = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(page) > self.page_size_value
+        page = page[:self.page_size_value]
+        self.last_instance = page[-1] if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next or self.last_instance is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.count_query_param)
+        url = replace_query_param(url, self.page_size_query_param, self.page_size_value)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_instance))
+
+    def get_paginated_response(self, data):
+        response = Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+        if self.total_count is not None:
+            response["X-Total-Count"] = str(self.total_count)
+            if self.count_mode == "estimate":
+                response["X-Total-Count-Estimated"] = "true"
+        return response
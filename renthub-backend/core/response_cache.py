@@ -0,0 +1,82 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from core.cache import increment
+
+
+########################################################################################################
+####                                                                                                ####
+####            Versiones por modelo                                                                ####
+####                                                                                                ####
+########################################################################################################
+def version_key(model):
+    return f"model_version:{model._meta.label_lower}"
+
+
+def get_versions(models):
+    """
+    Versión actual de cada modelo. Si la clave no existe (o el cache la descartó) se crea con
+    la hora en milisegundos: nunca vuelve a un valor usado, así que no revive respuestas viejas.
+    """
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(model):
+    """Invalida de una vez todas las respuestas cacheadas que dependen del modelo"""
+    increment(version_key(model), None)
+
+
+########################################################################################################
+####                                                                                                ####
+####            Cache de respuestas ya renderizadas                                                 ####
+####                                                                                                ####
+########################################################################################################
+def cached_response(*models):
+    """
+    Cachea los bytes de la respuesta de una acción de un ViewSet. La clave incluye el rol
+    del usuario, la URL, el formato y la versión de cada modelo del que dependen los datos:
+    al guardar o borrar uno de ellos la versión sube y las respuestas anteriores dejan de usarse.
+    En un acierto no se consulta la base ni se ejecuta el serializador.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, request, *args, **kwargs):
+            versions = ":".join(str(version) for version in get_versions(models))
+            role = getattr(request.user, "role", "anonymous")
+            key = (
+                f"response:{role}:{request.accepted_renderer.format}:"
+                f"{request.get_full_path()}:{versions}"
+            )
+
+            cached = cache.get(key)
+            if cached is not None:
+                content_type, content = cached
+                response = HttpResponse(content, content_type=content_type)
+                response["X-Response-Cache"] = "hit"
+                return response
+
+            response = func(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+            # Se renderiza aquí (finalize_response no vuelve a hacerlo) para guardar los bytes
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            cache.set(key, (response["Content-Type"], response.content), settings.RESPONSE_CACHE_TIMEOUT)
+            response["X-Response-Cache"] = "miss"
+            return response
+
+        return wrapper
+    return decorator
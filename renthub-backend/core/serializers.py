@@ -1,5 +1,3 @@
-from dateutil.relativedelta import relativedelta
-from datetime import datetime
 from django.db import transaction
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
@@ -7,7 +5,12 @@ from rest_framework.exceptions import ValidationError as DRFValidationError
 from core.models import (CustomUser, UserChangeRequest,
                          Contract, RentPaymentHistory,
                          Room, Building, ReferencePerson,
-                         LaundryBooking, DocumentType)
+                         LaundryBooking, DocumentType,
+                         current_billing_period)
+from core.dashboard import RENT_BUCKETS, invalidate_user_dashboard, mark_buckets_dirty
+from core.images import variant_urls
+from core.document_types import document_types
+from core.standing import sync_payment_standing
 
 ########################################################################################################
 ####               Serializador para la persona de referencia (ReferencePerson)                     ####
@@ -36,12 +39,9 @@ class ReferencePersonSerializer(serializers.ModelSerializer):
 
     def get_document(self, obj):
         """Devuelve un objeto con tipo y número de documento (GET)"""
-        if obj.document_type:
-            return {
-                "id": str(obj.document_type.id),
-                "name": obj.document_type.name,
-                "number": obj.document_number
-            }
+        document_type = document_types.get(obj.document_type_id)
+        if document_type:
+            return {**document_type, "number": obj.document_number}
         return None
 
     def validate(self, data):
@@ -81,6 +81,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
     date_joined = serializers.DateTimeField(read_only=True)
     role = serializers.CharField(required=False)
     profile_photo = serializers.ImageField(required=False)
+    profile_photo_variants = serializers.SerializerMethodField()
     document_type = serializers.SerializerMethodField()
     reference_1 = serializers.SerializerMethodField()
     reference_2 = serializers.SerializerMethodField()
@@ -112,15 +113,18 @@ class CustomUserSerializer(serializers.ModelSerializer):
             "password","role",
             "document_type", "document_type_id",  # GET: Objeto | POST/PUT: ID
             "document_number",
-            "profile_photo",
+            "profile_photo", "profile_photo_variants",
             "is_active", "date_joined",
             "reference_1", "reference_1_id",  # GET: Objeto | POST/PUT: ID
             "reference_2", "reference_2_id",  # GET: Objeto | POST/PUT: ID
-            "is_verified"
+            "is_verified", "payment_standing"
         ]
 
     def get_profile_photo(self, obj):
         return obj.profile_photo.url if obj.profile_photo else None
+
+    def get_profile_photo_variants(self, obj):
+        return variant_urls(obj.profile_photo)
     
     def create(self, validated_data):
         password = validated_data.pop("password", None)
@@ -135,12 +139,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
 
     def get_document_type(self, obj):
         """ Devuelve el tipo de documento como un objeto con id y nombre """
-        if obj.document_type:
-            return {
-                "id": str(obj.document_type.id),
-                "name": obj.document_type.name
-            }
-        return None
+        return document_types.get(obj.document_type_id)
 
     def get_reference_1(self, obj):
         """ Devuelve los datos completos de la primera referencia """
@@ -149,10 +148,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
                 "id": str(obj.reference_1.id),
                 "first_name": obj.reference_1.first_name,
                 "last_name": obj.reference_1.last_name,
-                "document_type": {
-                    "id": str(obj.reference_1.document_type.id) if obj.reference_1.document_type else None,
-                    "name": obj.reference_1.document_type.name if obj.reference_1.document_type else None
-                },
+                "document_type": document_types.get(obj.reference_1.document_type_id) or {"id": None, "name": None},
                 "document_number": obj.reference_1.document_number,
                 "phone_number": obj.reference_1.phone_number
             }
@@ -165,10 +161,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
                 "id": str(obj.reference_2.id),
                 "first_name": obj.reference_2.first_name,
                 "last_name": obj.reference_2.last_name,
-                "document_type": {
-                    "id": str(obj.reference_2.document_type.id) if obj.reference_2.document_type else None,
-                    "name": obj.reference_2.document_type.name if obj.reference_2.document_type else None
-                },
+                "document_type": document_types.get(obj.reference_2.document_type_id) or {"id": None, "name": None},
                 "document_number": obj.reference_2.document_number,
                 "phone_number": obj.reference_2.phone_number
             }
@@ -189,6 +182,7 @@ class ContractSerializer(serializers.ModelSerializer):
     is_overdue = serializers.SerializerMethodField()
     next_month = serializers.SerializerMethodField()
     contract_photo = serializers.SerializerMethodField()
+    contract_photo_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Contract
@@ -196,38 +190,46 @@ class ContractSerializer(serializers.ModelSerializer):
             "id", "user", "user_full_name", "room", "room_number", "building_name",
             "start_date", "end_date", "rent_amount", "deposit_amount", 
             "includes_wifi", "wifi_cost", "is_overdue", "next_month",
-            "contract_photo"
+            "contract_photo", "contract_photo_variants"
         ]
 
     def get_contract_photo(self, obj):
         return obj.contract_photo.url if obj.contract_photo else None
 
+    def get_contract_photo_variants(self, obj):
+        return variant_urls(obj.contract_photo)
+
     def get_user_full_name(self, obj):
         return f"{obj.user.first_name} {obj.user.last_name}"
     
     def get_is_overdue(self, obj):
         """Determina si el contrato tiene pagos vencidos sin modificar la BD."""
-        today = datetime.today()
-        current_year_month = f"{today.year}-{today.month:02d}"
+        # Valor anotado por ContractViewSet.get_queryset (sin consulta por fila)
+        if hasattr(obj, "has_overdue"):
+            return obj.has_overdue
 
         return obj.rent_payments.filter(
-            status__in=["overdue", "pending_review", "rejected"], month_paid__lte=current_year_month
+            status__in=RentPaymentHistory.OUTSTANDING_STATUSES, billing_period__lte=current_billing_period()
         ).exists()
     
     def get_next_month(self, obj):
         """Devuelve el próximo mes a pagar y, si tiene voucher, el nombre del archivo"""
-        payments = obj.rent_payments.filter(
-            status__in=["overdue", "pending_review", "rejected"]
-        ).order_by("month_paid")
+        # Pagos pendientes precargados por ContractViewSet.get_queryset
+        if hasattr(obj, "outstanding_payments"):
+            next_payment = obj.outstanding_payments[0] if obj.outstanding_payments else None
+        else:
+            next_payment = obj.rent_payments.filter(
+                status__in=RentPaymentHistory.OUTSTANDING_STATUSES
+            ).order_by("billing_period").first()
 
-        if not payments.exists():
+        if next_payment is None:
             return None
 
-        next_payment = payments.first()
         return {
             "id": next_payment.id,
             "payment": next_payment.month_paid,
             "voucher": next_payment.receipt_image.url if next_payment.receipt_image else None,
+            "voucher_variants": variant_urls(next_payment.receipt_image),
             "status": next_payment.status,
             "admin_comment": next_payment.admin_comment
         }
@@ -243,33 +245,17 @@ class ContractSerializer(serializers.ModelSerializer):
             if Contract.objects.filter(room=room, end_date__gte=validated_data["start_date"]).exists():
                 raise DjangoValidationError(f"La habitación {room.room_number} ya tiene un contrato activo.")
 
-            # Crear el contrato
+            # Crear el contrato (la habitación se marca ocupada al confirmar, ver core/occupancy.py)
             contract = Contract.objects.create(**validated_data)
 
-            # Marcar habitación como ocupada manualmente (create no ejecuta save personalizado)
-            room.is_occupied = True
-            room.save(update_fields=["is_occupied"])
-
-            # Inicializar fechas
-            current_date = contract.start_date
-            end_date = contract.end_date
-            today = datetime.today().date()
+            # Generar el calendario de pagos en un único INSERT
+            RentPaymentHistory.objects.bulk_create(contract.build_rent_schedule())
 
-            while current_date <= end_date:
-                month_payment = current_date.strftime("%Y-%m")
-
-                # Comparar fechas correctamente
-                payment_state = "overdue" if current_date < today else "upcoming"
-
-                # Crear historial de pagos
-                RentPaymentHistory.objects.create(
-                    contract=contract,
-                    month_paid=month_payment,
-                    status=payment_state
-                )
-
-                # Avanzar al mes siguiente (manteniendo el día original)
-                current_date += relativedelta(months=1)
+            # bulk_create no emite señales: refrescar el dashboard al confirmar
+            # y la situación de pagos del inquilino (los meses ya pasados nacen vencidos)
+            mark_buckets_dirty(RENT_BUCKETS)
+            sync_payment_standing(user_ids=[contract.user_id])
+            invalidate_user_dashboard(contract.user_id)
 
         return contract
 
@@ -328,18 +314,11 @@ class UserChangeRequestSerializer(serializers.ModelSerializer):
             else:
                 doc_id = changes["document_type"]
                 
-            try:
-                doc = DocumentType.objects.get(id=doc_id)
-                changes["document_type"] = {
-                    "id": str(doc.id),
-                    "name": doc.name
-                }
-            except (DocumentType.DoesNotExist, ValueError):
-                # Si el documento no existe o hay error al convertir el ID
-                changes["document_type"] = {
-                    "id": doc_id,
-                    "name": "Tipo eliminado"
-                }
+            # Si el documento no existe o el ID no es válido
+            changes["document_type"] = document_types.get(doc_id) or {
+                "id": doc_id,
+                "name": "Tipo eliminado"
+            }
 
         rep["changes"] = changes
         return rep
@@ -352,13 +331,14 @@ class RentPaymentSerializer(serializers.ModelSerializer):
     contract = serializers.SerializerMethodField()
     receipt_image = serializers.ImageField(required=True)
     receipt_image_url = serializers.SerializerMethodField()
+    receipt_image_variants = serializers.SerializerMethodField()
     user_comment = serializers.CharField(allow_blank=True, required=False)
 
     
     class Meta:
         model = RentPaymentHistory
         fields = [
-            "id", "contract", "month_paid", "receipt_image", "receipt_image_url",
+            "id", "contract", "month_paid", "receipt_image", "receipt_image_url", "receipt_image_variants",
             "payment_date", "status", "admin_comment", "user_comment"
         ]
         extra_kwargs = {
@@ -370,6 +350,9 @@ class RentPaymentSerializer(serializers.ModelSerializer):
     def get_receipt_image_url(self, obj):
         return obj.receipt_image.url if obj.receipt_image else None
 
+    def get_receipt_image_variants(self, obj):
+        return variant_urls(obj.receipt_image)
+
     def create(self, validated_data):
         validated_data["status"] = "pending_review"
         return super().create(validated_data)
@@ -417,6 +400,7 @@ class LaundryBookingSerializer(serializers.ModelSerializer):
     pending_action = serializers.SerializerMethodField()
     voucher_image = serializers.ImageField(required=True) 
     voucher_image_url = serializers.SerializerMethodField()  
+    voucher_image_variants = serializers.SerializerMethodField()
     payment_status = serializers.SerializerMethodField()
     user_comment = serializers.CharField(allow_blank=True, required=False)
     admin_comment = serializers.CharField(allow_blank=True, required=False)
@@ -425,7 +409,7 @@ class LaundryBookingSerializer(serializers.ModelSerializer):
         model = LaundryBooking
         fields = [
             "id", "user", "user_full_name", "date", "time_slot",
-            "voucher_image", "voucher_image_url",
+            "voucher_image", "voucher_image_url", "voucher_image_variants",
             "status", "admin_comment", "user_comment",
             "proposed_date", "proposed_time_slot",
             "counter_proposal_date", "counter_proposal_time_slot",
@@ -433,9 +417,26 @@ class LaundryBookingSerializer(serializers.ModelSerializer):
         ]
         extra_kwargs = {"user": {"required": False}}
 
+    # La franja y el estado solo cambian con las acciones (approve, propose, ...), que pasan por
+    # claim_slot/release_slot: un PATCH directo se saltaría el control de capacidad
+    SLOT_FIELDS = [
+        "user", "date", "time_slot", "status", "proposed_date", "proposed_time_slot",
+        "counter_proposal_date", "counter_proposal_time_slot", "last_action_by",
+    ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            for name in self.SLOT_FIELDS:
+                fields[name].read_only = True
+        return fields
+
     def get_voucher_image_url(self, obj):
         return obj.voucher_image.url if obj.voucher_image else None
 
+    def get_voucher_image_variants(self, obj):
+        return variant_urls(obj.voucher_image)
+
     def create(self, validated_data):
         request = self.context.get("request")
         if request and request.user.is_authenticated and request.user.is_tenant():
@@ -455,6 +456,10 @@ class LaundryBookingSerializer(serializers.ModelSerializer):
             return obj.payment.status
         return None
 
+class BatchProposeSerializer(serializers.Serializer):
+    """Reservas a las que proponer franja; sin `ids` se toma la cola pendiente del administrador"""
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=True)
+
 ########################################################################################################
 ####                    Serializador para el tipo de documento (DocumentType)                       ####
 ########################################################################################################
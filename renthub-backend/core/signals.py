@@ -1,46 +1,253 @@
-import os
-from datetime import date
-from django.db.models.signals import post_delete
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
 from core.models import (Contract ,
                          CustomUser, 
-                         RentPaymentHistory)
+                         RentPaymentHistory,
+                         LaundryBooking,
+                         MediaBlob,
+                         DocumentType,
+                         Building,
+                         Room)
+from core.storage import content_addressed_storage, is_content_addressed
+from core.dashboard import (RENT_BUCKETS, LAUNDRY_BUCKETS, bucket_of, track_bucket_change,
+                            invalidate_user_dashboard, payment_user_id)
+from core.images import delete_variants, schedule_variants
+from core.authentication import invalidate_auth_user
+from core.response_cache import bump_version
+from core.occupancy_index import ROOMS_CHANGED, record_occupancy_change
+from core.occupancy import mark_rooms_dirty
+from core.laundry import invalidate_availability_grid
+from core.standing import sync_contract_standing
+from core.document_types import document_types
 
+@receiver(post_init, sender=Contract)
+def remember_contract_room(sender, instance, **kwargs):
+    """Recuerda la habitación original por si el contrato se cambia de habitación"""
+    instance._initial_room_id = instance.__dict__.get("room_id")
+
+@receiver(post_save, sender=Contract)
 @receiver(post_delete, sender=Contract)
-def release_room_if_empty(sender, instance, **kwargs):
+def sync_contract_rooms(sender, instance, **kwargs):
+    """Sincroniza is_occupied de las habitaciones del contrato (la actual y la anterior)"""
+    mark_rooms_dirty({instance.room_id, getattr(instance, "_initial_room_id", None)})
+    instance._initial_room_id = instance.room_id
+
+# Campo de archivo subido de cada modelo
+UPLOAD_FIELDS = {
+    CustomUser: "profile_photo",
+    Contract: "contract_photo",
+    RentPaymentHistory: "receipt_image",
+    LaundryBooking: "voucher_image",
+}
+
+DEFAULT_PHOTO_SUFFIX = "adminDefault.jpg"
+
+def delete_stored_file(name):
     """
-    Libera la habitación si ya no tiene contratos activos en el futuro.
-    Esto se ejecuta automáticamente al eliminar un contrato.
+    Borra el archivo (y sus variantes) salvo que otra fila lo haya vuelto a referenciar.
+    La comprobación y el borrado ocurren con la fila de MediaBlob bloqueada (se crea con
+    ref_count=0 si ya no existe): una subida simultánea del mismo contenido espera en
+    retain_blob a que termine el borrado y vuelve a escribir el archivo.
     """
-    room = instance.room
+    if not is_content_addressed(name):
+        if content_addressed_storage.exists(name):
+            content_addressed_storage.delete(name)
+        delete_variants(name)
+        return
+
+    with transaction.atomic():
+        MediaBlob.objects.get_or_create(name=name)
+        blob = MediaBlob.objects.select_for_update().get(name=name)
+        if blob.ref_count > 0:
+            return
+        if content_addressed_storage.exists(name):
+            content_addressed_storage.delete(name)
+        delete_variants(name)
+        blob.delete()
+
+def retain_blob(name, source=None):
+    """
+    Suma una referencia a un archivo direccionado por contenido. ContentAddressedStorage no
+    reescribe un contenido que ya existe; si un borrado pendiente se lo llevó entre la subida
+    y este punto, se vuelve a escribir desde `source` (el archivo subido) con la fila bloqueada.
+    """
+    if not is_content_addressed(name):
+        return
+    with transaction.atomic():
+        MediaBlob.objects.get_or_create(name=name)
+        if not MediaBlob.objects.filter(name=name).update(ref_count=F("ref_count") + 1):
+            # Un borrado que tenía la fila bloqueada la eliminó mientras esperábamos
+            MediaBlob.objects.create(name=name, ref_count=1)
+        if source is not None and not content_addressed_storage.exists(name):
+            if hasattr(source, "seek"):
+                source.seek(0)
+            content_addressed_storage.save(name, source)
+
+def release_blob(name):
+    """
+    Resta una referencia y borra el archivo cuando era la última. Los archivos
+    anteriores al almacenamiento por hash no tienen conteo y se borran directamente,
+    excepto la imagen de perfil por defecto.
+    """
+    if not name or name.endswith(DEFAULT_PHOTO_SUFFIX):
+        return
+
+    if is_content_addressed(name):
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None:
+                return
+            if blob.ref_count > 1:
+                blob.ref_count -= 1
+                blob.save(update_fields=["ref_count"])
+                return
+            blob.delete()
+
+    # El archivo se borra solo si la transacción confirma
+    transaction.on_commit(lambda: delete_stored_file(name))
+
+# Marca para un campo diferido (.only()/.defer()) cuyo valor no se cargó
+_UNKNOWN = object()
+
+def _file_name(instance, field):
+    """Nombre del archivo cargado en la instancia, o _UNKNOWN si el campo está diferido"""
+    if field not in instance.__dict__:
+        return _UNKNOWN
+    value = instance.__dict__[field]
+    return getattr(value, "name", value) or None
+
+@receiver(post_init)
+def remember_stored_file(sender, instance, **kwargs):
+    """Recuerda el archivo con el que se cargó la fila para detectar reemplazos al guardar"""
+    field = UPLOAD_FIELDS.get(sender)
+    if field:
+        instance._stored_file = _file_name(instance, field)
+
+@receiver(pre_save)
+def remember_pending_upload(sender, instance, **kwargs):
+    """Guarda la subida antes de que FileField la reemplace por su nombre (ver retain_blob)"""
+    field = UPLOAD_FIELDS.get(sender)
+    if field and _file_name(instance, field) is not _UNKNOWN:
+        file = getattr(instance, field)
+        instance._pending_upload = None if not file or file._committed else file.file
 
-    # Verifica si no quedan contratos activos en esa habitación
-    has_active_contracts = Contract.objects.filter(
-        room=room,
-        end_date__gte=date.today()
-    ).exists()
+@receiver(post_save)
+def track_stored_file(sender, instance, created=False, update_fields=None, **kwargs):
+    """Actualiza las referencias cuando una fila empieza a usar (o reemplaza) un archivo"""
+    field = UPLOAD_FIELDS.get(sender)
+    if not field or (update_fields is not None and field not in update_fields):
+        return
 
-    if not has_active_contracts:
-        room.is_occupied = False
-        room.save(update_fields=["is_occupied"])
+    # En una fila nueva post_init recordó el nombre de la subida del cliente (p. ej.
+    # 'recibo.png'), no un archivo guardado: no hay nada que liberar
+    previous = None if created else getattr(instance, "_stored_file", _UNKNOWN)
+    current = _file_name(instance, field)
+    if previous is _UNKNOWN or current is _UNKNOWN or previous == current:
+        return
 
-def delete_file_if_exists(file_field):
-    """Borra el archivo del sistema de archivos si existe"""
-    if file_field and os.path.isfile(file_field.path):
-        os.remove(file_field.path)
+    retain_blob(current, source=getattr(instance, "_pending_upload", None))
+    release_blob(previous)
+    instance._stored_file = current
+    instance._pending_upload = None
+    # Las variantes solo se generan cuando cambia el archivo, no en cada guardado de la fila
+    schedule_variants(getattr(instance, field))
 
+@receiver(post_delete)
+def release_stored_file(sender, instance, **kwargs):
+    """Libera el archivo de la fila eliminada; se borra del disco con su última referencia"""
+    field = UPLOAD_FIELDS.get(sender)
+    if field:
+        name = _file_name(instance, field)
+        if name is not _UNKNOWN:
+            release_blob(name)
+
+@receiver(post_init, sender=RentPaymentHistory)
+@receiver(post_init, sender=LaundryBooking)
+def remember_dashboard_bucket(sender, instance, **kwargs):
+    """Recuerda en qué bucket del dashboard estaba la fila para ajustar sus contadores al guardar"""
+    instance._dashboard_bucket = bucket_of(instance)
+
+def refresh_dashboard_bucket(instance, names, created=False, deleted=False):
+    previous = None if created else getattr(instance, "_dashboard_bucket", None)
+    current = None if deleted else bucket_of(instance)
+    track_bucket_change(previous, current, names)
+    instance._dashboard_bucket = current
+
+@receiver(post_save, sender=RentPaymentHistory)
+@receiver(post_delete, sender=RentPaymentHistory)
+def refresh_rent_dashboard(sender, instance, created=False, signal=None, **kwargs):
+    """Mantiene actualizados los buckets de pagos del dashboard de administración"""
+    refresh_dashboard_bucket(instance, RENT_BUCKETS, created, deleted=signal is post_delete)
+
+@receiver(post_save, sender=RentPaymentHistory)
+@receiver(post_delete, sender=RentPaymentHistory)
+def refresh_payment_standing(sender, instance, update_fields=None, **kwargs):
+    """Recalcula la situación de pagos del inquilino en la misma transacción que el pago"""
+    if update_fields is not None and not {"status", "month_paid", "contract"} & set(update_fields):
+        return
+    sync_contract_standing([instance.contract_id])
+
+@receiver(post_save, sender=LaundryBooking)
+@receiver(post_delete, sender=LaundryBooking)
+def refresh_laundry_dashboard(sender, instance, created=False, signal=None, **kwargs):
+    """Mantiene actualizados los buckets de lavandería y la grilla de disponibilidad"""
+    refresh_dashboard_bucket(instance, LAUNDRY_BUCKETS, created, deleted=signal is post_delete)
+    invalidate_availability_grid()
+
+@receiver(post_save, sender=RentPaymentHistory)
+@receiver(post_delete, sender=RentPaymentHistory)
+def refresh_user_dashboard_payments(sender, instance, **kwargs):
+    invalidate_user_dashboard(payment_user_id(instance))
+
+@receiver(post_save, sender=LaundryBooking)
+@receiver(post_delete, sender=LaundryBooking)
+def refresh_user_dashboard_laundry(sender, instance, **kwargs):
+    invalidate_user_dashboard(instance.user_id)
+
+@receiver(post_save, sender=CustomUser)
 @receiver(post_delete, sender=CustomUser)
-def delete_user_images(sender, instance, **kwargs):
+def invalidate_cached_auth_user(sender, instance, **kwargs):
     """
-    Elimina la imagen de perfil del usuario cuando se elimina el usuario,
-    excepto si es la imagen por defecto.
+    Borra el usuario de la cache de autenticación. Se borra ya y otra vez al confirmar,
+    por si una petición concurrente lo volvió a cachear con los datos anteriores.
     """
-    # Verificar si existe la imagen de perfil y no es la imagen por defecto
-    if instance.profile_photo and not instance.profile_photo.name.endswith('adminDefault.jpg'):
-        delete_file_if_exists(instance.profile_photo)
+    invalidate_auth_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_auth_user(instance.pk))
 
-@receiver(post_delete, sender=RentPaymentHistory)
-def delete_rent_receipt(sender, instance, **kwargs):
-    delete_file_if_exists(instance.receipt_image)
+@receiver(post_save, sender=DocumentType)
+@receiver(post_delete, sender=DocumentType)
+@receiver(post_save, sender=Building)
+@receiver(post_delete, sender=Building)
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+def bump_response_cache_version(sender, instance, **kwargs):
+    """
+    Invalida las respuestas cacheadas que dependen del modelo. Se repite al confirmar
+    por si una petición concurrente cacheó los datos anteriores a la transacción.
+    """
+    bump_version(sender)
+    transaction.on_commit(lambda: bump_version(sender))
+
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+def refresh_occupancy_index(sender, instance, **kwargs):
+    """Las búsquedas de disponibilidad recalculan solo la habitación de este contrato"""
+    record_occupancy_change(instance.pk)
 
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def rebuild_occupancy_index(sender, instance, created=True, **kwargs):
+    """Habitaciones nuevas o borradas cambian las filas del índice: se reconstruye completo"""
+    if created:
+        record_occupancy_change(ROOMS_CHANGED)
 
+@receiver(post_save, sender=DocumentType)
+@receiver(post_delete, sender=DocumentType)
+def refresh_document_type_registry(sender, instance, **kwargs):
+    """El registro de este proceso vuelve a comprobar la versión (la sube bump_response_cache_version)"""
+    document_types.invalidate()
+    transaction.on_commit(document_types.invalidate)
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Exists, F, OuterRef, Value, When
+
+from core.authentication import auth_user_cache_key
+from core.models import Contract, CustomUser, RentPaymentHistory, current_billing_period
+
+
+########################################################################################################
+####                                                                                                ####
+####            Situación de pagos de los inquilinos (CustomUser.payment_standing)                  ####
+####                                                                                                ####
+########################################################################################################
+# De mayor a menor gravedad: manda el peor pago abierto hasta el mes actual
+PAYMENT_STANDING_PRIORITY = ["overdue", "rejected", "pending_review"]
+
+SYNC_BATCH_SIZE = 1000
+
+
+def standing_expression(period=None):
+    """Situación calculada a partir de los pagos del inquilino con mes <= `period`"""
+    period = period or current_billing_period()
+    payments = RentPaymentHistory.objects.filter(contract__user=OuterRef("pk"), billing_period__lte=period)
+    return Case(
+        *[
+            When(Exists(payments.filter(status=standing)), then=Value(standing))
+            for standing in PAYMENT_STANDING_PRIORITY
+        ],
+        default=Value("ok"),
+    )
+
+
+def standing_drift(user_ids=None, period=None):
+    """Inquilinos cuyo payment_standing no coincide con sus pagos"""
+    users = CustomUser.objects.filter(role="tenant")
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+    return users.annotate(computed_standing=standing_expression(period)).exclude(
+        payment_standing=F("computed_standing")
+    )
+
+
+def sync_payment_standing(user_ids=None, period=None):
+    """
+    Corrige el payment_standing de todos los inquilinos (o de los indicados) que no coincida
+    con sus pagos: una consulta para encontrar los desvíos y un UPDATE por lote. Dentro de una
+    transacción el cambio se confirma o se deshace junto con los pagos. Devuelve cuántos corrigió.
+    """
+    drifted = list(standing_drift(user_ids, period).values_list("id", flat=True))
+    for start in range(0, len(drifted), SYNC_BATCH_SIZE):
+        CustomUser.objects.filter(id__in=drifted[start:start + SYNC_BATCH_SIZE]).update(
+            payment_standing=standing_expression(period)
+        )
+
+    if drifted:
+        # update() no emite señales: el usuario cacheado por la autenticación quedaría viejo
+        keys = [auth_user_cache_key(user_id) for user_id in drifted]
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+    return len(drifted)
+
+
+def sync_contract_standing(contract_ids):
+    """Sincroniza a los titulares de los contratos indicados"""
+    return sync_payment_standing(
+        user_ids=Contract.objects.filter(id__in=contract_ids).values("user_id")
+    )
@@ -0,0 +1,154 @@
+import hashlib
+import math
+import os
+import posixpath
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.utils.crypto import constant_time_compare
+
+
+########################################################################################################
+####                                                                                                ####
+####            Hash de los archivos mientras se reciben                                            ####
+####                                                                                                ####
+########################################################################################################
+class HashingUploadMixin:
+    """Calcula el SHA-256 de cada archivo a medida que llegan los trozos de la subida"""
+
+    def new_file(self, *args, **kwargs):
+        self._hasher = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self._hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.content_hash = self._hasher.hexdigest()
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
+
+
+########################################################################################################
+####                                                                                                ####
+####            URLs firmadas y con caducidad para los archivos media                               ####
+####                                                                                                ####
+########################################################################################################
+_media_signer = signing.Signer(salt="core.media")
+
+
+def media_signature(name, expires):
+    return _media_signer.signature(f"{name}:{expires}")
+
+
+def signed_media_query(name, now=None):
+    """
+    Query string firmada para servir `name`. La caducidad se redondea a ventanas fijas
+    para que la misma imagen tenga la misma URL durante un tiempo y el navegador la cachee.
+    """
+    now = now or time.time()
+    window = settings.MEDIA_URL_SIGNATURE_WINDOW
+    expires = math.ceil((now + settings.MEDIA_URL_SIGNATURE_TTL) / window) * window
+    return f"e={expires}&s={media_signature(name, expires)}"
+
+
+def verify_media_signature(name, expires, signature):
+    """True si la firma corresponde a `name` y todavía no caducó"""
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time() or not signature:
+        return False
+    return constant_time_compare(media_signature(name, expires), signature)
+
+
+class SignedURLMixin:
+    """Las URLs de los archivos llevan firma y caducidad; las valida ProtectedMediaView"""
+
+    def url(self, name):
+        return f"{super().url(name)}?{signed_media_query(name)}"
+
+
+class ProtectedFileSystemStorage(SignedURLMixin, FileSystemStorage):
+    """Almacenamiento por defecto (variantes, archivos antiguos) con URLs firmadas"""
+
+
+########################################################################################################
+####                                                                                                ####
+####            Almacenamiento direccionado por contenido                                           ####
+####                                                                                                ####
+########################################################################################################
+CONTENT_ADDRESSED_NAME = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+def is_content_addressed(name):
+    """True si el archivo fue guardado por ContentAddressedStorage (y lleva conteo de referencias)"""
+    return bool(name and CONTENT_ADDRESSED_NAME.search(name))
+
+
+def content_hash(content):
+    """SHA-256 del archivo: el calculado durante la subida o, si no existe, leyéndolo por trozos"""
+    digest = getattr(content, "content_hash", None)
+    if digest:
+        return digest
+
+    hasher = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return hasher.hexdigest()
+
+
+class ContentAddressedStorage(SignedURLMixin, FileSystemStorage):
+    """
+    Guarda cada archivo como <carpeta>/<hash[:2]>/<hash>.<ext>. Si el mismo contenido
+    ya existe no se vuelve a escribir: las subidas repetidas no cuestan disco ni E/S.
+    Las referencias de cada archivo se cuentan en MediaBlob (ver core/signals.py).
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre final lo decide el hash en _save; no hace falta buscar uno libre
+        return name
+
+    def _save(self, name, content):
+        folder = posixpath.dirname(name)
+        ext = posixpath.splitext(name)[1].lower()
+        digest = content_hash(content)
+        final_name = posixpath.join(folder, digest[:2], f"{digest}{ext}")
+
+        if self.exists(final_name):
+            return final_name
+
+        # Se escribe (o se mueve, si la subida ya está en un archivo temporal) con un nombre
+        # único y se renombra de forma atómica: dos subidas simultáneas del mismo contenido
+        # terminan en el mismo archivo sin pisarse a medias.
+        temporary_name = posixpath.join(folder, digest[:2], f".{uuid.uuid4().hex}.tmp")
+        temporary_name = super()._save(temporary_name, content)
+        os.replace(self.path(temporary_name), self.path(final_name))
+        return final_name
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_upload_storage():
+    return content_addressed_storage
@@ -0,0 +1,873 @@
+"""
+Presupuesto de consultas SQL y de tiempo de respuesta de cada endpoint de renthub/urls.py.
+
+Cada ruta se llama como superadmin, admin, inquilino y anónimo sobre un conjunto de datos con
+varias decenas de filas por tabla. Si un cambio vuelve a consultar por fila (N+1), la petición
+supera su presupuesto o el detector de core/instrumentation.py la hace fallar.
+
+    python manage.py test core                           # SQLite en memoria
+    TEST_DATABASE=postgres python manage.py test core    # base POSTGRES_* desechable
+
+RESPONSE_TIME_BUDGET_MS ajusta el tiempo máximo por petición (1000 ms por defecto).
+"""
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from unittest import mock, skipIf
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.fields.files import FieldFile
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.dashboard import refresh_buckets
+from core.document_types import document_types
+from core.images import generate_variants, variant_name, variant_urls
+from core.instrumentation import (QueryInstrumentationMiddleware, RepeatedQueryError,
+                                  allow_repeated_queries, normalize_sql)
+from core.laundry import (LAUNDRY_TIME_SLOTS, SlotOccupancy, SlotUnavailable, claim_slot,
+                          propose_nearest_slots)
+from core.management.commands.collect_orphan_media import Command as OrphanMediaCommand, file_fields
+from core.models import (Building, Contract, CustomUser, DashboardBucket, DocumentType, EmailOutbox,
+                         LaundryBooking, LaundrySlotClaim, MediaBlob, ReferencePerson, RentPaymentHistory,
+                         Room, UserChangeRequest, current_billing_period)
+from core.occupancy import sync_room_occupancy
+from core.outbox import deliver_pending, enqueue_email
+from core.signals import retain_blob
+from core.standing import sync_payment_standing
+from core.storage import content_addressed_storage, signed_media_query
+
+ROLES = ("superadmin", "admin", "tenant", "anonymous")
+RESPONSE_TIME_BUDGET = float(os.environ.get("RESPONSE_TIME_BUDGET_MS", 1000)) / 1000
+
+BUILDINGS = 3
+ROOMS_PER_BUILDING = 10
+TENANTS = 24
+CONTRACT_MONTHS_BEFORE = 18
+CONTRACT_MONTHS_AFTER = 6
+
+
+########################################################################################################
+####                                                                                                ####
+####            Datos de prueba                                                                     ####
+####                                                                                                ####
+########################################################################################################
+def image_upload(name="voucher.png"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "white").save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+def seed(data):
+    """Edificios, inquilinos con contrato y calendario de pagos, reservas y solicitudes"""
+    today = date.today()
+    period = current_billing_period()
+
+    data.document_types = [DocumentType.objects.create(name=name) for name in ("CC", "CE", "PAS")]
+    data.superadmin = CustomUser.objects.create_superuser(
+        email="super@renthub.test", password="clave", first_name="Super", last_name="Admin",
+        phone_number="3000000000", document_number="S-1", is_active=True, is_verified=True,
+    )
+    data.admin = CustomUser.objects.create_user(
+        email="admin@renthub.test", password="clave", first_name="Ana", last_name="Admin",
+        phone_number="3000000001", document_number="A-1", role="admin", is_active=True, is_verified=True,
+    )
+
+    data.reference = ReferencePerson.objects.create(
+        first_name="Rosa", last_name="Referencia", document_type=data.document_types[0],
+        document_number="R-1", phone_number="3100000000",
+    )
+
+    data.buildings = [
+        Building.objects.create(name=f"Edificio {number}", address=f"Calle {number}")
+        for number in range(BUILDINGS)
+    ]
+    rooms = Room.objects.bulk_create([
+        Room(building=building, room_number=number + 1)
+        for building in data.buildings for number in range(ROOMS_PER_BUILDING)
+    ])
+
+    data.tenants = []
+    contracts = []
+    for number in range(TENANTS):
+        tenant = CustomUser.objects.create_user(
+            email=f"inquilino{number}@renthub.test", password="clave",
+            first_name="Inquilino", last_name=str(number), phone_number=f"32000000{number:02d}",
+            document_type=data.document_types[number % 3], document_number=f"T-{number}",
+            reference_1=data.reference, is_active=True, is_verified=True,
+        )
+        data.tenants.append(tenant)
+        contracts.append(Contract(
+            user=tenant, room=rooms[number],
+            start_date=period - relativedelta(months=CONTRACT_MONTHS_BEFORE),
+            end_date=period + relativedelta(months=CONTRACT_MONTHS_AFTER),
+            rent_amount="800.00", deposit_amount="800.00",
+        ))
+    Contract.objects.bulk_create(contracts)
+
+    # Calendario de pagos: los meses pasados aprobados salvo los últimos, con estados variados
+    payments = []
+    for number, contract in enumerate(contracts):
+        for payment in contract.build_rent_schedule(today=today):
+            months_ago = (period.year - payment.billing_period.year) * 12 + period.month - payment.billing_period.month
+            if months_ago > 2:
+                payment.status = "approved"
+                payment.payment_date = payment.billing_period + timedelta(days=3)
+            elif months_ago >= 0:
+                payment.status = ("overdue", "pending_review", "rejected", "approved")[(number + months_ago) % 4]
+                payment.receipt_image = f"payments/rent/recibo-{number}-{months_ago}.png"
+            payments.append(payment)
+    RentPaymentHistory.objects.bulk_create(payments)
+
+    # Reservas de lavandería: una esperando al administrador y otra propuesta al inquilino
+    first_day = today + timedelta(days=1)
+    for number, tenant in enumerate(data.tenants):
+        day = first_day + timedelta(days=number % 5)
+        pending = LaundryBooking.objects.create(
+            user=tenant, date=day, time_slot=LAUNDRY_TIME_SLOTS[number % len(LAUNDRY_TIME_SLOTS)],
+            status="pending", last_action_by="user", voucher_image=f"laundry/vouchers/v-{number}.png",
+        )
+        claim_slot(pending, pending.date, pending.time_slot)
+        proposed_slot = LAUNDRY_TIME_SLOTS[(number + 7) % len(LAUNDRY_TIME_SLOTS)]
+        proposed = LaundryBooking.objects.create(
+            user=tenant, date=day, time_slot=proposed_slot, status="proposed", last_action_by="admin",
+            proposed_date=day, proposed_time_slot=proposed_slot, admin=data.admin,
+            voucher_image=f"laundry/vouchers/p-{number}.png",
+        )
+        claim_slot(proposed, day, proposed_slot)
+        if number == 0:
+            data.pending_booking, data.proposed_booking = pending, proposed
+
+    data.change_requests = [
+        UserChangeRequest.objects.create(
+            user=tenant, changes={"first_name": "Nuevo", "document_type": str(data.document_types[1].id)}
+        )
+        for tenant in data.tenants[:8]
+    ]
+
+    data.tenant = data.tenants[0]
+    data.contract = contracts[0]
+    data.free_room = rooms[TENANTS]
+    data.overdue_payment = RentPaymentHistory.objects.filter(
+        contract=data.contract, status="overdue"
+    ).order_by("billing_period").first()
+    data.receipt_payment = RentPaymentHistory.objects.filter(
+        contract=data.contract, receipt_image__isnull=False
+    ).exclude(receipt_image="").first()
+    data.unverified = CustomUser.objects.create_user(
+        email="nuevo@renthub.test", password="clave", first_name="Nuevo", last_name="Inquilino",
+        phone_number="3300000000", document_number="N-1",
+        email_verification_token="Nuevo-Inquilino-0f0e0d0c-0b0a-4908-8706-050403020100",
+    )
+
+    # Lo que en producción hacen los on_commit y los comandos nocturnos
+    sync_room_occupancy()
+    sync_payment_standing()
+    refresh_buckets()
+
+
+########################################################################################################
+####                                                                                                ####
+####            Presupuestos por endpoint                                                           ####
+####                                                                                                ####
+########################################################################################################
+# budgets: {rol: (estado esperado, máximo de consultas)}. Las lecturas (GET) se piden con todos
+# los roles; las escrituras solo con los roles indicados. Cada petición se deshace al terminar.
+Endpoint = namedtuple("Endpoint", "name method kwargs query data budgets")
+
+
+def endpoint(name, budgets, method="get", kwargs=None, query="", data=None):
+    return Endpoint(name, method, kwargs or (lambda s: {}), query, data, budgets)
+
+
+UNAUTHORIZED = (401, 0)
+
+ENDPOINTS = [
+    # ------------------------------------------------------------------ usuarios
+    endpoint("customuser-list", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("customuser-list", {"superadmin": (201, 11), "tenant": (403, 1)}, method="post",
+             data=lambda s: {
+                 "email": "creado@renthub.test", "password": "clave-segura", "first_name": "Creado",
+                 "last_name": "Nuevo", "phone_number": "3400000000", "document_number": "C-1",
+                 "document_type_id": str(s.document_types[0].id), "role": "tenant",
+             }),
+    endpoint("customuser-detail", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.tenant.pk}),
+    endpoint("customuser-detail", {"admin": (200, 6)}, method="patch",
+             kwargs=lambda s: {"pk": s.tenant.pk}, data=lambda s: {"last_name": "Editado"}),
+    endpoint("customuser-me", {
+        "superadmin": (200, 1), "admin": (200, 1), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("customuser-blocked", {
+        "superadmin": (200, 2), "admin": (200, 2), "tenant": (403, 1), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("customuser-change-password", {"tenant": (400, 1)}, method="post",
+             data=lambda s: {"old_password": "incorrecta", "new_password": "x", "new_password_repeat": "x"}),
+    endpoint("customuser-resend-activation", {"admin": (200, 5), "tenant": (403, 1)}, method="post",
+             kwargs=lambda s: {"pk": s.unverified.pk}),
+    endpoint("customuser-unblock-user", {"admin": (200, 3)}, method="patch",
+             kwargs=lambda s: {"pk": s.tenant.pk}),
+
+    # ------------------------------------------------------------------ contratos
+    endpoint("contract-list", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("contract-list", {"admin": (201, 14), "tenant": (403, 1)}, method="post",
+             data=lambda s: {
+                 "user": str(s.unverified.id), "room": str(s.free_room.id),
+                 "start_date": date.today().isoformat(),
+                 "end_date": (date.today() + timedelta(days=365)).isoformat(),
+                 "rent_amount": "800.00", "deposit_amount": "800.00",
+             }),
+    endpoint("contract-detail", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.contract.pk}),
+    endpoint("contract-payments", {
+        "superadmin": (200, 4), "admin": (200, 4), "tenant": (200, 4), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.contract.pk}),
+
+    # ------------------------------------------------------------------ pagos
+    endpoint("rent-payments-list", {
+        "superadmin": (403, 1), "admin": (403, 1), "tenant": (200, 2), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("rent-payments-detail", {
+        "superadmin": (403, 1), "admin": (403, 1), "tenant": (200, 2), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.overdue_payment.pk}),
+    endpoint("rent-payments-detail", {"tenant": (200, 15)}, method="patch",
+             kwargs=lambda s: {"pk": s.overdue_payment.pk},
+             data=lambda s: {"receipt_image": image_upload("recibo.png")}),
+    endpoint("rent-payments-approve", {"admin": (200, 5)}, method="post",
+             kwargs=lambda s: {"pk": s.overdue_payment.pk}),
+    endpoint("rent-payments-reject", {"admin": (200, 4)}, method="post",
+             kwargs=lambda s: {"pk": s.overdue_payment.pk}, data=lambda s: {"admin_comment": "Ilegible"}),
+    endpoint("rent-payment-detail", {
+        "superadmin": (403, 1), "admin": (403, 1), "tenant": (200, 2), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.overdue_payment.pk}),
+
+    # ------------------------------------------------------------------ habitaciones y edificios
+    endpoint("room-list", {
+        "superadmin": (200, 2), "admin": (200, 2), "tenant": (403, 1), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("room-available", {
+        "superadmin": (200, 2), "admin": (200, 2), "tenant": (403, 1), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("room-availability", {
+        "superadmin": (200, 4), "admin": (200, 4), "tenant": (403, 1), "anonymous": UNAUTHORIZED,
+    }, query=f"?start={date.today() + timedelta(days=400)}&end={date.today() + timedelta(days=430)}"),
+    endpoint("room-detail", {
+        "superadmin": (200, 2), "admin": (200, 2), "tenant": (403, 1), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.free_room.pk}),
+    endpoint("building-list", {
+        "superadmin": (200, 2), "admin": (403, 1), "tenant": (403, 1), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("building-detail", {
+        "superadmin": (200, 2), "admin": (403, 1), "tenant": (403, 1), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.buildings[0].pk}),
+    endpoint("building-get-rooms", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.buildings[0].pk}),
+    endpoint("building-get-occupied-rooms", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.buildings[0].pk}),
+    endpoint("building-get-available-rooms", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.buildings[0].pk}),
+
+    # ------------------------------------------------------------------ referencias y documentos
+    endpoint("referenceperson-list", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("referenceperson-list", {"admin": (201, 5), "tenant": (403, 1)}, method="post",
+             data=lambda s: {
+                 "first_name": "Pedro", "last_name": "Referencia", "document_number": "R-2",
+                 "document_type_id": str(s.document_types[0].id), "phone_number": "3110000000",
+             }),
+    endpoint("referenceperson-detail", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.reference.pk}),
+    endpoint("documenttype-list", {
+        "superadmin": (200, 2), "admin": (200, 2), "tenant": (200, 2), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("documenttype-detail", {
+        "superadmin": (200, 2), "admin": (200, 2), "tenant": (200, 2), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.document_types[0].pk}),
+
+    # ------------------------------------------------------------------ lavandería
+    endpoint("laundry-bookings-list", {
+        "superadmin": (200, 2), "admin": (200, 2), "tenant": (200, 2), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("laundry-bookings-list", {"tenant": (201, 16)}, method="post",
+             data=lambda s: {
+                 "date": (date.today() + timedelta(days=6)).isoformat(), "time_slot": LAUNDRY_TIME_SLOTS[-1],
+                 "voucher_image": image_upload(),
+             }),
+    endpoint("laundry-bookings-detail", {
+        "superadmin": (200, 2), "admin": (200, 2), "tenant": (200, 2), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.pending_booking.pk}),
+    endpoint("laundry-bookings-suggestions", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (403, 1), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.pending_booking.pk}),
+    endpoint("laundry-bookings-approve", {"admin": (200, 9), "tenant": (403, 1)}, method="post",
+             kwargs=lambda s: {"pk": s.pending_booking.pk}),
+    endpoint("laundry-bookings-reject", {"admin": (200, 7)}, method="post",
+             kwargs=lambda s: {"pk": s.pending_booking.pk}, data=lambda s: {"admin_comment": "Sin pago"}),
+    endpoint("laundry-bookings-propose", {"admin": (200, 9)}, method="post",
+             kwargs=lambda s: {"pk": s.pending_booking.pk},
+             data=lambda s: {
+                 "proposed_date": (date.today() + timedelta(days=6)).isoformat(),
+                 "proposed_time_slot": LAUNDRY_TIME_SLOTS[0],
+             }),
+    endpoint("laundry-bookings-batch-propose", {"admin": (200, 10), "tenant": (403, 1)}, method="post",
+             data=lambda s: {"ids": [str(s.pending_booking.pk)]}),
+    endpoint("laundry-bookings-accept-proposal", {"tenant": (200, 9), "admin": (403, 1)}, method="post",
+             kwargs=lambda s: {"pk": s.proposed_booking.pk}),
+    endpoint("laundry-bookings-counter-proposal", {"tenant": (200, 9)}, method="post",
+             kwargs=lambda s: {"pk": s.proposed_booking.pk},
+             data=lambda s: {
+                 "counter_proposal_date": (date.today() + timedelta(days=6)).isoformat(),
+                 "counter_proposal_time_slot": LAUNDRY_TIME_SLOTS[1],
+             }),
+
+    # ------------------------------------------------------------------ solicitudes de cambio
+    endpoint("user-change-request-list", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("user-change-request-list", {"tenant": (201, 3)}, method="post",
+             data=lambda s: {"changes": {"last_name": "Cambiado"}}),
+    endpoint("user-change-request-detail", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"pk": s.change_requests[0].pk}),
+    endpoint("user-change-request-approve", {"admin": (200, 5), "tenant": (403, 1)}, method="patch",
+             kwargs=lambda s: {"pk": s.change_requests[0].pk}),
+    endpoint("user-change-request-reject", {"admin": (200, 3)}, method="patch",
+             kwargs=lambda s: {"pk": s.change_requests[0].pk}, data=lambda s: {"review_comment": "No procede"}),
+
+    # ------------------------------------------------------------------ autenticación y cuentas
+    endpoint("token_obtain_pair", {"anonymous": (200, 1)}, method="post",
+             data=lambda s: {"email": s.tenant.email, "password": "clave"}),
+    endpoint("token_refresh", {"anonymous": (200, 1)}, method="post",
+             data=lambda s: {"refresh": str(RefreshToken.for_user(s.tenant))}),
+    endpoint("verify-account", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": (200, 2),
+    }, kwargs=lambda s: {"token": s.unverified.email_verification_token}),
+
+    # ------------------------------------------------------------------ dashboards
+    endpoint("user-dashboard", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("admin-dashboard", {
+        "superadmin": (200, 2), "admin": (200, 2), "tenant": (403, 1), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("admin-dashboard-bucket", {
+        "superadmin": (200, 2), "admin": (200, 2), "tenant": (403, 1), "anonymous": UNAUTHORIZED,
+    }, kwargs=lambda s: {"bucket": "pays_overdue"}),
+    endpoint("laundry-dashboard", {
+        "superadmin": (200, 3), "admin": (200, 3), "tenant": (200, 3), "anonymous": UNAUTHORIZED,
+    }),
+    endpoint("laundry-dashboard", {"tenant": (201, 16)}, method="post",
+             data=lambda s: {
+                 "date": (date.today() + timedelta(days=6)).isoformat(), "time_slot": LAUNDRY_TIME_SLOTS[-2],
+                 "voucher_image": image_upload(),
+             }),
+
+    # ------------------------------------------------------------------ archivos
+    endpoint("protected-media", {
+        "superadmin": (200, 1), "admin": (200, 1), "tenant": (200, 1), "anonymous": (200, 0),
+    }, kwargs=lambda s: {"name": s.receipt_payment.receipt_image.name},
+       query=lambda s: "?" + signed_media_query(s.receipt_payment.receipt_image.name)),
+]
+
+# Rutas que no son parte de la API
+UNBUDGETED_ROUTES = {"api-root"}
+
+
+def route_names(patterns, namespace=None):
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace == "admin":
+                continue
+            names |= route_names(pattern.url_patterns, pattern.namespace)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(f"{namespace}:{pattern.name}" if namespace else pattern.name)
+    return names
+
+
+class _Rollback(Exception):
+    pass
+
+
+########################################################################################################
+####                                                                                                ####
+####            Tests                                                                               ####
+####                                                                                                ####
+########################################################################################################
+class QueryBudgetTests(APITestCase):
+    """Consultas y tiempo máximos de cada endpoint y rol, con el cache vacío (peor caso)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(cls)
+
+    def client_for(self, role):
+        client = APIClient()
+        user = {"superadmin": self.superadmin, "admin": self.admin, "tenant": self.tenant}.get(role)
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+        return client
+
+    def call(self, spec, role):
+        """Hace la petición con el cache vacío; devuelve (respuesta, consultas, segundos)"""
+        client = self.client_for(role)
+        url = reverse(spec.name, kwargs=spec.kwargs(self))
+        url += spec.query(self) if callable(spec.query) else spec.query
+        data = spec.data(self) if spec.data else {}
+        request_format = "multipart" if any(hasattr(value, "read") for value in data.values()) else "json"
+
+        cache.clear()
+        document_types.invalidate()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, spec.method)(url, data or None, format=request_format)
+            elapsed = time.perf_counter() - started
+        return response, queries, elapsed
+
+    def check(self, spec, role):
+        """Cada petición parte de los mismos datos (incluso los GET que escriben, como verify-account)"""
+        try:
+            with transaction.atomic():
+                self.check_budget(spec, role)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def check_budget(self, spec, role):
+        expected_status, max_queries = spec.budgets[role]
+        response, queries, elapsed = self.call(spec, role)
+        label = f"{spec.method.upper()} {spec.name} como {role}"
+
+        self.assertEqual(
+            response.status_code, expected_status,
+            f"{label}: estado {response.status_code} en lugar de {expected_status}",
+        )
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f"{label}: {len(queries)} consultas (máximo {max_queries}):\n"
+            + "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+        self.assertLessEqual(
+            elapsed, RESPONSE_TIME_BUDGET,
+            f"{label}: {elapsed * 1000:.0f} ms (máximo {RESPONSE_TIME_BUDGET * 1000:.0f} ms)",
+        )
+
+    def test_every_route_has_a_budget(self):
+        budgeted = {spec.name for spec in ENDPOINTS}
+        missing = route_names(get_resolver().url_patterns) - budgeted - UNBUDGETED_ROUTES
+        self.assertFalse(missing, f"Rutas sin presupuesto en core/tests.py: {sorted(missing)}")
+
+    def test_read_budgets(self):
+        for spec in ENDPOINTS:
+            if spec.method != "get":
+                continue
+            for role in ROLES:
+                with self.subTest(endpoint=spec.name, role=role):
+                    self.assertIn(role, spec.budgets, f"{spec.name} no tiene presupuesto para {role}")
+                    self.check(spec, role)
+
+    def test_write_budgets(self):
+        for spec in ENDPOINTS:
+            if spec.method == "get":
+                continue
+            for role in spec.budgets:
+                with self.subTest(endpoint=spec.name, method=spec.method, role=role):
+                    self.check(spec, role)
+
+
+class NormalizeSqlTests(SimpleTestCase):
+    """Forma de las consultas con la que el detector agrupa las repeticiones"""
+
+    def test_literals_and_in_lists_collapse(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE a = 'x''y' AND b = 42 AND c IN (1, 2, 3)"),
+            "SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)",
+        )
+        self.assertEqual(
+            normalize_sql("SELECT  *\n FROM t WHERE id IN (%s, %s)"),
+            normalize_sql("SELECT * FROM t WHERE id IN (%s)"),
+        )
+
+    def test_different_tables_stay_apart(self):
+        self.assertNotEqual(normalize_sql("SELECT * FROM a WHERE id = 1"), normalize_sql("SELECT * FROM b WHERE id = 1"))
+
+
+@override_settings(QUERY_INSTRUMENTATION=True, QUERY_REPEAT_THRESHOLD=3, QUERY_REPEAT_RAISE=True)
+class QueryInstrumentationTests(TestCase):
+    """El middleware mide cada petición y hace fallar las que repiten consultas"""
+
+    def run_queries(self, times):
+        for _ in range(times):
+            list(DocumentType.objects.filter(name="CC"))
+        return HttpResponse("ok")
+
+    def request(self, view):
+        return QueryInstrumentationMiddleware(view)(RequestFactory().get("/"))
+
+    def test_reports_server_timing(self):
+        response = self.request(lambda request: self.run_queries(2))
+        self.assertIn('desc="2 queries"', response["Server-Timing"])
+
+    def test_repeated_queries_raise(self):
+        with self.assertRaises(RepeatedQueryError):
+            self.request(lambda request: self.run_queries(4))
+
+    @override_settings(QUERY_REPEAT_RAISE=False)
+    def test_repeated_queries_only_log_without_raise(self):
+        with self.assertLogs("core.instrumentation", "WARNING"):
+            response = self.request(lambda request: self.run_queries(4))
+        self.assertEqual(response.status_code, 200)
+
+    def test_allow_repeated_queries_opts_out(self):
+        class BatchView:
+            @allow_repeated_queries
+            def post(view, request):
+                return self.run_queries(4)
+
+        with self.assertLogs("core.instrumentation", "WARNING"):
+            response = self.request(lambda request: BatchView().post(request))
+        self.assertEqual(response.status_code, 200)
+
+
+class LaundryBookingWriteTests(APITestCase):
+    """Escrituras de reservas que no pasan por el presupuesto de consultas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(cls)
+
+    def batch_propose(self, ids):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("laundry-bookings-batch-propose"), {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["proposed"]) + len(response.data["unavailable"]), len(ids))
+        return response, len(queries)
+
+    def test_many_ids(self):
+        ids = [str(booking_id) for booking_id in LaundryBooking.objects.filter(status="pending").values_list("id", flat=True)]
+        self.assertGreater(len(ids), 10)
+        self.client.force_authenticate(self.admin)
+
+        # Las consultas no crecen con el lote: una reserva cuesta lo mismo que todas las demás
+        _, single = self.batch_propose(ids[:1])
+        response, many = self.batch_propose(ids[1:])
+        self.assertEqual(single, many)
+
+        for proposal in response.data["proposed"]:
+            claim = LaundrySlotClaim.objects.get(booking_id=proposal["id"])
+            self.assertEqual((claim.date, claim.time_slot), (proposal["proposed_date"], proposal["proposed_time_slot"]))
+
+    def test_invalid_ids_are_rejected(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(reverse("laundry-bookings-batch-propose"), {"ids": ["no-es-uuid"]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_patch_cannot_move_the_slot(self):
+        booking = self.pending_booking
+        self.client.force_authenticate(self.tenant)
+        response = self.client.patch(
+            reverse("laundry-bookings-detail", kwargs={"pk": booking.pk}),
+            {"date": (date.today() + timedelta(days=9)).isoformat(), "status": "approved", "user_comment": "Gracias"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        booking.refresh_from_db()
+        self.assertEqual((booking.status, booking.user_comment), ("pending", "Gracias"))
+        self.assertEqual(booking.slot_claim.date, booking.date)
+
+
+@override_settings(IMAGE_VARIANTS_ASYNC=False)
+class ImageVariantTests(TestCase):
+    """Las variantes se generan al cambiar el archivo y se leen sin consultar el disco"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(cls)
+
+    def test_urls_do_not_stat_storage(self):
+        name = default_storage.save("payments/rent/variantes.png", image_upload())
+        generate_variants(name)
+        with mock.patch.object(default_storage, "exists", side_effect=AssertionError("stat")):
+            urls = variant_urls(FieldFile(None, RentPaymentHistory._meta.get_field("receipt_image"), name))
+        self.assertEqual(urls["thumb"], default_storage.url(variant_name(name, "thumb")))
+
+    def test_variants_only_when_the_file_changes(self):
+        with mock.patch("core.signals.schedule_variants") as schedule:
+            self.tenant.first_name = "Otro"
+            self.tenant.save()
+            schedule.assert_not_called()
+
+            with self.captureOnCommitCallbacks():
+                self.tenant.profile_photo = image_upload("perfil.png")
+                self.tenant.save()
+            schedule.assert_called_once()
+
+
+class OutboxDeliveryTests(TestCase):
+    """La bandeja de salida reserva las filas antes de enviar y registra el resultado después"""
+
+    def test_sent_and_failed(self):
+        ok = enqueue_email("ok@example.com", "Hola", "Cuerpo")
+        bad = enqueue_email("bad@example.com", "Hola", "Cuerpo")
+        backend = mail.get_connection("django.core.mail.backends.locmem.EmailBackend")
+        original = backend.send_messages
+
+        def send_messages(messages):
+            # Mientras se envía, la fila ya está reservada y fuera de la cola
+            self.assertFalse(EmailOutbox.objects.filter(status="pending", next_attempt_at__lte=timezone.now()).exists())
+            if messages[0].to == ["bad@example.com"]:
+                raise ConnectionError("rechazado")
+            return original(messages)
+
+        with mock.patch.object(backend, "send_messages", side_effect=send_messages), \
+                self.assertLogs("core.outbox", "WARNING"):
+            self.assertEqual(deliver_pending(connection=backend), (1, 1))
+
+        ok.refresh_from_db()
+        bad.refresh_from_db()
+        self.assertEqual((ok.status, ok.attempts), ("sent", 1))
+        self.assertEqual((bad.status, bad.attempts, bad.last_error), ("pending", 1, "rechazado"))
+        self.assertGreater(bad.next_attempt_at, timezone.now())
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class DashboardBucketTests(TestCase):
+    """Cada transacción recuenta una sola vez los buckets que tocaron sus filas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(cls)
+
+    def counts(self):
+        return dict(DashboardBucket.objects.values_list("name", "count"))
+
+    def assertCountsMatchRecount(self):
+        counts = self.counts()
+        refresh_buckets()
+        self.assertEqual(counts, self.counts())
+
+    def test_transitions_recount_touched_buckets_once(self):
+        payment = self.overdue_payment
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            payment.status = "pending_review"
+            payment.save()
+            payment.admin_comment = "Revisado"
+            payment.save()
+            self.pending_booking.last_action_by = "admin"
+            self.pending_booking.save()
+            self.pending_booking.delete()
+
+        # pays_overdue, pays_pending_review, pending_admin y pending_user: un COUNT cada uno
+        self.assertEqual(len([q for q in queries if "COUNT(" in q["sql"].upper()]), 4)
+        self.assertCountsMatchRecount()
+
+    def test_same_row_moved_twice(self):
+        # Dos peticiones con la misma foto de la fila no descuadran el contador
+        first = RentPaymentHistory.objects.get(pk=self.overdue_payment.pk)
+        second = RentPaymentHistory.objects.get(pk=self.overdue_payment.pk)
+        for payment in (first, second):
+            with self.captureOnCommitCallbacks(execute=True):
+                payment.status = "pending_review"
+                payment.save()
+        self.assertCountsMatchRecount()
+
+    def test_rows_outside_buckets_cost_nothing(self):
+        payment = RentPaymentHistory.objects.filter(status="approved").first()
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            payment.admin_comment = "Ok"
+            payment.save()
+        self.assertFalse([q for q in queries if "core_dashboardbucket" in q["sql"]])
+
+    def test_rollback_does_not_change_counts(self):
+        before = self.counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.overdue_payment.status = "rejected"
+                self.overdue_payment.save()
+                transaction.set_rollback(True)
+        self.assertEqual(before, self.counts())
+
+
+class OrphanMediaTests(TestCase):
+    """collect_orphan_media no borra un contenido que se volvió a referenciar tras el escaneo"""
+
+    def setUp(self):
+        self.command = OrphanMediaCommand()
+        self.command.fields = file_fields()
+        self.command.protected = set()
+        self.name = content_addressed_storage.save("payments/rent/huerfano.png", ContentFile(os.urandom(32)))
+
+    def test_orphan_is_removed(self):
+        orphans = self.command.find_orphans([self.name])
+        self.assertEqual(self.command.remove_orphans(orphans, content_addressed_storage.location), [self.name])
+        self.assertFalse(content_addressed_storage.exists(self.name))
+        self.assertFalse(MediaBlob.objects.filter(name=self.name).exists())
+
+    def test_retained_between_scan_and_delete(self):
+        orphans = self.command.find_orphans([self.name])
+        self.assertEqual(orphans, [self.name])
+
+        # Una subida del mismo contenido llega entre el escaneo y el borrado
+        retain_blob(self.name)
+
+        self.assertEqual(self.command.remove_orphans(orphans, content_addressed_storage.location), [])
+        self.assertTrue(content_addressed_storage.exists(self.name))
+        self.assertEqual(MediaBlob.objects.get(name=self.name).ref_count, 1)
+
+
+class MigrationTests(TestCase):
+    """Las migraciones versionadas cubren todos los cambios de los modelos"""
+
+    def test_no_missing_migrations(self):
+        out = io.StringIO()
+        try:
+            call_command("makemigrations", "core", "--check", "--dry-run", stdout=out)
+        except SystemExit:
+            self.fail(f"Faltan migraciones:\n{out.getvalue()}")
+
+
+@override_settings(LAUNDRY_SLOT_CAPACITY=1)
+class LaundrySlotClaimTests(TransactionTestCase):
+    """Capacidad de las franjas: claim_slot y las acciones que lo usan responden 409 al llenarse"""
+    client_class = APIClient
+
+    def setUp(self):
+        seed(self)
+        self.day = date.today() + timedelta(days=20)
+        self.slot = LAUNDRY_TIME_SLOTS[3]
+
+    def booking(self, user=None, **fields):
+        fields = {"date": self.day, "time_slot": self.slot, "status": "pending", "last_action_by": "user", **fields}
+        return LaundryBooking.objects.create(user=user or self.tenants[1], **fields)
+
+    def fill_slot(self):
+        for _ in range(settings.LAUNDRY_SLOT_CAPACITY):
+            claim_slot(self.booking(status="approved", last_action_by="admin"), self.day, self.slot)
+
+    @override_settings(LAUNDRY_SLOT_CAPACITY=2)
+    def test_full_slot_is_unavailable(self):
+        self.fill_slot()
+        self.assertEqual(LaundrySlotClaim.objects.filter(date=self.day, time_slot=self.slot).count(), 2)
+        with self.assertRaises(SlotUnavailable):
+            claim_slot(self.booking(), self.day, self.slot)
+
+    def test_create_conflict(self):
+        self.fill_slot()
+        self.client.force_authenticate(self.tenant)
+        response = self.client.post(
+            reverse("laundry-bookings-list"),
+            {"date": self.day.isoformat(), "time_slot": self.slot, "voucher_image": image_upload()},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(LaundryBooking.objects.filter(user=self.tenant, date=self.day).exists())
+
+    def test_actions_conflict(self):
+        self.fill_slot()
+        other_day = self.day + timedelta(days=1)
+        cases = [
+            (self.admin, "laundry-bookings-approve", self.booking(user=self.tenant), {}),
+            (self.tenant, "laundry-bookings-accept-proposal",
+             self.booking(user=self.tenant, date=other_day, status="proposed", last_action_by="admin",
+                          proposed_date=self.day, proposed_time_slot=self.slot), {}),
+            (self.tenant, "laundry-bookings-counter-proposal",
+             self.booking(user=self.tenant, date=other_day, status="proposed", last_action_by="admin"),
+             {"counter_proposal_date": self.day.isoformat(), "counter_proposal_time_slot": self.slot}),
+        ]
+        for user, name, booking, data in cases:
+            with self.subTest(name):
+                self.client.force_authenticate(user)
+                response = self.client.post(reverse(name, kwargs={"pk": booking.pk}), data, format="json")
+                self.assertEqual(response.status_code, 409)
+                status_before = booking.status
+                booking.refresh_from_db()
+                self.assertEqual(booking.status, status_before)
+                self.assertFalse(LaundrySlotClaim.objects.filter(booking=booking, date=self.day).exists())
+
+    def test_moving_a_claim_frees_the_old_machine(self):
+        booking = self.booking()
+        claim_slot(booking, self.day, self.slot)
+        claim_slot(booking, self.day, LAUNDRY_TIME_SLOTS[4])
+        self.assertEqual(LaundrySlotClaim.objects.filter(booking=booking).count(), 1)
+        self.assertEqual(claim_slot(self.booking(), self.day, self.slot), 1)
+
+    @override_settings(LAUNDRY_SLOT_CAPACITY=2)
+    def test_integrity_error_moves_to_next_machine(self):
+        claim_slot(self.booking(), self.day, self.slot)
+        # La lectura previa llega tarde (otra reserva tomó la lavadora 1): la restricción la rechaza
+        with mock.patch("core.laundry.set", return_value=set(), create=True):
+            self.assertEqual(claim_slot(self.booking(), self.day, self.slot), 2)
+            with self.assertRaises(SlotUnavailable):
+                claim_slot(self.booking(), self.day, self.slot)
+
+    def test_batch_propose_retries_a_lost_machine(self):
+        booking = self.booking()
+        rival = self.booking(user=self.tenants[2], date=self.day + timedelta(days=1))
+
+        def stale_occupancy(*args, **kwargs):
+            # Otra petición toma la franja pedida justo después de leer la ocupación
+            occupancy = SlotOccupancy(*args, **kwargs)
+            if not LaundrySlotClaim.objects.filter(booking=rival).exists():
+                claim_slot(rival, self.day, self.slot)
+            return occupancy
+
+        with mock.patch("core.laundry.SlotOccupancy", side_effect=stale_occupancy) as load:
+            proposed, unavailable = propose_nearest_slots([booking], self.admin)
+        self.assertEqual((len(proposed), unavailable, load.call_count), (1, [], 2))
+        claim = LaundrySlotClaim.objects.get(booking=booking)
+        self.assertEqual((claim.date, claim.time_slot), (booking.proposed_date, booking.proposed_time_slot))
+        self.assertNotEqual((claim.date, claim.time_slot), (self.day, self.slot))
+
+    @skipIf(connection.vendor == "sqlite", "SQLite serializa las escrituras: no hay carrera que probar")
+    @override_settings(LAUNDRY_SLOT_CAPACITY=2)
+    def test_simultaneous_claims(self):
+        bookings = [self.booking() for _ in range(8)]
+        barrier = threading.Barrier(len(bookings))
+        results = []
+
+        def claim(booking):
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    results.append(claim_slot(booking, self.day, self.slot))
+            except SlotUnavailable:
+                results.append(None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim, args=(booking,)) for booking in bookings]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(machine for machine in results if machine), [1, 2])
+        self.assertEqual(results.count(None), len(bookings) - 2)
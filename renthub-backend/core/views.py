@@ -1,13 +1,13 @@
 import re
-from uuid import uuid4
+from uuid import UUID, uuid4
 from datetime import date, timedelta, datetime
 
 from django_ratelimit.decorators import ratelimit
 from django.utils.decorators import method_decorator
 from django.contrib.auth import authenticate
 from django.core.cache import cache
-
-from django.core.mail import EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch
 
 from django.conf import settings
 
@@ -17,17 +17,33 @@ from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.response import Response
 from rest_framework.generics import RetrieveUpdateAPIView
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotAuthenticated, NotFound
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from core.permissions import IsSuperAdmin, IsAdmin, IsTenant
+from core.cache import increment
+from core.laundry import (
+    claim_slot, get_availability_grid, propose_nearest_slots, release_slot, suggest_slots)
+from core.occupancy_index import available_rooms
+from core.pagination import KeysetPagination
+from core.response_cache import cached_response
+from core.outbox import queue_activation_email
+from core.media import clean_media_name, media_response, user_can_access_media
+from core.storage import verify_media_signature
+from core.dashboard import (
+    RENT_BUCKETS, LAUNDRY_BUCKETS, LAUNDRY_OPEN_STATUSES, RENT_ORDERING, LAUNDRY_ORDERING,
+    bucket_queryset, get_snapshot, get_user_dashboard, present_bucket, present_item)
 from core.models import (
     CustomUser, Contract, RentPaymentHistory, Room, Building,
-    ReferencePerson,DocumentType,LaundryBooking,UserChangeRequest)
+    ReferencePerson,DocumentType,LaundryBooking,UserChangeRequest,
+    billing_period_from_month, current_billing_period)
 from core.serializers import (
     CustomUserSerializer, ContractSerializer, RentPaymentSerializer,
     RoomSerializer, BuildingSerializer, ReferencePersonSerializer,
-    DocumentTypeSerializer, LaundryBookingSerializer, UserChangeRequestSerializer)
+    DocumentTypeSerializer, LaundryBookingSerializer, UserChangeRequestSerializer,
+    BatchProposeSerializer)
 
 
 ########################################################################################################
@@ -70,55 +86,6 @@ class JWTLoginView(APIView):
             "user_id": user.id,  # Opcional: info adicional del usuario
         })
 
-########################################################################################################
-####                                                                                                ####
-####            VISTA DE USUARIOS                                                                   ####
-####                                                                                                ####
-########################################################################################################
-def send_email_activate(user):
-    url = f"{settings.DOMINIO}/verify-account/{user.email_verification_token}"
-    subject = "Bienvenido a Renthub!"
-    from_email = settings.DEFAULT_FROM_EMAIL
-    to_email = [user.email]
-
-    # Contenido en texto plano
-    text_content = (
-        f"Hola {user.first_name},\n\n"
-        f"Gracias por registrarte en Renthub.\n"
-        f"Activa tu cuenta haciendo clic en el siguiente enlace:\n\n{url}\n\n"
-        "Si no te registraste, ignora este mensaje."
-    )
-
-    # Contenido HTML
-    html_content = f"""
-    <html>
-      <body style="font-family: Arial, sans-serif; background-color: #f9f9f9; padding: 20px;">
-        <div style="max-width: 600px; margin: auto; background-color: #ffffff; border-radius: 10px; padding: 30px; box-shadow: 0 0 10px rgba(0,0,0,0.1);">
-          <h2 style="color: #333333;">¡Bienvenido a <span style="color: #4CAF50;">Renthub</span>!</h2>
-          <p>Hola {user.first_name},</p>
-          <p>Gracias por registrarte. Estamos encantados de tenerte con nosotros.</p>
-          <p>Para comenzar, por favor activa tu cuenta haciendo clic en el siguiente botón:</p>
-          <p style="text-align: center; margin: 30px 0;">
-            <a href="{url}" style="background-color: #4CAF50; color: white; padding: 12px 20px; text-decoration: none; border-radius: 5px;">Activar mi cuenta</a>
-          </p>
-          <p>Si no solicitaste esta cuenta, puedes ignorar este mensaje.</p>
-          <p>— El equipo de Renthub</p>
-        </div>
-      </body>
-    </html>
-    """
-
-    try:
-        msg = EmailMultiAlternatives(subject, text_content, from_email, to_email)
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
-        return {"success": True, "message": "Correo enviado correctamente"}
-    
-    except Exception as e:
-        return {"success": False, "error": str(e)}
-
-
-
 ########################################################################################################
 ####                                                                                                ####
 ####            VISTA DE USUARIOS                                                                   ####
@@ -127,6 +94,7 @@ def send_email_activate(user):
 class CustomUserViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
+    pagination_ordering = ("-date_joined", "-id")
     permission_classes = [IsAuthenticated]
 
 
@@ -145,25 +113,23 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        instance = serializer.save()
 
-        # Si el rol es 'tenant', se genera el token y se envía el correo de activación
-        if instance.role == "tenant":
-            instance.email_verification_token = f'{instance.first_name}-{instance.last_name}-{uuid4()}'
-            instance.save(update_fields=["email_verification_token"])
-            try:
-                send_email_activate(instance)
-            except Exception as e:
-                return Response(
-                    {"detail": str(e), "code": "gmail_token_error"},
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE
-                )
+        with transaction.atomic():
+            instance = serializer.save()
+
+            # Si el rol es 'tenant', se genera el token y se encola el correo de activación
+            # en la misma transacción; lo envía en segundo plano `send_outbox_emails`
+            if instance.role == "tenant":
+                instance.email_verification_token = f'{instance.first_name}-{instance.last_name}-{uuid4()}'
+                instance.save(update_fields=["email_verification_token"])
+                queue_activation_email(instance)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def get_queryset(self):
         user = self.request.user
-        queryset = CustomUser.objects.filter()
+        # Los tipos de documento salen del registro en memoria (core/document_types.py)
+        queryset = CustomUser.objects.select_related("reference_1", "reference_2")
 
         # 🔐 RESTRICCIÓN POR ROL
         if user.is_superadmin():
@@ -175,6 +141,11 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         else:
             queryset = queryset.none()
 
+        # Filtro opcional por situación de pagos, p. ej. ?payment_standing=overdue (morosos)
+        payment_standing = self.request.query_params.get("payment_standing")
+        if payment_standing:
+            queryset = queryset.filter(role="tenant", payment_standing=payment_standing)
+
         return queryset
 
     def update(self, request, *args, **kwargs):
@@ -215,28 +186,10 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         if request.method == "GET":
             serializer = self.get_serializer(user)
 
-            # Incluye `status_user` si es tenant
-            status_user = None
-            if user.is_tenant():
-                today = datetime.today()
-                current_year_month = f"{today.year}-{today.month:02d}"
-                contracts = user.contracts.all()
-                payments = RentPaymentHistory.objects.filter(
-                    contract__in=contracts,
-                    month_paid__lte=current_year_month
-                )
-                if payments.filter(status="overdue").exists():
-                    status_user = "overdue"
-                elif payments.filter(status="rejected").exists():
-                    status_user = "rejected"
-                elif payments.filter(status="pending_review").exists():
-                    status_user = "pending_review"
-                else:
-                    status_user = "ok"
-
+            # `status_user` se mantiene en CustomUser.payment_standing (core/standing.py)
             response_data = serializer.data
             if user.is_tenant():
-                response_data["status_user"] = status_user
+                response_data["status_user"] = user.payment_standing
 
             return Response(response_data)
 
@@ -308,17 +261,11 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         if target.is_verified:
             return Response({"detail": "Este usuario ya ha verificado su cuenta."}, status=400)
 
-        if not target.email_verification_token:
-            target.email_verification_token = f'{target.first_name}-{target.last_name}-{uuid4()}'
-            target.save(update_fields=["email_verification_token"])
-
-        try:
-            send_email_activate(target)
-        except Exception as e:
-            return Response(
-                {"detail": str(e), "code": "gmail_token_error"},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
+        with transaction.atomic():
+            if not target.email_verification_token:
+                target.email_verification_token = f'{target.first_name}-{target.last_name}-{uuid4()}'
+                target.save(update_fields=["email_verification_token"])
+            queue_activation_email(target)
 
         return Response({"detail": f"Correo de activación reenviado a {target.email}"}, status=200)
 
@@ -416,6 +363,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
 class ContractViewSet(viewsets.ModelViewSet):
     queryset = Contract.objects.all()
     serializer_class = ContractSerializer
+    pagination_ordering = ("-created_at", "-id")
 
     def get_permissions(self):
         """Permite a Admins gestionar contratos, pero los Tenants solo pueden ver los suyos"""
@@ -442,23 +390,35 @@ class ContractViewSet(viewsets.ModelViewSet):
             elif user.is_admin():
                 contracts = contracts.filter(user__role="tenant")
 
-        # Lógica adicional: marcar contratos con pagos vencidos
-        today = datetime.today()
-        current_year_month = f"{today.year}-{today.month:02d}"
-
-        for contract in contracts:
-            contract.has_overdue = contract.rent_payments.filter(
-                status__in=["overdue", "pending_review", "rejected"],
-                month_paid__lte=current_year_month
-            ).exists()
+        # Lógica adicional: marcar contratos con pagos vencidos y precargar el próximo pago
+        # en un número fijo de consultas para toda la página
+        outstanding = RentPaymentHistory.objects.filter(
+            status__in=RentPaymentHistory.OUTSTANDING_STATUSES
+        )
 
-        return contracts
+        return (
+            contracts
+            .select_related("user", "room__building")
+            .annotate(has_overdue=Exists(
+                outstanding.filter(contract=OuterRef("pk"), billing_period__lte=current_billing_period())
+            ))
+            .prefetch_related(Prefetch(
+                "rent_payments",
+                queryset=outstanding.order_by("billing_period"),
+                to_attr="outstanding_payments"
+            ))
+        )
 
     @action(detail=True, methods=["get"], permission_classes=[IsAuthenticated])
     def payments(self, request, pk=None):
         contract = self.get_object()
 
-        rent_payments = RentPaymentHistory.objects.filter(contract=contract).order_by("-month_paid")
+        rent_payments = (
+            RentPaymentHistory.objects
+            .filter(contract=contract)
+            .select_related("contract__room__building")
+            .order_by("-billing_period")
+        )
         rent_data = RentPaymentSerializer(rent_payments, many=True, context={"request": request}).data
 
 
@@ -475,19 +435,25 @@ class ContractViewSet(viewsets.ModelViewSet):
 class RentPaymentViewSet(viewsets.ModelViewSet):
     queryset = RentPaymentHistory.objects.all()
     serializer_class = RentPaymentSerializer
+    pagination_ordering = ("-billing_period", "-id")
     permission_classes = [IsTenant]
 
     def get_queryset(self):
         user = self.request.user
+        # get_contract del serializador recorre contrato → habitación → edificio
+        payments = RentPaymentHistory.objects.select_related("contract__room__building")
         if user.is_superadmin() or user.is_admin():
-            return RentPaymentHistory.objects.all()
-        return RentPaymentHistory.objects.filter(contract__user=user)
+            return payments
+        return payments.filter(contract__user=user)
 
     def create(self, request, *args, **kwargs):
         """Valida que no se salte meses impagos"""
         user = request.user
         contract_id = request.data.get("contract")
-        month_paid = request.data.get("month_paid")
+        billing_period = billing_period_from_month(request.data.get("month_paid"))
+
+        if billing_period is None:
+            return Response({"error": "Mes inválido. Usa YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             contract = Contract.objects.get(id=contract_id, user=user)
@@ -495,7 +461,7 @@ class RentPaymentViewSet(viewsets.ModelViewSet):
             return Response({"error": "Contrato no encontrado"}, status=status.HTTP_404_NOT_FOUND)
 
         unpaid_exists = contract.rent_payments.filter(
-            month_paid__lt=month_paid,
+            billing_period__lt=billing_period,
             status__in=["overdue", "pending_review"]
         ).exists()
 
@@ -544,13 +510,15 @@ class RentPaymentViewSet(viewsets.ModelViewSet):
 class UserChangeRequestViewSet(viewsets.ModelViewSet):
     queryset = UserChangeRequest.objects.all()
     serializer_class = UserChangeRequestSerializer
+    pagination_ordering = ("-created_at", "-id")
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
+        requests = UserChangeRequest.objects.select_related("user")
         if user.is_admin() or user.is_superadmin():
-            return UserChangeRequest.objects.all()
-        return UserChangeRequest.objects.filter(user=user)
+            return requests
+        return requests.filter(user=user)
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -620,7 +588,8 @@ class UserChangeRequestViewSet(viewsets.ModelViewSet):
 ####                                                                                                ####
 ########################################################################################################
 class RoomViewSet(viewsets.ModelViewSet):
-    queryset = Room.objects.all()
+    # building_name del serializador
+    queryset = Room.objects.select_related("building")
     serializer_class = RoomSerializer
     permission_classes = [IsAdmin]
 
@@ -641,13 +610,64 @@ class RoomViewSet(viewsets.ModelViewSet):
 
         # Filtramos solo si `building_id` está presente
         if building_id:
-            available_rooms = Room.objects.filter(is_occupied=False, building__id=building_id)
+            available_rooms = self.queryset.filter(is_occupied=False, building__id=building_id)
         else:
-            available_rooms = Room.objects.filter(is_occupied=False)
+            available_rooms = self.queryset.filter(is_occupied=False)
 
         serializer = self.get_serializer(available_rooms, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=["get"], permission_classes=[IsAdmin])
+    def availability(self, request):
+        """
+        Habitaciones libres todos los días entre `start` y `end` (YYYY-MM-DD, inclusive),
+        opcionalmente de un `building_id`. Se responde desde el índice de ocupación en memoria,
+        paginado: {"next", "results"} con `page_size` (50 por defecto) y `cursor`.
+        """
+        try:
+            start = date.fromisoformat(request.query_params.get("start", ""))
+            end = date.fromisoformat(request.query_params.get("end", ""))
+        except ValueError:
+            return Response({"detail": "Fechas inválidas. Usa start y end con formato YYYY-MM-DD."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if end < start:
+            return Response({"detail": "La fecha end debe ser posterior a start."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        building_id = request.query_params.get("building_id")
+        if building_id:
+            try:
+                building_id = UUID(building_id)
+            except ValueError:
+                return Response({"detail": "building_id inválido."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Paginado por cursor (edificio, número) antes de leer las habitaciones: solo se
+        # cargan las de la página, aunque haya decenas de miles libres
+        paginator = KeysetPagination()
+        after = request.query_params.get(paginator.cursor_query_param)
+        if after:
+            building_key, _, number = after.rpartition(":")
+            try:
+                after = (str(UUID(building_key)), int(number))
+            except ValueError:
+                raise NotFound("Cursor inválido.")
+
+        try:
+            room_ids, last_key = available_rooms(
+                start, end, building_id or None, after or None, paginator.get_page_size(request)
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rooms = Room.objects.filter(id__in=room_ids).select_related("building").in_bulk()
+        serializer = self.get_serializer([rooms[room_id] for room_id in room_ids if room_id in rooms], many=True)
+        next_link = None
+        if last_key:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), paginator.cursor_query_param, f"{last_key[0]}:{last_key[1]}"
+            )
+        return Response({"next": next_link, "results": serializer.data})
+
 ########################################################################################################
 ####                                                                                                ####
 ####            VISTA DE USUARIOS                                                                   ####
@@ -658,27 +678,38 @@ class BuildingViewSet(viewsets.ModelViewSet):
     serializer_class = BuildingSerializer
     permission_classes = [IsSuperAdmin]
 
+    @cached_response(Building)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response(Building)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=True, methods=["get"], permission_classes=[IsAuthenticated], url_path="rooms")
+    @cached_response(Building, Room, Contract)
     def get_rooms(self, request, pk=None):
         """Devuelve todas las habitaciones de un edificio"""
         building = self.get_object()
-        rooms = Room.objects.filter(building=building)
+        rooms = Room.objects.filter(building=building).select_related("building")
         serializer = RoomSerializer(rooms, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=["get"], permission_classes=[IsAuthenticated], url_path="rooms/occupied")
+    @cached_response(Building, Room, Contract)
     def get_occupied_rooms(self, request, pk=None):
         """Devuelve solo las habitaciones ocupadas de un edificio"""
         building = self.get_object()
-        occupied_rooms = Room.objects.filter(building=building, is_occupied=True)
+        occupied_rooms = Room.objects.filter(building=building, is_occupied=True).select_related("building")
         serializer = RoomSerializer(occupied_rooms, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=["get"], permission_classes=[IsAuthenticated], url_path="rooms/available")
+    @cached_response(Building, Room, Contract)
     def get_available_rooms(self, request, pk=None):
         """Devuelve solo las habitaciones desocupadas de un edificio"""
         building = self.get_object()
-        unoccupied_rooms = Room.objects.filter(building=building, is_occupied=False)
+        unoccupied_rooms = Room.objects.filter(building=building, is_occupied=False).select_related("building")
         serializer = RoomSerializer(unoccupied_rooms, many=True)
         return Response(serializer.data)
 
@@ -690,6 +721,7 @@ class BuildingViewSet(viewsets.ModelViewSet):
 class ReferencePersonViewSet(viewsets.ModelViewSet):
     queryset = ReferencePerson.objects.all()
     serializer_class = ReferencePersonSerializer
+    pagination_ordering = ("id",)
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -717,6 +749,14 @@ class DocumentTypesViewSet(ReadOnlyModelViewSet):
     serializer_class = DocumentTypeSerializer
     permission_classes = [IsAuthenticated]
 
+    @cached_response(DocumentType)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response(DocumentType)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 ########################################################################################################
 ####                                                                                                ####
 ####            VISTA DE USUARIOS                                                                   ####
@@ -725,18 +765,23 @@ class DocumentTypesViewSet(ReadOnlyModelViewSet):
 class LaundryBookingViewSet(viewsets.ModelViewSet):
     queryset = LaundryBooking.objects.all()
     serializer_class = LaundryBookingSerializer
+    pagination_ordering = ("-created_at", "-id")
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
+        bookings = LaundryBooking.objects.select_related("user")
         if user.is_admin() or user.is_superadmin():
-            return LaundryBooking.objects.all()
-        return LaundryBooking.objects.filter(user=user)
+            return bookings
+        return bookings.filter(user=user)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, context={"request": request})
         if serializer.is_valid():
-            serializer.save(user=request.user, status="pending")
+            # Si la franja está completa claim_slot lanza 409 y no queda reserva a medias
+            with transaction.atomic():
+                booking = serializer.save(user=request.user, status="pending")
+                claim_slot(booking, booking.date, booking.time_slot)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -757,7 +802,9 @@ class LaundryBookingViewSet(viewsets.ModelViewSet):
 
         booking.status = "approved"
         booking.last_action_by = "admin"
-        booking.save()
+        with transaction.atomic():
+            claim_slot(booking, booking.date, booking.time_slot)
+            booking.save()
 
         return Response({"message": "Reserva aprobada"}, status=status.HTTP_200_OK)
 
@@ -771,7 +818,9 @@ class LaundryBookingViewSet(viewsets.ModelViewSet):
         booking.status = "rejected"
         booking.user_response = "rejected"
         booking.admin_comment = comment
-        booking.save()
+        with transaction.atomic():
+            release_slot(booking)
+            booking.save()
 
         return Response({"message": "Reserva rechazada"}, status=status.HTTP_200_OK)
 
@@ -791,10 +840,52 @@ class LaundryBookingViewSet(viewsets.ModelViewSet):
         booking.proposed_date = proposed_date
         booking.proposed_time_slot = proposed_time_slot
         booking.last_action_by = action_user
-        booking.save()
+        # La franja propuesta queda retenida para el inquilino mientras responde
+        with transaction.atomic():
+            claim_slot(booking, proposed_date, proposed_time_slot)
+            booking.save()
         
         return Response({"message": "Propuesta enviada"}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["get"], permission_classes=[IsAdmin])
+    def suggestions(self, request, pk=None):
+        """Franjas libres más cercanas a la pedida, para usar en `propose`"""
+        booking = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get("limit", 3)), 1), 20)
+        except ValueError:
+            return Response({"error": "limit debe ser un número"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"suggestions": suggest_slots(booking, limit)}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"], permission_classes=[IsAdmin])
+    def batch_propose(self, request):
+        """
+        Propone la franja libre más cercana a cada reserva indicada en `ids`. Sin `ids` se toma
+        la cola de reservas que esperan al administrador y no tienen lavadora asignada.
+        """
+        serializer = BatchProposeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        bookings = LaundryBooking.objects.order_by("created_at")
+        ids = serializer.validated_data.get("ids")
+        if ids:
+            bookings = bookings.filter(id__in=ids, status__in=LAUNDRY_OPEN_STATUSES)
+        else:
+            bookings = bookings.filter(
+                status__in=LAUNDRY_OPEN_STATUSES,
+                last_action_by=LAUNDRY_BUCKETS["pending_admin"],
+                slot_claim__isnull=True,
+            )
+
+        proposed, unavailable = propose_nearest_slots(bookings, request.user)
+        return Response({
+            "proposed": [
+                {"id": b.id, "proposed_date": b.proposed_date, "proposed_time_slot": b.proposed_time_slot}
+                for b in proposed
+            ],
+            "unavailable": [b.id for b in unavailable],
+        }, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=["post"], permission_classes=[IsTenant])
     def accept_proposal(self, request, pk=None):
         booking = self.get_object()
@@ -810,7 +901,9 @@ class LaundryBookingViewSet(viewsets.ModelViewSet):
         booking.proposed_time_slot = None
 
         booking.status = "approved"
-        booking.save()
+        with transaction.atomic():
+            claim_slot(booking, booking.date, booking.time_slot)
+            booking.save()
         return Response({"message": "Propuesta aceptada y reserva aprobada"}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=["post"], permission_classes=[IsTenant])
@@ -829,7 +922,9 @@ class LaundryBookingViewSet(viewsets.ModelViewSet):
         booking.counter_proposal_date = counter_date
         booking.counter_proposal_time_slot = counter_time_slot
         booking.last_action_by = action_user
-        booking.save()
+        with transaction.atomic():
+            claim_slot(booking, counter_date, counter_time_slot)
+            booking.save()
         return Response({"message": "Contrapropuesta enviada"}, status=status.HTTP_200_OK)
 
 
@@ -853,34 +948,14 @@ class UserDashboardView(APIView):
             "profile_photo": request.build_absolute_uri(user.profile_photo.url) if user.profile_photo else None,
         }
 
-        # Datos de pagos
-        payments = {
-            "pending": list(RentPaymentHistory.objects.filter(
-                contract__user=user, status="pending_review"
-            ).values("id", "month_paid", "payment_date")),
-            "next_due": RentPaymentHistory.objects.filter(
-                contract__user=user
-            ).order_by("payment_date").values("month_paid").first(),
-            "history": list(RentPaymentHistory.objects.filter(
-                contract__user=user
-            ).values_list("month_paid", flat=True))
-        }
-
-        # Datos de lavandería
-        laundry = {
-            "bookings": list(LaundryBooking.objects.filter(user=user).values(
-                "id", "date", "time_slot", "status",
-                "proposed_date", "proposed_time_slot",
-                "counter_proposal_date", "counter_proposal_time_slot",
-                "admin_comment"
-            ))
-        }
+        # Pagos y lavandería: dos consultas acotadas, cacheadas por inquilino (core/dashboard.py)
+        dashboard = get_user_dashboard(user)
 
         return Response(
             {
-                "user": user_data, 
-                "payments": payments,
-                "laundry": laundry
+                "user": user_data,
+                "payments": dashboard["payments"],
+                "laundry": dashboard["laundry"]
             },
             status=status.HTTP_200_OK,
         )
@@ -893,74 +968,36 @@ class UserDashboardView(APIView):
 class AdminDashboardView(APIView):
     permission_classes = [IsAuthenticated, IsAdmin]
 
-    def get_rent_payments_by_status(self, status):
-        """Retorna pagos de arriendo filtrados por estado"""
-        return [
-            {
-                "id": payment.id,
-                "user": {
-                    "id": payment.contract.user.id,
-                    "name": f"{payment.contract.user.first_name} {payment.contract.user.last_name}"
-                },
-                "contract": {
-                    "id": payment.contract.id,
-                    "room_number": payment.contract.room.room_number,
-                    "building": payment.contract.room.building.name
-                },
-                "month_paid": payment.month_paid,
-                "payment_date": payment.payment_date.strftime("%Y-%m-%d") if payment.payment_date else None,
-                "status": payment.status,
-                "voucher_path": payment.receipt_image.url if payment.receipt_image else None,
-                "admin_comment": payment.admin_comment,
-                "user_comment": payment.user_comment,
-            }
-            for payment in RentPaymentHistory.objects.filter(status=status)
-            .select_related("contract__user", "contract__room__building")
-        ]
-
-    def get_laundry_pending_by(self, last_actor):
-        """Retorna reservas de lavandería donde se espera respuesta del actor contrario"""
-        return [
-            {
-                "id": booking.id,
-                "user": {
-                    "id": booking.user.id,
-                    "name": f"{booking.user.first_name} {booking.user.last_name}"
-                },
-                "date": booking.date.strftime("%Y-%m-%d"),
-                "time_slot": booking.time_slot,
-                "status": booking.status,
-                "voucher_path": booking.voucher_image.url if booking.voucher_image else None,
-                "admin_comment": booking.admin_comment,
-                "user_comment": booking.user_comment,
-                "proposed_date": booking.proposed_date.strftime("%Y-%m-%d") if booking.proposed_date else None,
-                "proposed_time_slot": booking.proposed_time_slot,
-                "counter_proposal_date": booking.counter_proposal_date.strftime("%Y-%m-%d") if booking.counter_proposal_date else None,
-                "counter_proposal_time_slot": booking.counter_proposal_time_slot,
-                "last_action_by": booking.last_action_by,
-                "user_response": booking.user_response,
-                "created_at": booking.created_at.strftime("%Y-%m-%d %H:%M"),
-                "updated_at": booking.updated_at.strftime("%Y-%m-%d %H:%M")
-            }
-            for booking in LaundryBooking.objects.filter(
-                last_action_by=last_actor,
-                status__in=["pending", "proposed", "counter_proposal"]
-            ).select_related("user")
-        ]
-
     def get(self, request):
+        """
+        Lee la proyección precalculada (contador + elementos recientes por bucket)
+        en una sola consulta. El detalle completo de cada bucket se pide paginado
+        en /api/admin-dashboard/<bucket>/.
+        """
+        buckets = get_snapshot()
+
         return Response({
-            "rents_pendings": {
-                "pays_reject": self.get_rent_payments_by_status("rejected"),
-                "pays_overdue": self.get_rent_payments_by_status("overdue"),
-                "pays_pending_review": self.get_rent_payments_by_status("pending_review"),
-            },
-            "washing_pendings": {
-                "pending_user": self.get_laundry_pending_by("admin"),
-                "pending_admin": self.get_laundry_pending_by("user"),
-            }
+            "rents_pendings": {name: present_bucket(buckets[name]) for name in RENT_BUCKETS},
+            "washing_pendings": {name: present_bucket(buckets[name]) for name in LAUNDRY_BUCKETS},
+            "counters": {name: bucket.count for name, bucket in buckets.items()},
         })
 
+class AdminDashboardBucketView(APIView):
+    """Detalle paginado (por cursor) de un bucket del dashboard de administración"""
+    permission_classes = [IsAuthenticated, IsAdmin]
+    pagination_required = True
+
+    def get(self, request, bucket):
+        try:
+            queryset, serialize = bucket_queryset(bucket)
+        except KeyError:
+            return Response({"detail": "Bucket no encontrado."}, status=status.HTTP_404_NOT_FOUND)
+
+        self.pagination_ordering = RENT_ORDERING if bucket in RENT_BUCKETS else LAUNDRY_ORDERING
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response([present_item(bucket, serialize(obj)) for obj in page])
+
 ########################################################################################################
 ####                                                                                                ####
 ####            VISTA DE USUARIOS                                                                   ####
@@ -970,17 +1007,13 @@ class LaundryDashboardView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get_available_days(self):
-        """Lista los días disponibles para reservas"""
-        today = date.today()
-        return [
-            {"date": str(today + timedelta(days=i))}
-            for i in range(7)  # Disponibilidad de los próximos 7 días
-        ]
+        """Grilla día × franja de los próximos días con la ocupación real (cacheada por día)"""
+        return get_availability_grid()
 
     def get_bookings(self, user):
         """Lista las reservas de lavadora del usuario"""
         return LaundryBooking.objects.filter(user=user).values(
-            "id", "date", "time_slot", "is_confirmed"
+            "id", "date", "time_slot", "status"
         )
 
     def post(self, request):
@@ -1001,7 +1034,9 @@ class LaundryDashboardView(APIView):
 
         serializer = LaundryBookingSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
-            serializer.save(user=request.user)
+            with transaction.atomic():
+                booking = serializer.save(user=request.user)
+                claim_slot(booking, booking.date, booking.time_slot)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -1104,11 +1139,37 @@ class VerifyAccountView(APIView):
             )
 
         except CustomUser.DoesNotExist:
-            # Registrar intento fallido
-            cache.set(cache_key, attempt_count + 1, 900)  # 15 minutos de timeout
+            # Registrar intento fallido (incremento atómico, compartido entre workers)
+            increment(cache_key, 900)  # 15 minutos de timeout
             
             return Response(
                 {"detail": "Token inválido o expirado",
                  "status": "error"}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+
+########################################################################################################
+####                                                                                                ####
+####            ARCHIVOS MEDIA                                                                      ####
+####                                                                                                ####
+########################################################################################################
+class ProtectedMediaView(APIView):
+    """
+    Sirve un archivo media si la URL trae una firma válida y vigente, o si el usuario
+    autenticado es dueño del archivo. Django solo decide: los bytes los envía nginx.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, name):
+        name = clean_media_name(name)
+        if name is None:
+            raise NotFound("Archivo no encontrado.")
+
+        if not verify_media_signature(name, request.GET.get("e"), request.GET.get("s")):
+            if not request.user.is_authenticated:
+                raise NotAuthenticated("URL caducada o inválida.")
+            if not user_can_access_media(request.user, name):
+                raise NotFound("Archivo no encontrado.")
+
+        return media_response(name)
@@ -78,18 +78,32 @@ except Exception as e:
 if [ "$db_check_result" = "DATA_EXISTS" ]; then
   log_info "✅ Datos importantes encontrados en la base de datos."
 elif [ "$db_check_result" = "NO_DATA" ]; then
-  log_warning "⚠️ No se encontraron datos importantes. Ejecutando migraciones..."
-  python manage.py makemigrations --noinput
-  log_info "📦 Aplicando migraciones a la base de datos..."
-python manage.py migrate --noinput
+  log_warning "⚠️ No se encontraron datos importantes. Se creará el esquema desde cero."
 else
   log_error "❌ Error al verificar el estado de la base de datos: $db_check_result"
   exit 1
 fi
 
+# Las migraciones se versionan en core/migrations: aquí solo se aplican las que falten
+# (0003 completa billing_period por lotes). Sin cambios no hace nada.
+log_info "📦 Aplicando migraciones..."
+python manage.py migrate --noinput
+
+# Tabla del cache en base de datos (solo si CACHE_BACKEND=db; UNLOGGED en Postgres)
+log_info "🗄️ Preparando la tabla del cache..."
+python manage.py setup_cache_table
+
 # Inicializar datos
 log_info "🔧 Inicializando datos del sistema..."
 python manage.py init_data
 
+# Situación de pagos de los inquilinos (no hace nada si ya está al día)
+log_info "💳 Sincronizando la situación de pagos de los inquilinos..."
+python manage.py sync_payment_standing
+
+# Asignar lavadora a las reservas abiertas que aún no tienen franja reclamada
+log_info "🧺 Reclamando franjas de lavandería pendientes..."
+python manage.py claim_laundry_slots
+
 log_info "🚀 Iniciando servidor Django con Uvicorn..."
 exec uvicorn renthub.asgi:application --host 0.0.0.0 --port 8000 --log-level info
\ No newline at end of file
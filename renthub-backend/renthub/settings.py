@@ -1,6 +1,8 @@
 from pathlib import Path
 from datetime import timedelta
 import os
+import sys
+import tempfile
 # from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -10,6 +12,22 @@ import os
 BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Calculan el hash de cada archivo mientras se recibe (almacenamiento por contenido)
+FILE_UPLOAD_HANDLERS = [
+    "core.storage.HashingMemoryFileUploadHandler",
+    "core.storage.HashingTemporaryFileUploadHandler",
+]
+# Los archivos media se sirven por /media/ con URLs firmadas (core/media.py) y nginx
+# hace la transferencia desde la ubicación interna MEDIA_ACCEL_PREFIX (X-Accel-Redirect)
+STORAGES = {
+    "default": {"BACKEND": "core.storage.ProtectedFileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+MEDIA_ACCEL_REDIRECT = os.environ.get("MEDIA_ACCEL_REDIRECT", "True").lower() in ("1", "true", "yes")
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected-media/")
+# Validez de las URLs firmadas; la caducidad se redondea a ventanas para que la URL sea estable
+MEDIA_URL_SIGNATURE_TTL = int(os.environ.get("MEDIA_URL_SIGNATURE_TTL", 60 * 60 * 24))
+MEDIA_URL_SIGNATURE_WINDOW = int(os.environ.get("MEDIA_URL_SIGNATURE_WINDOW", 60 * 60 * 6))
 
 #Parseo de hosthosts_env = os.environ.get("ALLOWED_HOSTS", "")
 hosts_env = os.environ.get("ALLOWED_HOSTS", "")
@@ -19,8 +37,11 @@ if hosts_env:
 else:
     ALLOWED_HOSTS = ["localhost", "127.0.0.1"]
 
+# `python manage.py test`: base y servicios locales (ver el bloque del final del archivo)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = os.environ.get("SECRET_KEY")
+SECRET_KEY = os.environ.get("SECRET_KEY") or ("renthub-tests-" + "x" * 40 if TESTING else None)
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.environ.get("DEBUG", "False").lower() in ("1", "true", "yes")
 # FRONTEND_URL
@@ -35,6 +56,27 @@ AXES_COOLOFF = os.environ.get("AXES_COOLOFF_TIME", 5)
 AXES_LOCKOUT = [os.environ.get("AXES_LOCKOUT_PARAMETERS"), "ip_address"]
 AXES_RESET = os.environ.get("AXES_RESET_ON_SUCCESS", True) 
 TIME_Z = os.environ.get("TIME_ZONE", "UTC")
+# Generar las variantes de imágenes (miniatura/vista previa) en segundo plano
+IMAGE_VARIANTS_ASYNC = os.environ.get("IMAGE_VARIANTS_ASYNC", "True").lower() in ("1", "true", "yes")
+# Segundos que el usuario autenticado queda en cache; se invalida al guardarlo o borrarlo
+AUTH_USER_CACHE_TTL = int(os.environ.get("AUTH_USER_CACHE_TTL", 60))
+# Días cubiertos por el índice de ocupación en memoria (búsqueda de disponibilidad)
+OCCUPANCY_INDEX_PAST_DAYS = int(os.environ.get("OCCUPANCY_INDEX_PAST_DAYS", 365))
+OCCUPANCY_INDEX_FUTURE_DAYS = int(os.environ.get("OCCUPANCY_INDEX_FUTURE_DAYS", 365 * 3))
+# Lavandería: horario, duración de cada franja, reservas simultáneas por franja y días visibles
+LAUNDRY_OPEN_HOUR = int(os.environ.get("LAUNDRY_OPEN_HOUR", 0))
+LAUNDRY_CLOSE_HOUR = int(os.environ.get("LAUNDRY_CLOSE_HOUR", 24))
+LAUNDRY_SLOT_MINUTES = int(os.environ.get("LAUNDRY_SLOT_MINUTES", 60))
+LAUNDRY_SLOT_CAPACITY = int(os.environ.get("LAUNDRY_SLOT_CAPACITY", 1))
+LAUNDRY_GRID_DAYS = int(os.environ.get("LAUNDRY_GRID_DAYS", 7))
+# Días posteriores a la franja pedida en los que se buscan sugerencias
+LAUNDRY_SUGGESTION_DAYS = int(os.environ.get("LAUNDRY_SUGGESTION_DAYS", 7))
+# Elementos recientes guardados por bucket en el dashboard de administración
+ADMIN_DASHBOARD_RECENT_ITEMS = int(os.environ.get("ADMIN_DASHBOARD_RECENT_ITEMS", 20))
+# Dashboard del inquilino: meses de historial de pagos, días de reservas pasadas y vida en cache
+USER_DASHBOARD_HISTORY_MONTHS = int(os.environ.get("USER_DASHBOARD_HISTORY_MONTHS", 12))
+USER_DASHBOARD_LAUNDRY_DAYS = int(os.environ.get("USER_DASHBOARD_LAUNDRY_DAYS", 30))
+USER_DASHBOARD_CACHE_TTL = int(os.environ.get("USER_DASHBOARD_CACHE_TTL", 60 * 60))
 
 # Variables de la base de datos
 USER= os.environ.get("POSTGRES_USER", default="renthub")
@@ -52,6 +94,38 @@ POSTGRES_DB = {
     "PORT": PORT,
 }
 
+# Cache compartido por todos los workers (rate limits, intentos de verificación, respuestas).
+# CACHE_BACKEND: file (disco local, por defecto), db (tabla UNLOGGED en Postgres), redis o locmem.
+# file sirve para una sola máquina y desarrollo; en producción conviene db o redis.
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "file").lower()
+CACHE_BACKENDS = {
+    "file": ("core.cache.AtomicFileBasedCache", "/tmp/renthub_cache"),
+    "db": ("core.cache.AtomicDatabaseCache", "renthub_cache"),
+    "redis": ("core.cache.MeteredRedisCache", "redis://localhost:6379/1"),
+    "locmem": ("core.cache.MeteredLocMemCache", "renthub"),
+}
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKENDS[CACHE_BACKEND][0],
+        "LOCATION": os.environ.get("CACHE_LOCATION", CACHE_BACKENDS[CACHE_BACKEND][1]),
+        "KEY_PREFIX": "renthub",
+    }
+}
+if CACHE_BACKEND != "redis":
+    # Con el MAX_ENTRIES por defecto de Django (300) el cache descartaría al azar contadores de
+    # rate limit, usuarios autenticados y versiones en cuanto hubiera unos cientos de inquilinos.
+    # Redis expulsa por su cuenta (maxmemory-policy) y no acepta estas opciones.
+    CACHES["default"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", 200000)),
+        "CULL_FREQUENCY": int(os.environ.get("CACHE_CULL_FREQUENCY", 10)),
+    }
+# Vida máxima de las respuestas cacheadas (se invalidan antes al cambiar los datos)
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", 60 * 60 * 24))
+# Cada cuánto comprueba cada proceso si cambiaron los tipos de documento
+DOCUMENT_TYPE_REGISTRY_CHECK_SECONDS = float(os.environ.get("DOCUMENT_TYPE_REGISTRY_CHECK_SECONDS", 5))
+# Los backends de core.cache tienen incr() atómico aunque django_ratelimit no los conozca
+SILENCED_SYSTEM_CHECKS = ["django_ratelimit.W001"]
+
 # Variables de Correo
 EMAIL_BACKEND = os.environ.get("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
 EMAIL_HOST = os.environ.get("EMAIL_HOST", "smtp.gmail.com")
@@ -60,6 +134,12 @@ EMAIL_USE_TLS = os.environ.get("EMAIL_USE_TLS", True)
 EMAIL_HOST_USER = os.environ.get("EMAIL_HOST_USER", "admin@admin.com")
 EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD", "admin")
 DEFAULT_FROM_EMAIL = os.environ.get("DEFAULT_FROM_EMAIL", "admin@admin.com")
+# Bandeja de salida: reintentos del worker `send_outbox_emails`
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", 8))
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = int(os.environ.get("EMAIL_OUTBOX_RETRY_BASE_SECONDS", 30))
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = int(os.environ.get("EMAIL_OUTBOX_RETRY_MAX_SECONDS", 3600))
+# Tiempo que un worker se reserva un lote; si muere, otro lo reintenta al vencer
+EMAIL_OUTBOX_LEASE_SECONDS = int(os.environ.get("EMAIL_OUTBOX_LEASE_SECONDS", 600))
 
 # Application definition
 
@@ -78,6 +158,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir también las consultas del resto de middlewares
+    'core.instrumentation.QueryInstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -89,6 +171,24 @@ MIDDLEWARE = [
     'axes.middleware.AxesMiddleware',
 ]
 
+# Consultas por petición: log, cabecera Server-Timing y detector de N+1 (core/instrumentation.py).
+# Por defecto solo en desarrollo: en producción expone tiempos en Server-Timing y registra cada petición
+QUERY_INSTRUMENTATION = os.environ.get("QUERY_INSTRUMENTATION", str(DEBUG)).lower() in ("1", "true", "yes")
+QUERY_REPEAT_THRESHOLD = int(os.environ.get("QUERY_REPEAT_THRESHOLD", 10))
+# En desarrollo y tests una consulta repetida por encima del umbral hace fallar la petición
+QUERY_REPEAT_RAISE = os.environ.get("QUERY_REPEAT_RAISE", str(DEBUG)).lower() in ("1", "true", "yes")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "core": {"handlers": ["console"], "level": os.environ.get("LOG_LEVEL", "INFO")},
+    },
+}
+
 ROOT_URLCONF = 'renthub.urls'
 
 TEMPLATES = [
@@ -175,11 +275,14 @@ AUTHENTICATION_BACKENDS = [
 # Configuracion de Rest Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # JWTAuthentication con el usuario en cache (AUTH_USER_CACHE_TTL)
+        "core.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # Paginación por cursor opcional (?page_size= / ?cursor=) en los listados
+    "DEFAULT_PAGINATION_CLASS": "core.pagination.KeysetPagination",
 }
 
 # Configuracion de Simple JWT
@@ -203,8 +306,39 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True  # Para permitir el envío de cookies y headers de autenticación
 
+# Cabeceras de paginación legibles desde el frontend
+CORS_EXPOSE_HEADERS = ["X-Total-Count", "X-Total-Count-Estimated"]
+
 # Indica a Django que confíe en el header X-Forwarded-Proto para detectar HTTPS correctamente
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 # Opcionalmente, fuerza a que siempre use HTTPS para las URLs generadas por build_absolute_uri()
 SECURE_SSL_REDIRECT = True  # (recomendado si solo usas HTTPS)
+
+########################################################################################################
+####                                                                                                ####
+####            Tests: SQLite en memoria y sin servicios externos                                   ####
+####                                                                                                ####
+########################################################################################################
+# TEST_DATABASE=postgres usa la base POSTGRES_* de arriba (Django crea y borra test_<POSTGRES_DB>)
+if TESTING:
+    if os.environ.get("TEST_DATABASE", "sqlite").lower() == "sqlite":
+        DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+    CACHES = {
+        "default": {
+            "BACKEND": "core.cache.MeteredLocMemCache",
+            "LOCATION": "renthub-tests",
+            "KEY_PREFIX": "renthub",
+        }
+    }
+    MEDIA_ROOT = os.path.join(tempfile.gettempdir(), "renthub-test-media")
+    PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+    AXES_LOCKOUT_PARAMETERS = [parameter for parameter in AXES_LOCKOUT if parameter]
+    ALLOWED_HOSTS = ["testserver"]
+    FRONTEND_URL = FRONTEND_URL or "http://localhost"
+    CORS_ALLOWED_ORIGINS = [FRONTEND_URL]
+    SECURE_SSL_REDIRECT = False
+    # Un N+1 hace fallar el test aunque quede dentro del presupuesto de consultas
+    QUERY_INSTRUMENTATION = True
+    QUERY_REPEAT_RAISE = True
+    LOGGING["loggers"]["core"]["level"] = "WARNING"
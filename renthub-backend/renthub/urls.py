@@ -1,6 +1,4 @@
 from django.contrib import admin
-from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
@@ -10,11 +8,12 @@ from core.views import (CustomUserViewSet, ContractViewSet,
                         RoomViewSet, BuildingViewSet, 
                         ReferencePersonViewSet,DocumentTypesViewSet,
                         UserDashboardView, AdminDashboardView,
+                        AdminDashboardBucketView,
                         LaundryDashboardView, RentPaymentViewSet,
                         LaundryBookingViewSet,
                         RentPaymentDetailView,
                         UserChangeRequestViewSet,
-                        VerifyAccountView)
+                        VerifyAccountView, ProtectedMediaView)
 
 router = DefaultRouter()
 router.register(r'users', CustomUserViewSet)
@@ -35,11 +34,10 @@ urlpatterns = [
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("api/user-dashboard/", UserDashboardView.as_view(), name="user-dashboard"),
     path("api/admin-dashboard/", AdminDashboardView.as_view(), name="admin-dashboard"),
+    path("api/admin-dashboard/<str:bucket>/", AdminDashboardBucketView.as_view(), name="admin-dashboard-bucket"),
     path("api/laundry-dashboard/", LaundryDashboardView.as_view(), name="laundry-dashboard"),
     path("api/payments/rent/<uuid:pk>/", RentPaymentDetailView.as_view(), name="rent-payment-detail"),
     path("api/verify-account/<token>/", VerifyAccountView.as_view(), name="verify-account"),
+    # Archivos media: Django valida firma o dueño y nginx envía el archivo
+    path("media/<path:name>", ProtectedMediaView.as_view(), name="protected-media"),
 ]
-
-# Esto sirve los archivos en desarrollo
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file